@@ -1,21 +1,18 @@
 """
 Lightweight package shim for running this repository as package `pudao`.
 
-This module sets the package __path__ to the project root so that
-subpackages stored in sibling directories (e.g. `gate`, `cli`, `dsl`, `smt`)
-can be imported as `pudao.gate`, `pudao.cli`, etc. This avoids having to
-physically move files into a `pudao/` subtree.
+By default `pudao.__path__` is left untouched, so submodule imports only probe
+the package directory (`pudao/gate`, `pudao/cli`, ...).
 
-This is intentionally minimal and safe for development only.
+Set PFSB_DEV_ROOT_PATH=1 to additionally search the project root (one level
+up), for a development layout where subpackages live at the repo root instead
+of under `pudao/`. This adds filesystem probing to every submodule import and
+is intentionally opt-in, for development only.
 """
 import os
 
-# Make `import pudao.<subpkg>` search both the package directory and the
-# project root (one level up). Keeping the original package directory in
-# `__path__` ensures that subpackages located under `pudao/` (e.g.
-# `pudao/evidence`) are still discoverable, while adding the project root
-# allows a development layout where modules live at the repo root.
-pkg_dir = os.path.dirname(__file__)
-project_root = os.path.normpath(os.path.join(pkg_dir, ".."))
-# Preserve the default package directory and also search the project root.
-__path__ = [pkg_dir, project_root]
+if os.getenv("PFSB_DEV_ROOT_PATH", "0") == "1":
+    pkg_dir = os.path.dirname(__file__)
+    project_root = os.path.normpath(os.path.join(pkg_dir, ".."))
+    # Preserve the default package directory and also search the project root.
+    __path__ = [pkg_dir, project_root]
@@ -0,0 +1,159 @@
+# pudao/bench/generator.py
+"""合成基准数据：路网拓扑 + 策略。
+
+拓扑：
+- chain：线性路段链（默认）；
+- grid： 近似正方形网格（每段与上下左右相邻）。
+
+场景（scenario）：
+- sat：           全部路段有 vsl，限速沿路网平滑变化（三角波，相邻差 5 km/h）；
+- sat-partial：   约一半路段有 vsl，其余交给求解器取值；
+- unsat-spatial： 在 sat 基础上注入一处相邻限速突变（I2 直接发现）；
+- unsat-conflict：同一匝道同时 metering + closure（I6 直接发现）；
+- unsat-core：    （仅 chain）中间一段无 vsl，两侧分别固定为 60 / 100，max_delta=15，
+                  不变式不报错，由求解器（差分约束 / Z3）判定不可满足。
+
+动作配比（mix）按 vsl / ramp_metering / ramp_closure / vms_message 给出，
+匝道与 VMS 的数量按路段数的比例生成。所有 ID 使用 bench- 前缀，
+配合 registry_for / topology_for 注入到进程级注册表与拓扑中。
+"""
+import math
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+SCENARIOS = ("sat", "sat-partial", "unsat-spatial", "unsat-conflict", "unsat-core")
+EXPECTED = {"sat": "sat", "sat-partial": "sat", "unsat-spatial": "unsat",
+            "unsat-conflict": "unsat", "unsat-core": "unsat"}
+TOPOLOGIES = ("chain", "grid")
+
+DEFAULT_MIX = {"vsl": 1.0, "ramp_metering": 0.6, "ramp_closure": 0.2, "vms_message": 0.5}
+
+
+def seg_id(i: int) -> str:
+    return f"bench-seg-{i:06d}"
+
+
+def ramp_id(i: int) -> str:
+    return f"bench-ramp-{i:05d}"
+
+
+def vms_id(i: int) -> str:
+    return f"bench-vms-{i:05d}"
+
+
+def synthetic_edges(n: int, topology: str = "chain") -> List[Tuple[str, str]]:
+    if topology == "chain":
+        return [(seg_id(i), seg_id(i + 1)) for i in range(n - 1)]
+    if topology == "grid":
+        cols = max(1, int(math.ceil(math.sqrt(n))))
+        edges = []
+        for i in range(n):
+            if (i + 1) % cols and i + 1 < n:
+                edges.append((seg_id(i), seg_id(i + 1)))
+            if i + cols < n:
+                edges.append((seg_id(i), seg_id(i + cols)))
+        return edges
+    raise ValueError(f"unknown topology: {topology} (choose from {', '.join(TOPOLOGIES)})")
+
+
+def _wave(i: int, n: int, topology: str) -> int:
+    # 三角波：相邻位置差 1 档（5 km/h），取值 60..100
+    if topology == "grid":
+        cols = max(1, int(math.ceil(math.sqrt(n))))
+        i = i // cols + i % cols
+    return 60 + 5 * abs(i % 16 - 8)
+
+
+def counts(n: int) -> Tuple[int, int]:
+    """(匝道数, VMS 数)"""
+    return max(1, n // 10), max(1, n // 20)
+
+
+def synthetic_strategy(n: int, scenario: str = "sat", topology: str = "chain",
+                       mix: Optional[Dict[str, float]] = None, seed: int = 0) -> Dict[str, Any]:
+    """生成一份原始策略文档（dict，可直接写成 JSON/YAML）。"""
+    if scenario not in SCENARIOS:
+        raise ValueError(f"unknown scenario: {scenario} (choose from {', '.join(SCENARIOS)})")
+    if scenario == "unsat-core" and topology != "chain":
+        raise ValueError("unsat-core scenario requires chain topology")
+    if n < 3:
+        raise ValueError("synthetic strategies need at least 3 segments")
+    mix = {**DEFAULT_MIX, **(mix or {})}
+    rnd = random.Random(seed)
+    n_ramps, n_vms = counts(n)
+    max_delta = 20
+
+    actions: List[Dict[str, Any]] = []
+    if scenario == "unsat-core":
+        mid = n // 2
+        max_delta = 15
+        for i in range(n):
+            if i != mid:
+                actions.append({"type": "vsl", "segment_id": seg_id(i), "value": 60 if i < mid else 100})
+    else:
+        coverage = 0.5 if scenario == "sat-partial" else mix["vsl"]
+        for i in range(n):
+            if i == 0 or rnd.random() < coverage:
+                actions.append({"type": "vsl", "segment_id": seg_id(i), "value": _wave(i, n, topology)})
+        if scenario == "unsat-spatial":
+            # 把第一条 vsl 的相邻段改成差 40（保证两端都有 vsl）
+            actions[0]["value"] = 100
+            nb = seg_id(1)
+            for a in actions:
+                if a["segment_id"] == nb:
+                    a["value"] = 60
+                    break
+            else:
+                actions.append({"type": "vsl", "segment_id": nb, "value": 60})
+
+    # 匝道：按 mix 选择 metering 或 closure（同一匝道只取一种，conflict 场景除外）
+    for r in range(n_ramps):
+        x = rnd.random()
+        if x < mix["ramp_closure"]:
+            actions.append({"type": "ramp_closure", "ramp_id": ramp_id(r), "max_duration_s": 600})
+        elif x < mix["ramp_closure"] + mix["ramp_metering"]:
+            actions.append({"type": "ramp_metering", "ramp_id": ramp_id(r),
+                            "veh_per_hour": rnd.choice((300, 400, 600, 800))})
+    if scenario == "unsat-conflict":
+        actions.append({"type": "ramp_metering", "ramp_id": ramp_id(0), "veh_per_hour": 400})
+        actions.append({"type": "ramp_closure", "ramp_id": ramp_id(0), "max_duration_s": 600})
+
+    for v in range(n_vms):
+        if rnd.random() < mix["vms_message"]:
+            actions.append({"type": "vms_message", "vms_id": vms_id(v), "text": "前方拥堵，减速慢行"})
+
+    return {
+        "strategy_id": f"bench-{topology}-{scenario}-{n}",
+        "version": "0.0.1",
+        "scope": {
+            "roadchain_id": f"bench-{topology}",
+            "segments": [seg_id(i) for i in range(n)],
+            "ramps": [ramp_id(r) for r in range(n_ramps)],
+            "vms": [vms_id(v) for v in range(n_vms)],
+        },
+        "actions": actions,
+        "guardrails": {
+            "min_vsl": 60,
+            "max_vsl": 100,
+            "max_delta": max_delta,
+            "max_closure_s": 900,
+            "always_keep_emergency_lane_free": True,
+        },
+        "rollout": {"mode": "canary", "max_revert_time_s": 600},
+        "metadata": {"author": "bench", "source": "synthetic"},
+    }
+
+
+def registry_for(n: int):
+    """覆盖合成 ID 的注册表。"""
+    from pudao.dsl.id_registry import IDRegistry
+    n_ramps, n_vms = counts(n)
+    return IDRegistry.from_ids(segments=(seg_id(i) for i in range(n)),
+                               ramps=(ramp_id(r) for r in range(n_ramps)),
+                               vms=(vms_id(v) for v in range(n_vms)),
+                               source=f"bench:{n}")
+
+
+def topology_for(n: int, topology: str = "chain"):
+    from pudao.topology.index import TopologyIndex
+    return TopologyIndex.from_edges(synthetic_edges(n, topology), source=f"bench:{topology}:{n}")
@@ -0,0 +1,236 @@
+# pudao/bench/runner.py
+"""基准运行器（pudao bench run / compare）。
+
+对每个 (规模, 场景, 拓扑) 生成合成策略写入临时文件，以关闭缓存的 check_formal_file 跑真实门禁，
+各阶段耗时取自门禁自身的 span（pudao.evidence.trace；每阶段取 repeat 次的中位数）：
+  read（读文件+哈希）→ parse（JSON/YAML 解码；流式解析时为整个 stream span）→ schema（编译后的 schema 校验）
+  → ir（构建 IR）→ ids（ID 批量校验）→ invariants → smt → evidence（构造并写入一条记录）
+结论与场景期望不一致时记录 mismatch。
+
+结果（基线）为 JSON：{"format": 1, "env": {...}, "cases": [...], "scaling": {...}}，
+scaling 给出每个场景各阶段相对规模的经验指数（相邻规模间 log-log 斜率），
+compare 按阶段比较两份基线，超过阈值（且绝对差超过 min_ms）记为回归。
+"""
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from pudao.bench import generator
+
+PHASES = ("read", "parse", "schema", "ir", "ids", "invariants", "smt", "evidence")
+BASELINE_FORMAT = 1
+
+
+@contextmanager
+def _injected(n: int, topology: str):
+    """临时替换进程级拓扑与 ID 注册表，结束后恢复。"""
+    from pudao.dsl import id_registry
+    from pudao.topology import index
+
+    old_topo, old_reg = index.get_topology(), id_registry.get_id_registry()
+    index.set_topology(generator.topology_for(n, topology))
+    id_registry.set_id_registry(generator.registry_for(n))
+    try:
+        yield
+    finally:
+        index.set_topology(old_topo)
+        id_registry.set_id_registry(old_reg)
+
+
+def _write_case(doc: Dict[str, Any], fmt: str, tmpdir: str) -> str:
+    path = os.path.join(tmpdir, f"{doc['strategy_id']}.{fmt}")
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "yaml":
+            import yaml
+            yaml.safe_dump(doc, f, allow_unicode=True, sort_keys=False)
+        else:
+            json.dump(doc, f, ensure_ascii=False)
+    return path
+
+
+# 门禁 span 名 -> 基准阶段（流式解析把解码/schema/IR/ID 合在一个 stream span 中，计入 parse）
+_SPAN_PHASE = {"read": "read", "decode": "parse", "stream": "parse", "schema": "schema", "ir": "ir",
+               "ids": "ids", "invariants": "invariants", "smt": "smt"}
+
+
+@contextmanager
+def _traced():
+    """临时对每次校验采样 span 树（不导出 OTLP），结束后恢复。"""
+    from pudao.evidence import trace
+
+    old = trace.TRACE_SAMPLE, trace.TRACE_OTLP_FILE
+    trace.TRACE_SAMPLE, trace.TRACE_OTLP_FILE = 1.0, ""
+    try:
+        yield
+    finally:
+        trace.TRACE_SAMPLE, trace.TRACE_OTLP_FILE = old
+
+
+def _phase_times(node: Dict[str, Any], t: Dict[str, float]) -> None:
+    ph = _SPAN_PHASE.get(node["name"])
+    if ph is not None:
+        t[ph] += node["dur_ms"]
+    for child in node.get("children", ()):
+        _phase_times(child, t)
+
+
+def _run_once(path: str, evidence_path: str) -> Dict[str, Any]:
+    from pudao.evidence.evidence import build_formal_record
+    from pudao.evidence.sink import EvidenceSink
+    from pudao.evidence.trace import span
+    from pudao.gate.formal_gate import check_formal_file
+
+    with _traced():
+        res = check_formal_file(path, write_evidence=False, use_cache=False)
+    t: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+    _phase_times(res["trace"], t)
+    # evidence_write 在 span 树导出之后才发生：用同样的 span 单独计时，写入临时文件而非默认 evidence
+    with span("evidence_write") as sp:
+        sink = EvidenceSink(evidence_path, flush_every=1, flush_interval_s=0, rotate_bytes=0,
+                            rotate_interval_s=0, shard=False)
+        sink.write(build_formal_record(path, res, "bench"))
+        sink.close()
+    t["evidence"] = sp.ms
+    t["total"] = res["timings_ms"]["total_ms"] + sp.ms
+    return {"status": res["status"], "timings_ms": t}
+
+
+def run_case(n: int, scenario: str, topology: str = "chain", repeat: int = 3,
+             fmt: str = "json", mix: Optional[Dict[str, float]] = None, seed: int = 0) -> Dict[str, Any]:
+    doc = generator.synthetic_strategy(n, scenario, topology, mix, seed)
+    with tempfile.TemporaryDirectory(prefix="pudao-bench-") as tmp, _injected(n, topology):
+        path = _write_case(doc, fmt, tmp)
+        runs = [_run_once(path, os.path.join(tmp, "evidence.ndjson")) for _ in range(max(1, repeat))]
+        size = os.path.getsize(path)
+    status = runs[0]["status"]
+    phases = {ph: statistics.median(r["timings_ms"][ph] for r in runs) for ph in (*PHASES, "total")}
+    return {
+        "name": f"{topology}/{scenario}/{n}",
+        "segments": n,
+        "scenario": scenario,
+        "topology": topology,
+        "format": fmt,
+        "actions": len(doc["actions"]),
+        "bytes": size,
+        "repeat": len(runs),
+        "status": status,
+        "expected": generator.EXPECTED[scenario],
+        "mismatch": status != generator.EXPECTED[scenario],
+        "phases_ms": phases,
+    }
+
+
+def scaling(cases: List[Dict[str, Any]]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """每个 (拓扑/场景) 各阶段：相邻规模之间的 log-log 斜率（≈1 线性，≈2 平方）。"""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for c in cases:
+        groups.setdefault(f"{c['topology']}/{c['scenario']}", []).append(c)
+    out: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for key, cs in groups.items():
+        cs = sorted(cs, key=lambda c: c["segments"])
+        curves: Dict[str, List[Dict[str, Any]]] = {}
+        for ph in (*PHASES, "total"):
+            pts = []
+            for a, b in zip(cs, cs[1:]):
+                ta, tb = a["phases_ms"][ph], b["phases_ms"][ph]
+                if ta > 0 and tb > 0 and b["segments"] > a["segments"]:
+                    k = math.log(tb / ta) / math.log(b["segments"] / a["segments"])
+                    pts.append({"from": a["segments"], "to": b["segments"], "exponent": k})
+            curves[ph] = pts
+        out[key] = curves
+    return out
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5, cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(sizes: Iterable[int], scenarios: Iterable[str] = generator.SCENARIOS,
+              topologies: Iterable[str] = ("chain",), repeat: int = 3, fmt: str = "json",
+              mix: Optional[Dict[str, float]] = None, seed: int = 0,
+              progress=None) -> Dict[str, Any]:
+    cases = []
+    for topo in topologies:
+        for sc in scenarios:
+            if sc == "unsat-core" and topo != "chain":
+                continue
+            for n in sorted(sizes):
+                case = run_case(n, sc, topo, repeat, fmt, mix, seed)
+                cases.append(case)
+                if progress is not None:
+                    progress(case)
+    return {
+        "format": BASELINE_FORMAT,
+        "env": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "cases": cases,
+        "scaling": scaling(cases),
+    }
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    doc = json.loads(Path(path).read_text(encoding="utf-8"))
+    if doc.get("format") != BASELINE_FORMAT:
+        raise ValueError(f"unsupported baseline format: {doc.get('format')}")
+    return doc
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any],
+            threshold: float = 0.20, min_ms: float = 1.0) -> Dict[str, Any]:
+    """按 (case, phase) 比较中位数耗时；(new-base)/base > threshold 且差值 > min_ms 记为回归。"""
+    b_cases = {c["name"]: c for c in base["cases"]}
+    rows, regressions = [], []
+    for c in new["cases"]:
+        b = b_cases.get(c["name"])
+        if b is None:
+            continue
+        for ph, nv in c["phases_ms"].items():
+            bv = b["phases_ms"].get(ph)
+            if not bv:
+                continue
+            change = (nv - bv) / bv
+            row = {"case": c["name"], "phase": ph, "base": bv, "new": nv, "change": change}
+            rows.append(row)
+            if change > threshold and nv - bv > min_ms:
+                regressions.append(row)
+    return {
+        "base_commit": base.get("env", {}).get("commit"),
+        "new_commit": new.get("env", {}).get("commit"),
+        "threshold": threshold,
+        "compared": len(rows),
+        "regressions": regressions,
+        "mismatches": [c["name"] for c in new["cases"] if c.get("mismatch")],
+    }
+
+
+def format_table(report: Dict[str, Any]) -> str:
+    cols = (*PHASES, "total")
+    lines = [f"{'case':<32}{'status':>8}" + "".join(f"{c:>11}" for c in cols)]
+    for c in report["cases"]:
+        st = c["status"] + ("!" if c["mismatch"] else "")
+        lines.append(f"{c['name']:<32}{st:>8}" + "".join(f"{c['phases_ms'][p]:>11.2f}" for p in cols))
+    lines.append("")
+    lines.append("scaling exponents (log-log slope between successive sizes):")
+    for key, curves in report["scaling"].items():
+        for ph in ("total", "invariants", "smt"):
+            pts = ", ".join(f"{p['from']}→{p['to']}: {p['exponent']:.2f}" for p in curves.get(ph, []))
+            if pts:
+                lines.append(f"  {key:<28}{ph:<12}{pts}")
+    return "\n".join(lines)
@@ -1,6 +1,8 @@
 import argparse
+import json
 import sys
-from ..gate.formal_gate import check_formal_file_json
+
+# 子命令所需模块在分支内按需导入，避免 `pudao --help` 等也付出 z3/jsonschema 的导入成本。
 
 
 def main():
@@ -12,12 +14,225 @@ def main():
 
     check_parser = formal_sub.add_parser("check", help="Run SMT formal check on a strategy file")
     check_parser.add_argument("-f", "--file", required=True, help="Path to strategy yaml/json")
+    check_parser.add_argument("--profile", action="store_true",
+                              help="Capture cProfile, per-phase tracemalloc peaks and Z3 statistics "
+                                   "into a profile artifact (bypasses the verdict cache)")
+
+    batch_parser = formal_sub.add_parser(
+        "check-batch", help="Check many strategy files in a worker pool, one NDJSON verdict per line")
+    batch_parser.add_argument("inputs", nargs="+", help="Files, glob patterns or directories")
+    batch_parser.add_argument("-j", "--workers", type=int, default=None,
+                              help="Worker processes (default: CPU count; 1 = in-process)")
+    batch_parser.add_argument("--order", choices=["completion", "input"], default="completion",
+                              help="Emit verdicts as they complete or in input order")
+    batch_parser.add_argument("--timeout", type=float, default=None,
+                              help="Per-file timeout in seconds (status=unknown on expiry)")
+    batch_parser.add_argument("--label", default=None, help="Evidence label for this batch")
+    batch_parser.add_argument("--no-evidence", action="store_true", help="Do not write evidence")
+    for p in (check_parser, batch_parser):
+        p.add_argument("--solver-timeout-ms", type=float, default=None,
+                       help="SMT wall-clock budget; exceeding it yields status=unknown")
+        p.add_argument("--rlimit", type=int, default=None, help="Z3 resource limit (reproducible budget)")
+        p.add_argument("--memory-mb", type=int, default=None, help="Z3 memory limit in MiB")
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Run a resident gate daemon with warm workers (Unix socket / localhost HTTP)")
+    serve_parser.add_argument("--socket", default=None, help="Unix socket path (NDJSON protocol)")
+    serve_parser.add_argument("--http", default=None, metavar="[HOST:]PORT",
+                              help="Serve HTTP on localhost, e.g. 8765 or 127.0.0.1:8765")
+    serve_parser.add_argument("-j", "--workers", type=int, default=None,
+                              help="Warm worker processes (default: CPU count)")
+    serve_parser.add_argument("--max-concurrency", type=int, default=None,
+                              help="Requests executing at once (default: workers)")
+    serve_parser.add_argument("--max-queue", type=int, default=256,
+                              help="Queued requests before rejecting with busy/503")
+    serve_parser.add_argument("--timeout", type=float, default=None,
+                              help="Default per-request timeout in seconds")
+
+    fleet_parser = subparsers.add_parser("fleet", help="Active-strategy store (cross-strategy conflicts)")
+    fleet_sub = fleet_parser.add_subparsers(dest="fleet_cmd")
+    admit_parser = fleet_sub.add_parser(
+        "admit", help="Formal-check a strategy, then admit it if it does not conflict with active ones")
+    admit_parser.add_argument("-f", "--file", required=True, help="Path to strategy yaml/json")
+    admit_parser.add_argument("--force", action="store_true", help="Admit even with fleet conflicts")
+    retire_parser = fleet_sub.add_parser("retire", help="Retire an active strategy")
+    retire_parser.add_argument("strategy_id")
+    list_parser = fleet_sub.add_parser("list", help="List active strategies")
+    for p in (admit_parser, retire_parser, list_parser):
+        p.add_argument("--journal", default=None, help="Fleet journal (default: PFSB_FLEET_JOURNAL)")
+
+    evidence_parser = subparsers.add_parser("evidence", help="Evidence file tools")
+    evidence_sub = evidence_parser.add_subparsers(dest="evidence_cmd")
+    merge_parser = evidence_sub.add_parser(
+        "merge", help="Merge per-process evidence shards (<stem>.<pid>.ndjson) into the main file")
+    merge_parser.add_argument("-f", "--file", default=None, help="Evidence file (default: PFSB_EVIDENCE_FILE)")
+    merge_parser.add_argument("--keep", action="store_true", help="Keep shard files after merging")
+
+    stats_parser = evidence_sub.add_parser(
+        "stats", help="Streaming percentiles per timing phase, grouped by run/label/status/hash")
+    stats_parser.add_argument("inputs", nargs="*",
+                              help="Evidence files/globs/dirs (default: PFSB_EVIDENCE_FILE + rotated segments)")
+    stats_parser.add_argument("--group-by", default="run_id",
+                              help="Comma-separated: run_id,label,status,sha256,cache")
+    stats_parser.add_argument("--compare", nargs=2, metavar=("BASE_RUN", "NEW_RUN"), default=None,
+                              help="Compare two run_ids and flag p50/p95 regressions")
+    stats_parser.add_argument("--threshold", type=float, default=0.10,
+                              help="Relative increase flagged as regression (default 0.10)")
+    stats_parser.add_argument("--format", choices=["json", "table"], default="json")
+
+    profile_parser = subparsers.add_parser("profile", help="Profile artifact tools")
+    profile_sub = profile_parser.add_subparsers(dest="profile_cmd")
+    show_parser = profile_sub.add_parser("show", help="Render phases, hotspots and Z3 statistics of a profile")
+    show_parser.add_argument("artifact", help="Profile JSON written by `formal check --profile`")
+    show_parser.add_argument("--top", type=int, default=20, help="Functions to list")
+    show_parser.add_argument("--sort", choices=["tottime", "cumtime", "ncalls"], default="tottime")
+    show_parser.add_argument("--format", choices=["json", "table"], default="table")
+
+    ids_parser = subparsers.add_parser("ids", help="Asset ID inventory tools")
+    ids_sub = ids_parser.add_subparsers(dest="ids_cmd")
+    compile_parser = ids_sub.add_parser(
+        "compile", help="Compile a text/JSON inventory into a memory-mappable .idx file")
+    compile_parser.add_argument("src", help="Inventory file (kind id per line, or JSON)")
+    compile_parser.add_argument("-o", "--output", required=True, help="Output .idx path")
+
+    bench_parser = subparsers.add_parser("bench", help="Synthetic scaling benchmarks")
+    bench_sub = bench_parser.add_subparsers(dest="bench_cmd")
+    bench_run_parser = bench_sub.add_parser(
+        "run", help="Time each gate phase on synthetic strategies across sizes/scenarios")
+    bench_run_parser.add_argument("--sizes", default="10,100,1000",
+                                  help="Comma-separated segment counts (default 10,100,1000)")
+    bench_run_parser.add_argument("--scenarios", default="all",
+                                  help="Comma-separated: sat,sat-partial,unsat-spatial,unsat-conflict,unsat-core")
+    bench_run_parser.add_argument("--topology", default="chain", help="Comma-separated: chain,grid")
+    bench_run_parser.add_argument("--repeat", type=int, default=3, help="Runs per case (median reported)")
+    bench_run_parser.add_argument("--input-format", choices=["json", "yaml"], default="json")
+    bench_run_parser.add_argument("--seed", type=int, default=0)
+    bench_run_parser.add_argument("-o", "--output", default=None, help="Write the JSON baseline here")
+    bench_run_parser.add_argument("--format", choices=["json", "table"], default="table")
+    bench_cmp_parser = bench_sub.add_parser(
+        "compare", help="Compare two baselines and flag per-phase regressions")
+    bench_cmp_parser.add_argument("base", help="Baseline JSON (e.g. from the previous commit)")
+    bench_cmp_parser.add_argument("new", help="New baseline JSON")
+    bench_cmp_parser.add_argument("--threshold", type=float, default=0.20,
+                                  help="Relative increase flagged as regression (default 0.20)")
+    bench_cmp_parser.add_argument("--min-ms", type=float, default=1.0,
+                                  help="Ignore absolute changes below this many ms (default 1.0)")
+
+    debug_parser = subparsers.add_parser("debug", help="Diagnostics")
+    debug_sub = debug_parser.add_subparsers(dest="debug_cmd")
+    startup_parser = debug_sub.add_parser(
+        "startup", help="Report import-time cost (-X importtime) of a pudao command")
+    startup_parser.add_argument("--top", type=int, default=15, help="Modules to list")
+    startup_parser.add_argument("--budget-ms", type=float, default=None,
+                                help="Exit 1 if total import time exceeds this budget")
+    startup_parser.add_argument("cli_args", nargs=argparse.REMAINDER,
+                                help="pudao command to measure, e.g. -- formal check -f x.yaml")
 
     args = parser.parse_args()
 
+    def _budget():
+        b = {k: getattr(args, k, None) for k in ("solver_timeout_ms", "rlimit", "memory_mb")}
+        b["timeout_ms"] = b.pop("solver_timeout_ms")
+        b = {k: v for k, v in b.items() if v is not None}
+        return b or None
+
     if args.command == "formal" and args.formal_cmd == "check":
-        out = check_formal_file_json(args.file)
+        from ..gate.formal_gate import check_formal_file_json
+        out = check_formal_file_json(args.file, budget=_budget(), profile=args.profile)
         print(out)
+    elif args.command == "formal" and args.formal_cmd == "check-batch":
+        from ..gate.batch import run_batch
+        summary = run_batch(
+            args.inputs,
+            workers=args.workers,
+            ordered=(args.order == "input"),
+            timeout_s=args.timeout,
+            label=args.label,
+            write_evidence=not args.no_evidence,
+            budget=_budget(),
+        )
+        print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    elif args.command == "serve":
+        if not args.socket and not args.http:
+            parser.error("serve requires --socket and/or --http")
+        from ..gate.server import serve
+        host, port = "127.0.0.1", None
+        if args.http:
+            h, _, p = args.http.rpartition(":")
+            host, port = (h or host), int(p)
+        serve(args.socket, host, port, args.workers, args.max_concurrency,
+              args.max_queue, args.timeout)
+    elif args.command == "fleet" and args.fleet_cmd in ("admit", "retire", "list"):
+        from ..gate import fleet
+        store = fleet.FleetStore(args.journal) if args.journal else fleet.get_fleet()
+        if args.fleet_cmd == "admit":
+            out = fleet.admit_file(args.file, store, force=args.force)
+            print(json.dumps(out, ensure_ascii=False, indent=2))
+            sys.exit(0 if out["fleet"]["admitted"] else 1)
+        elif args.fleet_cmd == "retire":
+            ok = store.retire(args.strategy_id)
+            print(json.dumps({"strategy_id": args.strategy_id, "retired": ok}, ensure_ascii=False))
+            sys.exit(0 if ok else 1)
+        else:
+            print(json.dumps({"active": store.active()}, ensure_ascii=False, indent=2))
+    elif args.command == "evidence" and args.evidence_cmd == "merge":
+        from ..evidence.evidence import EVIDENCE_FILE
+        from ..evidence.sink import merge_shards
+        n = merge_shards(args.file or EVIDENCE_FILE, remove=not args.keep)
+        print(json.dumps({"merged_records": n}, ensure_ascii=False))
+    elif args.command == "evidence" and args.evidence_cmd == "stats":
+        from ..evidence.evidence import EVIDENCE_FILE
+        from ..evidence import stats
+        paths = stats.expand_paths(args.inputs) if args.inputs else stats.default_inputs(EVIDENCE_FILE)
+        if args.compare:
+            cmp = stats.compare_runs(paths, args.compare[0], args.compare[1], args.threshold)
+            print(json.dumps(cmp, ensure_ascii=False, indent=2))
+            sys.exit(1 if cmp["regressions"] else 0)
+        group_by = tuple(g.strip() for g in args.group_by.split(",") if g.strip())
+        report = stats.EvidenceStats(group_by).add_all(stats.iter_records(paths)).report()
+        if args.format == "table":
+            print(stats.format_table(report))
+        else:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif args.command == "profile" and args.profile_cmd == "show":
+        from ..evidence.profile import format_profile, load_profile
+        art = load_profile(args.artifact)
+        if args.format == "table":
+            print(format_profile(art, args.top, args.sort))
+        else:
+            print(json.dumps(art, ensure_ascii=False, indent=2))
+    elif args.command == "ids" and args.ids_cmd == "compile":
+        from ..dsl.id_registry import compile_inventory
+        counts = compile_inventory(args.src, args.output)
+        print(json.dumps({"output": args.output, "counts": counts}, ensure_ascii=False))
+    elif args.command == "bench" and args.bench_cmd == "run":
+        from ..bench import generator, runner
+        sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+        scenarios = (generator.SCENARIOS if args.scenarios == "all"
+                     else [x.strip() for x in args.scenarios.split(",") if x.strip()])
+        topologies = [x.strip() for x in args.topology.split(",") if x.strip()]
+        progress = (lambda c: print(f"{c['name']}: {c['status']} {c['phases_ms']['total']:.1f} ms",
+                                    file=sys.stderr))
+        report = runner.run_suite(sizes, scenarios, topologies, args.repeat, args.input_format,
+                                  seed=args.seed, progress=progress)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        if args.format == "table":
+            print(runner.format_table(report))
+        else:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        sys.exit(1 if any(c["mismatch"] for c in report["cases"]) else 0)
+    elif args.command == "bench" and args.bench_cmd == "compare":
+        from ..bench import runner
+        cmp = runner.compare(runner.load_baseline(args.base), runner.load_baseline(args.new),
+                             args.threshold, args.min_ms)
+        print(json.dumps(cmp, ensure_ascii=False, indent=2))
+        sys.exit(1 if cmp["regressions"] or cmp["mismatches"] else 0)
+    elif args.command == "debug" and args.debug_cmd == "startup":
+        from .startup import run_startup_report
+        cli_args = [a for a in args.cli_args if a != "--"] or None
+        sys.exit(run_startup_report(cli_args, args.top, args.budget_ms))
     else:
         parser.print_help()
         sys.exit(1)
@@ -0,0 +1,80 @@
+# pudao/cli/startup.py
+"""冷启动耗时报告（pudao debug startup）。
+
+在子进程中以 `python -X importtime` 运行指定的 pudao 子命令（或仅导入 CLI），
+解析 stderr 中的 importtime 行，输出：
+- wall_ms：子进程总耗时（含解释器启动）
+- import_ms：全部顶层导入的累计耗时
+- by_package：按顶层包聚合的自耗时
+- top：按累计耗时排序的前 N 个模块
+并可与预算比较（超出则退出码 1），用于在 CI 中守住冷启动预算。
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """解析 -X importtime 输出为 [{module, self_us, cumulative_us, depth}]。"""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        rows.append({
+            "module": m.group(4),
+            "self_us": int(m.group(1)),
+            "cumulative_us": int(m.group(2)),
+            "depth": (len(m.group(3)) - 1) // 2,
+        })
+    return rows
+
+
+def startup_report(cli_args: Optional[List[str]] = None, top: int = 15) -> Dict[str, Any]:
+    """
+    运行 `python -X importtime -m pudao.cli.pudao_cli <cli_args>`；
+    cli_args 为空时只导入 CLI 模块（不执行任何子命令）。
+    """
+    if cli_args:
+        cmd = [sys.executable, "-X", "importtime", "-m", "pudao.cli.pudao_cli", *cli_args]
+    else:
+        cmd = [sys.executable, "-X", "importtime", "-c", "import pudao.cli.pudao_cli"]
+    t0 = perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=dict(os.environ))
+    wall_ms = (perf_counter() - t0) * 1000.0
+
+    rows = parse_importtime(proc.stderr)
+    by_pkg: Dict[str, int] = {}
+    for r in rows:
+        pkg = r["module"].split(".", 1)[0]
+        by_pkg[pkg] = by_pkg.get(pkg, 0) + r["self_us"]
+
+    return {
+        "command": cli_args or [],
+        "returncode": proc.returncode,
+        "wall_ms": wall_ms,
+        "import_ms": sum(r["cumulative_us"] for r in rows if r["depth"] == 0) / 1000.0,
+        "modules": len(rows),
+        "by_package_ms": {k: v / 1000.0 for k, v in sorted(by_pkg.items(), key=lambda kv: -kv[1])[:top]},
+        "top": [
+            {"module": r["module"], "cumulative_ms": r["cumulative_us"] / 1000.0,
+             "self_ms": r["self_us"] / 1000.0}
+            for r in sorted(rows, key=lambda r: -r["cumulative_us"])[:top]
+        ],
+    }
+
+
+def run_startup_report(cli_args: Optional[List[str]], top: int = 15,
+                       budget_ms: Optional[float] = None) -> int:
+    rep = startup_report(cli_args, top)
+    if budget_ms is not None:
+        rep["budget_ms"] = budget_ms
+        rep["within_budget"] = rep["import_ms"] <= budget_ms
+    print(json.dumps(rep, ensure_ascii=False, indent=2))
+    return 1 if budget_ms is not None and not rep["within_budget"] else 0
@@ -0,0 +1,296 @@
+# pudao/dsl/columnar.py
+"""列式动作表：大策略（全网生成、上万条动作）的 IR 表示。
+
+StrategyIR.actions 是 pydantic Action 对象列表，每条动作一个对象、十个可选字段；
+动作数上万时构建与遍历这些对象占了解析与校验的大部分时间和内存。
+ColumnarIR 与 StrategyIR 字段相同，scope / guardrails / rollout / metadata 仍是 pydantic 模型，
+只有 actions 换成 ActionTable：
+- type_code:  array('b')，TYPES 中的下标
+- target:     array('l')，目标对象下标；目标 (kind, id) 按首次出现的顺序驻留在 targets 中，
+              kind 由类型决定（vsl → segment，ramp_* → ramp，vms_message → vms）
+- value / veh_per_hour / ttl_s / max_duration_s：array('d')，缺省为 NaN
+- extras:     {动作下标: {字段: 值}}，稀疏存放 condition / text 及与类型不对应的 id 字段
+
+不变式索引（invariants.ActionIndex）、ID 校验、编码器、差分约束与全定值求值直接读列（iter_vsl 等）；
+其余按动作遍历的代码通过 ActionRow（按需生成的只读行视图，属性与 Action 相同）照常工作。
+dict() / json() 与 pydantic 模型的输出一致，结论缓存键与修订记录不受表示方式影响。
+列用标准库 array，不引入额外依赖。
+"""
+import json
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+TYPES = ("vsl", "ramp_metering", "ramp_closure", "vms_message")
+TYPE_CODE = {t: c for c, t in enumerate(TYPES)}
+VSL, RAMP_METERING, RAMP_CLOSURE, VMS_MESSAGE = range(4)
+TARGET_FIELD = ("segment_id", "ramp_id", "ramp_id", "vms_id")
+TARGET_KIND = ("segment", "ramp", "ramp", "vms")
+
+# 与 models.Action 的字段顺序一致（dict() 输出与增量复核的动作键依赖这一顺序）
+ACTION_FIELDS = ("type", "segment_id", "ramp_id", "vms_id", "value", "veh_per_hour",
+                 "ttl_s", "max_duration_s", "condition", "text")
+_ID_FIELDS = ("segment_id", "ramp_id", "vms_id")
+_TEXT_FIELDS = ("condition", "text")
+
+NAN = float("nan")
+
+
+def _num(x: float) -> Optional[float]:
+    return None if x != x else x  # NaN -> None
+
+
+class ActionTable:
+    __slots__ = ("type_code", "target", "value", "veh_per_hour", "ttl_s", "max_duration_s",
+                 "targets", "extras", "_index")
+
+    def __init__(self):
+        self.type_code = array("b")
+        self.target = array("l")
+        self.value = array("d")
+        self.veh_per_hour = array("d")
+        self.ttl_s = array("d")
+        self.max_duration_s = array("d")
+        self.targets: List[Tuple[str, str]] = []
+        self.extras: Dict[int, Dict[str, Any]] = {}
+        self._index: Optional[Dict[Tuple[str, str], int]] = None
+
+    @classmethod
+    def from_raw(cls, actions: Iterable[Dict[str, Any]]) -> Optional["ActionTable"]:
+        """由已通过 schema 的原始动作构建；某条动作缺少其类型所需的 id 时返回 None（交回 pydantic 报错）。"""
+        t = cls()
+        return t.seal() if t.extend(actions) else None
+
+    def extend(self, actions: Iterable[Dict[str, Any]]) -> bool:
+        """逐条追加原始动作；遇到缺少所需 id 的动作时停在该条之前并返回 False（流式解析逐条调用）。"""
+        codes, tgt = self.type_code, self.target
+        val, vph, ttl, mdur = self.value, self.veh_per_hour, self.ttl_s, self.max_duration_s
+        targets, extras = self.targets, self.extras
+        index = self._index
+        if index is None:
+            index = self._index = {key: j for j, key in enumerate(targets)}
+        i = len(codes)
+        for a in actions:
+            code = TYPE_CODE[a["type"]]
+            field = TARGET_FIELD[code]
+            tid = a.get(field)
+            if not tid:
+                return False
+            key = (TARGET_KIND[code], tid)
+            j = index.get(key)
+            if j is None:
+                j = index[key] = len(targets)
+                targets.append(key)
+            codes.append(code)
+            tgt.append(j)
+            v = a.get("value")
+            val.append(NAN if v is None else float(v))
+            v = a.get("veh_per_hour")
+            vph.append(NAN if v is None else float(v))
+            v = a.get("ttl_s")
+            ttl.append(NAN if v is None else float(v))
+            v = a.get("max_duration_s")
+            mdur.append(NAN if v is None else float(v))
+            extra = None
+            for f in _ID_FIELDS:
+                if f != field and a.get(f) is not None:
+                    extra = extra or {}
+                    extra[f] = a[f]
+            for f in _TEXT_FIELDS:
+                if a.get(f) is not None:
+                    extra = extra or {}
+                    extra[f] = a[f]
+            if extra:
+                extras[i] = extra
+            i += 1
+        return True
+
+    def seal(self) -> "ActionTable":
+        """构建结束：丢弃目标驻留用的查找表（只在追加时需要）。"""
+        self._index = None
+        return self
+
+    def __len__(self) -> int:
+        return len(self.type_code)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ActionRow(self, k) for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return ActionRow(self, i)
+
+    def __iter__(self) -> Iterator["ActionRow"]:
+        for i in range(len(self)):
+            yield ActionRow(self, i)
+
+    def target_id(self, i: int) -> str:
+        return self.targets[self.target[i]][1]
+
+    def nbytes(self) -> int:
+        """各列数组占用的字节数（不含驻留的 id 字符串与 extras）。"""
+        return sum(c.itemsize * len(c) for c in (self.type_code, self.target, self.value,
+                                                  self.veh_per_hour, self.ttl_s, self.max_duration_s))
+
+
+class ActionRow:
+    """ActionTable 中一行的只读视图，属性与 models.Action 相同。"""
+    __slots__ = ("_t", "_i")
+
+    def __init__(self, table: ActionTable, i: int):
+        self._t = table
+        self._i = i
+
+    def _id(self, field: str) -> Optional[str]:
+        t, i = self._t, self._i
+        if TARGET_FIELD[t.type_code[i]] == field:
+            return t.targets[t.target[i]][1]
+        e = t.extras.get(i)
+        return e.get(field) if e else None
+
+    @property
+    def type(self) -> str:
+        return TYPES[self._t.type_code[self._i]]
+
+    @property
+    def segment_id(self) -> Optional[str]:
+        return self._id("segment_id")
+
+    @property
+    def ramp_id(self) -> Optional[str]:
+        return self._id("ramp_id")
+
+    @property
+    def vms_id(self) -> Optional[str]:
+        return self._id("vms_id")
+
+    @property
+    def value(self) -> Optional[float]:
+        return _num(self._t.value[self._i])
+
+    @property
+    def veh_per_hour(self) -> Optional[float]:
+        return _num(self._t.veh_per_hour[self._i])
+
+    @property
+    def ttl_s(self) -> Optional[float]:
+        return _num(self._t.ttl_s[self._i])
+
+    @property
+    def max_duration_s(self) -> Optional[float]:
+        return _num(self._t.max_duration_s[self._i])
+
+    @property
+    def condition(self) -> Optional[str]:
+        e = self._t.extras.get(self._i)
+        return e.get("condition") if e else None
+
+    @property
+    def text(self) -> Optional[str]:
+        e = self._t.extras.get(self._i)
+        return e.get("text") if e else None
+
+    def dict(self) -> Dict[str, Any]:
+        return {f: getattr(self, f) for f in ACTION_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"ActionRow({self._i}, {self.type}, {self._t.target_id(self._i)})"
+
+
+class ColumnarIR:
+    """与 StrategyIR 同形的 IR，actions 为 ActionTable（也可是 copy(update=...) 传入的动作列表）。"""
+    __slots__ = ("strategy_id", "version", "scope", "actions", "guardrails", "rollout", "metadata")
+
+    def __init__(self, strategy_id: str, version: str, scope, actions, guardrails, rollout, metadata=None):
+        self.strategy_id = strategy_id
+        self.version = version
+        self.scope = scope
+        self.actions = actions
+        self.guardrails = guardrails
+        self.rollout = rollout
+        self.metadata = metadata
+
+    def dict(self) -> Dict[str, Any]:
+        return {
+            "strategy_id": self.strategy_id,
+            "version": self.version,
+            "scope": self.scope.dict(),
+            "actions": [a.dict() for a in self.actions],
+            "guardrails": self.guardrails.dict(),
+            "rollout": self.rollout.dict(),
+            "metadata": None if self.metadata is None else self.metadata.dict(),
+        }
+
+    def json(self, **dumps_kwargs: Any) -> str:
+        return json.dumps(self.dict(), **dumps_kwargs)
+
+    def copy(self, update: Optional[Dict[str, Any]] = None) -> "ColumnarIR":
+        fields = {k: getattr(self, k) for k in self.__slots__}
+        fields.update(update or {})
+        return ColumnarIR(**fields)
+
+
+# ---- 两种表示通用的读取函数（列式走原生路径） ----
+
+def iter_vsl(actions: Sequence) -> Iterator[Tuple[int, str, float, Optional[float]]]:
+    """(动作下标, segment_id, 限速值, 持续时间或 None)：有 segment_id 且有取值的 vsl 动作，按出现顺序。"""
+    if isinstance(actions, ActionTable):
+        codes, tgt, targets = actions.type_code, actions.target, actions.targets
+        val, ttl, mdur = actions.value, actions.ttl_s, actions.max_duration_s
+        for i in range(len(codes)):
+            if codes[i] != VSL:
+                continue
+            v = val[i]
+            if v != v:
+                continue
+            yield i, targets[tgt[i]][1], v, _min_duration(ttl[i], mdur[i])
+        return
+    for i, act in enumerate(actions):
+        if act.type == "vsl" and act.segment_id and act.value is not None:
+            yield i, act.segment_id, act.value, duration_at(actions, i)
+
+
+def _min_duration(a: float, b: float) -> Optional[float]:
+    if a != a:
+        return None if b != b else b
+    return a if b != b else min(a, b)
+
+
+def duration_at(actions: Sequence, i: int) -> Optional[float]:
+    """第 i 条动作的持续时间：ttl_s 与 max_duration_s 中较小者，都未给出时为 None。"""
+    if isinstance(actions, ActionTable):
+        return _min_duration(actions.ttl_s[i], actions.max_duration_s[i])
+    act = actions[i]
+    ds = [d for d in (act.ttl_s, act.max_duration_s) if d is not None]
+    return min(ds) if ds else None
+
+
+def has_vsl_duration(actions: Sequence) -> bool:
+    """是否有带持续时间（ttl_s / max_duration_s）的 vsl 动作。"""
+    if isinstance(actions, ActionTable):
+        codes, ttl, mdur = actions.type_code, actions.ttl_s, actions.max_duration_s
+        return any(codes[i] == VSL and (ttl[i] == ttl[i] or mdur[i] == mdur[i]) for i in range(len(codes)))
+    return any(a.type == "vsl" and (a.ttl_s is not None or a.max_duration_s is not None) for a in actions)
+
+
+def action_refs(actions: Sequence) -> List[Tuple[str, str]]:
+    """动作引用的 (kind, id)，供 ID 校验；列式表每个目标只给一次（按首次出现的顺序）。"""
+    if isinstance(actions, ActionTable):
+        return list(actions.targets)
+    refs = []
+    for act in actions:
+        if act.type == "vsl" and act.segment_id:
+            refs.append(("segment", act.segment_id))
+        elif act.type in ("ramp_metering", "ramp_closure") and act.ramp_id:
+            refs.append(("ramp", act.ramp_id))
+        elif act.type == "vms_message" and act.vms_id:
+            refs.append(("vms", act.vms_id))
+    return refs
+
+
+def action_keys(actions: Sequence) -> List[tuple]:
+    """每条动作的内容键（按 ACTION_FIELDS 排列的字段值元组），两种表示给出相同的键。"""
+    if isinstance(actions, ActionTable):
+        return [tuple(r.dict().values()) for r in actions]
+    return [tuple(getattr(a, f) for f in ACTION_FIELDS) for a in actions]
@@ -1,30 +1,259 @@
-# 简单内存"注册表"，只为 MVP 和示例策略服务
+# pudao/dsl/id_registry.py
+"""资产 ID 注册表（路段 / 匝道 / VMS），从资产清单文件加载。
+
+存储：每类 ID 排序去重后打包为“偏移表 + UTF-8 字节串”（与 .idx 文件布局相同），
+查找为字节串上的二分；不为每个 ID 建 Python 对象，几十万 ID 只占几 MB。
+.idx 文件以只读 mmap 打开，fork 出的 worker 进程共享同一份页缓存。
+
+清单格式：
+- 文本（.txt/.csv/.tsv）：每行 "kind id" 或 "kind,id"，kind ∈ segment/ramp/vms，# 开头为注释；
+- JSON：{"segments": [...], "ramps": [...], "vms": [...]}；
+- 已编译的 .idx（compile_inventory 生成，pudao ids compile）。
+
+热更新：get_id_registry() 每隔 PFSB_ID_INVENTORY_CHECK_S 秒检查一次清单文件
+（inode/大小/mtime），变化时加载新表后整体替换引用；正在进行的校验仍使用旧表。
+
+环境变量 PFSB_ID_INVENTORY 可覆盖默认清单（默认为包内 default_inventory.txt）。
+"""
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+DEFAULT_INVENTORY_FILE = str(Path(__file__).with_name("default_inventory.txt"))
+INVENTORY_FILE = os.getenv("PFSB_ID_INVENTORY", DEFAULT_INVENTORY_FILE)
+INVENTORY_CHECK_S = float(os.getenv("PFSB_ID_INVENTORY_CHECK_S", "2.0"))
+
+KINDS = ("segment", "ramp", "vms")
+_KIND_ALIASES = {"segment": "segment", "segments": "segment", "seg": "segment",
+                 "ramp": "ramp", "ramps": "ramp",
+                 "vms": "vms"}
+
+# .idx 布局（小端）：MAGIC | 每类 (count, offsets_pos, data_pos) | 各类偏移表 u64[count+1] | 各类字节串
+_MAGIC = b"PFSBIDX1"
+_HEAD = struct.Struct("<QQQ")
+
+
+class SortedIds:
+    """打包的有序 ID 表：支持 len / 下标 / in / 批量查找。"""
+    __slots__ = ("_buf", "_offs", "_data", "_n")
+
+    def __init__(self, buf, count: int, offs_pos: int, data_pos: int):
+        self._buf = buf
+        self._n = count
+        self._offs = offs_pos
+        self._data = data_pos
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int) -> bytes:
+        a, b = struct.unpack_from("<QQ", self._buf, self._offs + 8 * i)
+        return self._buf[self._data + a:self._data + b]
+
+    def __contains__(self, item: str) -> bool:
+        key = item.encode("utf-8")
+        i = bisect.bisect_left(self, key)
+        return i < self._n and self[i] == key
+
+    def missing(self, ids: Iterable[str]) -> Set[str]:
+        """批量查找：查询先排序，再在表上单调推进二分下界；返回不存在的 ID。"""
+        out: Set[str] = set()
+        lo = 0
+        for key in sorted({i.encode("utf-8") for i in ids}):
+            lo = bisect.bisect_left(self, key, lo)
+            if lo >= self._n or self[lo] != key:
+                out.add(key.decode("utf-8"))
+        return out
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self[i].decode("utf-8")
+
+
+def pack_inventory(ids: Dict[str, Iterable[str]]) -> bytes:
+    """把 {kind: ids} 打包为 .idx 字节布局（排序去重）。"""
+    sorted_ids = {k: sorted({i.encode("utf-8") for i in ids.get(k, ())}) for k in KINDS}
+    pos = len(_MAGIC) + _HEAD.size * len(KINDS)
+    heads, offs_parts, data_parts = [], [], []
+    offs_pos = pos
+    data_pos = pos + sum(8 * (len(v) + 1) for v in sorted_ids.values())
+    for k in KINDS:
+        vals = sorted_ids[k]
+        heads.append(_HEAD.pack(len(vals), offs_pos, data_pos))
+        offs, acc = [0], 0
+        for v in vals:
+            acc += len(v)
+            offs.append(acc)
+        offs_parts.append(struct.pack(f"<{len(offs)}Q", *offs))
+        data_parts.append(b"".join(vals))
+        offs_pos += 8 * len(offs)
+        data_pos += acc
+    return b"".join([_MAGIC, *heads, *offs_parts, *data_parts])
+
+
+def parse_inventory(path: str) -> Dict[str, List[str]]:
+    """读取文本/JSON 清单为 {kind: [ids]}。"""
+    p = Path(path)
+    text = p.read_text(encoding="utf-8-sig")
+    out: Dict[str, List[str]] = {k: [] for k in KINDS}
+    if p.suffix == ".json":
+        doc = json.loads(text)
+        if not isinstance(doc, dict):
+            raise ValueError("inventory_invalid: expected {\"segments\": [...], ...}")
+        for key, vals in doc.items():
+            kind = _KIND_ALIASES.get(key)
+            if kind is None or not isinstance(vals, list):
+                raise ValueError(f"inventory_invalid: bad key {key!r}")
+            out[kind].extend(str(v) for v in vals)
+        return out
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = [x.strip() for x in line.replace(",", " ").replace("\t", " ").split()]
+        kind = _KIND_ALIASES.get(parts[0]) if len(parts) == 2 else None
+        if kind is None:
+            raise ValueError(f"inventory_invalid: bad line {line!r}")
+        out[kind].append(parts[1])
+    return out
+
+
+def compile_inventory(src: str, dst: str) -> Dict[str, int]:
+    """把文本/JSON 清单编译为可 mmap 的 .idx（原子替换），返回各类数量。"""
+    ids = parse_inventory(src)
+    data = pack_inventory(ids)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dst)
+    reg = IDRegistry(data)
+    return {k: len(reg.tables[k]) for k in KINDS}
+
 
 class IDRegistry:
-    VALID_SEGMENTS = {
-        "cd-se-101", "cd-se-102", "cd-se-103", "cd-se-104",
-        "cd-ne-201", "cd-ne-202"
-    }
+    """一份不可变的注册表快照；热更新时整体替换，不原地修改。"""
+    __slots__ = ("tables", "source", "_buf", "_mm", "_fp")
+
+    def __init__(self, buf, source: Optional[str] = None, mm: Optional[mmap.mmap] = None):
+        if bytes(buf[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError("inventory_invalid: bad .idx header")
+        self._buf = buf
+        self._mm = mm
+        self.source = source
+        self._fp: Optional[str] = None
+        self.tables: Dict[str, SortedIds] = {}
+        for n, k in enumerate(KINDS):
+            count, offs_pos, data_pos = _HEAD.unpack_from(buf, len(_MAGIC) + _HEAD.size * n)
+            self.tables[k] = SortedIds(buf, count, offs_pos, data_pos)
+
+    @classmethod
+    def from_ids(cls, segments: Iterable[str] = (), ramps: Iterable[str] = (),
+                 vms: Iterable[str] = (), source: Optional[str] = None) -> "IDRegistry":
+        return cls(pack_inventory({"segment": segments, "ramp": ramps, "vms": vms}), source)
+
+    def is_valid_segment(self, seg_id: str) -> bool:
+        return seg_id in self.tables["segment"]
+
+    def is_valid_ramp(self, ramp_id: str) -> bool:
+        return ramp_id in self.tables["ramp"]
+
+    def is_valid_vms(self, vms_id: str) -> bool:
+        return vms_id in self.tables["vms"]
+
+    def validate_ids(self, refs: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        批量校验 [(kind, id), ...]：每类一次排序后的批量查找。
+        返回不存在的引用，保持输入顺序（含重复）。
+        """
+        by_kind: Dict[str, List[str]] = {}
+        for kind, i in refs:
+            by_kind.setdefault(kind, []).append(i)
+        bad = {k: self.tables[k].missing(v) for k, v in by_kind.items()}
+        return [(k, i) for k, i in refs if i in bad[k]]
+
+    def fingerprint(self) -> str:
+        """注册表内容指纹（用于结论缓存键；内容变化即失效）。"""
+        if self._fp is None:
+            self._fp = hashlib.sha256(self._buf).hexdigest()
+        return self._fp
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def load_inventory_file(path: str) -> IDRegistry:
+    """.idx 以只读 mmap 打开（零拷贝、多进程共享）；文本/JSON 清单在内存中打包。"""
+    if Path(path).suffix == ".idx":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return IDRegistry(mm, source=str(path), mm=mm)
+    return IDRegistry(pack_inventory(parse_inventory(path)), source=str(path))
+
+
+# ---- 进程级注册表（热更新）----
+
+_registry: Optional[IDRegistry] = None
+_stamp: Optional[Tuple[int, int, int]] = None
+_next_check = 0.0
+_lock = threading.Lock()
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
 
-    VALID_RAMPS = {
-        "ramp-ne-201-in", "ramp-ne-202-in"
-    }
+def get_id_registry() -> IDRegistry:
+    """进程级共享注册表；清单文件变化时自动重新加载（原子替换引用）。"""
+    global _registry, _stamp, _next_check
+    reg = _registry
+    if reg is not None and (INVENTORY_CHECK_S < 0 or monotonic() < _next_check):
+        return reg
+    with _lock:
+        if _registry is None or monotonic() >= _next_check:
+            _next_check = monotonic() + max(INVENTORY_CHECK_S, 0.0)
+            if _registry is None or (_registry.source == INVENTORY_FILE
+                                     and _file_stamp(INVENTORY_FILE) != _stamp):
+                stamp = _file_stamp(INVENTORY_FILE)
+                fresh = load_inventory_file(INVENTORY_FILE)
+                # 旧快照的 mmap 交给 GC：仍在使用它的调用方不受影响
+                _registry, _stamp = fresh, stamp
+        return _registry
 
-    VALID_VMS = {
-        "vms-ne-201-main", "vms-ne-150-bypass"
-    }
 
-    @staticmethod
-    def is_valid_segment(seg_id: str) -> bool:
-        return seg_id in IDRegistry.VALID_SEGMENTS
+def set_id_registry(reg: IDRegistry) -> None:
+    """替换进程级注册表（加载新清单或测试注入；注入的注册表不参与文件热更新）。"""
+    global _registry, _stamp
+    with _lock:
+        _registry, _stamp = reg, None
 
-    @staticmethod
-    def is_valid_ramp(ramp_id: str) -> bool:
-        return ramp_id in IDRegistry.VALID_RAMPS
 
-    @staticmethod
-    def is_valid_vms(vms_id: str) -> bool:
-        return vms_id in IDRegistry.VALID_VMS
+def reload_id_registry(path: Optional[str] = None) -> IDRegistry:
+    """立即从清单文件（默认 PFSB_ID_INVENTORY）重新加载。"""
+    global _registry, _stamp, _next_check, INVENTORY_FILE
+    with _lock:
+        if path is not None:
+            INVENTORY_FILE = str(path)
+        _next_check = monotonic() + max(INVENTORY_CHECK_S, 0.0)
+        stamp = _file_stamp(INVENTORY_FILE)
+        _registry, _stamp = load_inventory_file(INVENTORY_FILE), stamp
+        return _registry
 
 
-id_registry = IDRegistry()
+def __getattr__(name: str):
+    # 兼容旧的模块级实例 id_registry（总是返回当前快照）
+    if name == "id_registry":
+        return get_id_registry()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
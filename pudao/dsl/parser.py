@@ -1,41 +1,171 @@
+import hashlib
 import json
+import mmap
+import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, TYPE_CHECKING
 
-import yaml
-from jsonschema import validate, Draft7Validator
-from pydantic import ValidationError
+from pudao.evidence.trace import span
+from .columnar import action_refs
+from .id_registry import get_id_registry
 
-from .models import StrategyIR
-from .id_registry import id_registry
+# yaml / jsonschema / pydantic 均延迟到首次使用时导入：
+# JSON 输入不加载 yaml；schema 不通过时不加载 pydantic 模型。
+if TYPE_CHECKING:
+    from .models import StrategyIR
+
+
+SCHEMA_PATH = Path(__file__).with_name("strategy_schema.json")
 
 
 def _load_schema() -> Dict[str, Any]:
-    schema_path = Path(__file__).with_name("strategy_schema.json")
-    with schema_path.open("r", encoding="utf-8") as f:
+    with SCHEMA_PATH.open("r", encoding="utf-8") as f:
         return json.load(f)
 
 
-SCHEMA = _load_schema()
-VALIDATOR = Draft7Validator(SCHEMA)
+@lru_cache(maxsize=None)
+def schema_sha256() -> str:
+    """strategy_schema.json 的内容哈希（用于结论缓存键）。"""
+    return hashlib.sha256(SCHEMA_PATH.read_bytes()).hexdigest()
 
 
-def load_raw(path: str) -> Dict[str, Any]:
-    p = Path(path)
-    if not p.exists():
+@lru_cache(maxsize=None)
+def get_validator():
+    """首次调用时加载并编译 JSON Schema（Draft7Validator）。"""
+    from jsonschema import Draft7Validator
+    return Draft7Validator(_load_schema())
+
+
+# 快路径：由 schema 生成的布尔校验函数（合法文档不构造任何错误对象）
+SCHEMA_FASTPATH = os.getenv("PFSB_SCHEMA_FASTPATH", "1") == "1"
+
+
+@lru_cache(maxsize=None)
+def get_fast_validator():
+    """编译 schema 校验函数（每进程一次）；schema 含不支持的关键字时返回 None。"""
+    from .schema_compiler import load_compiled_validator
+    try:
+        return load_compiled_validator(_load_schema())
+    except NotImplementedError:
+        return None
+
+
+def schema_is_valid(raw: Any) -> bool:
+    """快速判断是否满足 schema；快路径不可用时退回 jsonschema。"""
+    fast = get_fast_validator() if SCHEMA_FASTPATH else None
+    if fast is not None:
+        return fast(raw)
+    return get_validator().is_valid(raw)
+
+
+def __getattr__(name: str):
+    # 兼容旧的模块级常量 SCHEMA / VALIDATOR（按需构建）
+    if name == "SCHEMA":
+        return get_validator().schema
+    if name == "VALIDATOR":
+        return get_validator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# 动作数达到该值时构建列式 IR（pudao.dsl.columnar，0=始终用 pydantic 模型）
+COLUMNAR_MIN_ACTIONS = int(os.getenv("PFSB_COLUMNAR_MIN_ACTIONS", "2000"))
+
+# 超过该大小的输入用 mmap 读取（哈希与 YAML 解析直接在映射上进行）
+MMAP_THRESHOLD_BYTES = int(os.getenv("PFSB_MMAP_THRESHOLD_BYTES", str(16 * 1024 * 1024)))
+
+# 达到该大小的输入改用流式解析（pudao.dsl.stream：分段校验、逐条动作，内存与索引成正比；0=不启用）
+STREAM_MIN_BYTES = int(os.getenv("PFSB_STREAM_MIN_BYTES", str(64 * 1024 * 1024)))
+
+_BOM = b"\xef\xbb\xbf"
+
+
+class InputBlob:
+    """
+    一次读取的策略输入：原始字节（或 mmap）+ sha256 + 大小。
+    哈希与大小随结果传给 evidence，证据落盘时不再重新打开文件。
+    """
+    __slots__ = ("path", "suffix", "data", "size", "sha256", "_mm")
+
+    def __init__(self, path: str, data, size: int, sha256: str, mm=None):
+        self.path = path
+        self.suffix = Path(path).suffix
+        self.data = data
+        self.size = size
+        self.sha256 = sha256
+        self._mm = mm
+
+    def info(self) -> Dict[str, Any]:
+        return {"exists": True, "size": self.size, "sha256": self.sha256}
+
+    def release(self) -> None:
+        """解析完成后释放缓冲（mmap 关闭）。"""
+        self.data = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def read_input(path: str) -> InputBlob:
+    """打开一次：fstat 取大小，读入（或 mmap）并计算 sha256。"""
+    try:
+        f = open(path, "rb")
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
         raise FileNotFoundError(path)
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size and size >= MMAP_THRESHOLD_BYTES:  # 空文件不能 mmap
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return InputBlob(path, mm, size, hashlib.sha256(mm).hexdigest(), mm)
+        data = f.read()
+    return InputBlob(path, data, size, hashlib.sha256(data).hexdigest())
+
+
+def _is_blank(buf, start: int) -> bool:
+    # 分块判断，避免对大文件整体 strip 复制
+    step = 1 << 16
+    for i in range(start, len(buf), step):
+        if not buf[i:i + step].isspace():
+            return False
+    return True
+
 
-    # 用 utf-8-sig 兼容 BOM
-    text = p.read_text(encoding="utf-8-sig").strip()
+def _yaml_loader():
+    import yaml
+    # 优先使用 libyaml 的 C 加速加载器
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _json_loads():
+    try:
+        import orjson  # 可选：更快的 JSON 解码器
+        return orjson.loads
+    except ImportError:
+        return json.loads
+
+
+def parse_blob(blob: InputBlob) -> Dict[str, Any]:
+    buf = blob.data
+    # 兼容 UTF-8 BOM
+    start = 3 if buf[:3] == _BOM else 0
 
     # 空文件直接报错，避免 jsonschema 出现 “None is not of type 'object'”
-    if not text:
+    if _is_blank(buf, start):
         raise ValueError("schema_violation: empty_or_null_document")
 
-    if p.suffix in [".yaml", ".yml"]:
-        data = yaml.safe_load(text)
+    if blob.suffix in [".yaml", ".yml"]:
+        import yaml
+        if isinstance(buf, mmap.mmap):
+            buf.seek(start)
+            data = yaml.load(buf, Loader=_yaml_loader())
+        else:
+            data = yaml.load(buf[start:] if start else buf, Loader=_yaml_loader())
     else:
-        data = json.loads(text)
+        loads = _json_loads()
+        if loads is json.loads:
+            data = json.loads(buf[start:] if start or isinstance(buf, mmap.mmap) else buf)
+        else:
+            data = loads(memoryview(buf)[start:])  # orjson 可直接解码 memoryview，免复制
 
     # 根必须是 object/dict
     if data is None:
@@ -46,9 +176,20 @@ def load_raw(path: str) -> Dict[str, Any]:
     return data
 
 
+def load_raw(path: str) -> Dict[str, Any]:
+    blob = read_input(path)
+    try:
+        return parse_blob(blob)
+    finally:
+        blob.release()
+
+
 def validate_schema(raw: Dict[str, Any]) -> None:
     # 这里 raw 一定是 dict（上面已保证）
-    errors = sorted(VALIDATOR.iter_errors(raw), key=lambda e: e.path)
+    # 合法文档走编译后的快路径直接返回；只有不合法时才完整枚举错误
+    if schema_is_valid(raw):
+        return
+    errors = sorted(get_validator().iter_errors(raw), key=lambda e: e.path)
     if errors:
         # 给出更清晰的路径提示
         msgs = "; ".join([
@@ -58,37 +199,159 @@ def validate_schema(raw: Dict[str, Any]) -> None:
         raise ValueError(f"schema_violation: {msgs}")
 
 
-def to_ir(raw: Dict[str, Any]) -> StrategyIR:
+def to_ir(raw: Dict[str, Any]) -> "StrategyIR":
+    from pydantic import ValidationError
+    from .models import StrategyIR
     try:
         return StrategyIR.parse_obj(raw)
     except ValidationError as e:
         raise ValueError(f"schema_violation: {e}")
 
 
-def validate_ids(ir: StrategyIR) -> None:
+def _opt_float(v: Any) -> Any:
+    return None if v is None else float(v)
+
+
+def to_ir_trusted(raw: Dict[str, Any]) -> "StrategyIR":
+    """
+    由已通过 schema 的 raw 直接构建 IR（pydantic construct，不再逐字段校验）。
+    schema 已保证类型/枚举/必填项；这里只补上 schema 表达不了的部分：
+    数值统一为 float（与 parse_obj 一致）、各动作类型所需的 id、metadata 字段类型。
+    遇到不满足的情况交回 to_ir，由 pydantic 给出原有格式的错误信息。
+    """
+    from .models import StrategyIR
+
+    parts = _trusted_parts(raw)
+    if parts is None:
+        return to_ir(raw)
+
+    actions = []
+    for a in raw["actions"]:
+        act = _trusted_action(a)
+        if act is None:
+            return to_ir(raw)
+        actions.append(act)
+
+    return StrategyIR.construct(strategy_id=raw["strategy_id"], version=raw["version"],
+                                actions=actions, **parts)
+
+
+def _trusted_action(a: Dict[str, Any]) -> Any:
+    """已通过 schema 的单条动作 -> Action（construct）；缺少其类型所需的 id 时返回 None。"""
+    from .models import Action
+    t = a["type"]
+    if ((t == "vsl" and not a.get("segment_id"))
+            or (t in ("ramp_metering", "ramp_closure") and not a.get("ramp_id"))
+            or (t == "vms_message" and not a.get("vms_id"))):
+        return None
+    return Action.construct(
+        type=t,
+        segment_id=a.get("segment_id"),
+        ramp_id=a.get("ramp_id"),
+        vms_id=a.get("vms_id"),
+        value=_opt_float(a.get("value")),
+        veh_per_hour=_opt_float(a.get("veh_per_hour")),
+        ttl_s=_opt_float(a.get("ttl_s")),
+        max_duration_s=_opt_float(a.get("max_duration_s")),
+        condition=a.get("condition"),
+        text=a.get("text"),
+    )
+
+
+def to_ir_columnar(raw: Dict[str, Any]):
+    """
+    由已通过 schema 的 raw 直接构建列式 IR（ColumnarIR，见 pudao.dsl.columnar）：
+    动作不逐条构造对象；其余部分与 to_ir_trusted 相同。不满足条件时同样交回 pydantic。
+    """
+    from .columnar import ActionTable, ColumnarIR
+    parts = _trusted_parts(raw)
+    table = ActionTable.from_raw(raw["actions"]) if parts is not None else None
+    if table is None:
+        return to_ir(raw)
+    return ColumnarIR(strategy_id=raw["strategy_id"], version=raw["version"], actions=table, **parts)
+
+
+def _trusted_parts(raw: Dict[str, Any]) -> Any:
+    """scope / guardrails / rollout / metadata（pydantic construct）；metadata 类型不符时返回 None。"""
+    from .models import Guardrails, Metadata, Rollout, Scope
+
+    sc = raw["scope"]
+    scope = Scope.construct(
+        roadchain_id=sc["roadchain_id"],
+        segments=list(sc.get("segments", [])),
+        ramps=list(sc.get("ramps", [])),
+        vms=list(sc.get("vms", [])),
+    )
+
+    g = raw["guardrails"]
+    mc = g.get("max_changes_per_5min", 0)
+    guardrails = Guardrails.construct(
+        min_vsl=float(g["min_vsl"]),
+        max_vsl=float(g["max_vsl"]),
+        max_delta=float(g["max_delta"]),
+        max_changes_per_5min=None if mc is None else int(mc),
+        max_ramp_queue=_opt_float(g.get("max_ramp_queue")),
+        max_closure_s=_opt_float(g.get("max_closure_s")),
+        always_keep_emergency_lane_free=g.get("always_keep_emergency_lane_free", True),
+    )
+
+    ro = raw["rollout"]
+    rollout = Rollout.construct(mode=ro["mode"],
+                                max_revert_time_s=_opt_float(ro.get("max_revert_time_s")))
+
+    md = raw.get("metadata") or {}
+    fields = {k: md.get(k) for k in ("author", "source", "rationale")}
+    if any(v is not None and not isinstance(v, str) for v in fields.values()):
+        return None
+
+    return {"scope": scope, "guardrails": guardrails, "rollout": rollout,
+            "metadata": Metadata.construct(**fields)}
+
+
+def validate_ids(ir: "StrategyIR") -> None:
     # I1: 结构与引用合法性（简化）
-    for seg in ir.scope.segments:
-        if not id_registry.is_valid_segment(seg):
-            raise ValueError(f"invalid_reference: segment {seg}")
-    for r in ir.scope.ramps:
-        if not id_registry.is_valid_ramp(r):
-            raise ValueError(f"invalid_reference: ramp {r}")
-    for v in ir.scope.vms:
-        if not id_registry.is_valid_vms(v):
-            raise ValueError(f"invalid_reference: vms {v}")
-
-    for act in ir.actions:
-        if act.type == "vsl" and act.segment_id and not id_registry.is_valid_segment(act.segment_id):
-            raise ValueError(f"invalid_reference: segment {act.segment_id}")
-        if act.type in ("ramp_metering", "ramp_closure") and act.ramp_id and not id_registry.is_valid_ramp(act.ramp_id):
-            raise ValueError(f"invalid_reference: ramp {act.ramp_id}")
-        if act.type == "vms_message" and act.vms_id and not id_registry.is_valid_vms(act.vms_id):
-            raise ValueError(f"invalid_reference: vms {act.vms_id}")
-
-
-def load_strategy_ir(path: str) -> StrategyIR:
-    raw = load_raw(path)
-    validate_schema(raw)
-    ir = to_ir(raw)
-    validate_ids(ir)
+    # 收集全部引用后一次批量查找；报错顺序与逐个检查时一致（scope 在前，actions 在后）
+    refs = [("segment", s) for s in ir.scope.segments]
+    refs += [("ramp", r) for r in ir.scope.ramps]
+    refs += [("vms", v) for v in ir.scope.vms]
+    refs += action_refs(ir.actions)  # 列式 IR 每个目标只查一次
+
+    bad = get_id_registry().validate_ids(refs)
+    if bad:
+        kind, ref = bad[0]
+        raise ValueError(f"invalid_reference: {kind} {ref}")
+
+
+def ir_from_blob(blob: InputBlob) -> "StrategyIR":
+    """解析 -> Schema -> IR -> ID 校验；完成后释放 blob 缓冲（哈希/大小保留）。各阶段记为 span。"""
+    if STREAM_MIN_BYTES and blob.size >= STREAM_MIN_BYTES:
+        from .stream import ir_from_stream
+        try:
+            return ir_from_stream(blob)
+        finally:
+            blob.release()
+    try:
+        with span("decode"):
+            raw = parse_blob(blob)
+    finally:
+        blob.release()
+    with span("schema"):
+        valid = schema_is_valid(raw)
+        if not valid:
+            validate_schema(raw)  # 抛出完整的错误列表
+    with span("ir") as sp:
+        # schema 已保证结构与类型：跳过 pydantic 的逐字段二次校验；大策略构建列式 IR
+        if not valid:
+            ir = to_ir(raw)
+        elif COLUMNAR_MIN_ACTIONS and len(raw["actions"]) >= COLUMNAR_MIN_ACTIONS:
+            ir = to_ir_columnar(raw)
+            sp.set(columnar=True)
+        else:
+            ir = to_ir_trusted(raw)
+    with span("ids"):
+        validate_ids(ir)
     return ir
+
+
+def load_strategy_ir(path: str) -> "StrategyIR":
+    return ir_from_blob(read_input(path))
@@ -0,0 +1,142 @@
+# pudao/dsl/schema_compiler.py
+"""把 strategy_schema.json 编译为 Python 校验函数（快路径）。
+
+生成的 is_valid(doc) -> bool 只回答“是否合法”，遇到第一个不合法处立即返回 False，
+合法文档不构造任何错误对象；不合法时由调用方回退到 jsonschema 做完整错误枚举。
+
+支持 Draft-7 的子集：type / enum / required / properties / additionalProperties /
+items（单一 schema）/ minLength / minItems / minimum；title/description 等注解忽略。
+遇到其它关键字时 compile_schema 抛 NotImplementedError（调用方只走 jsonschema）。
+
+生成的源码只在进程内编译（调用方按 schema 缓存结果），不读写磁盘：
+磁盘上的校验模块一旦被替换或过期，exec 即执行任意代码，且返回 True 的 is_valid
+会让文档跳过 jsonschema 与 pydantic 两道校验。生成本身只需几毫秒。
+"""
+from typing import Any, Callable, Dict, List
+
+_ANNOTATIONS = {"$schema", "$id", "title", "description", "default", "examples", "$comment"}
+_SUPPORTED = {"type", "enum", "required", "properties", "additionalProperties",
+              "items", "minLength", "minItems", "minimum"} | _ANNOTATIONS
+
+_TYPE_CHECKS = {
+    "string": "isinstance({x}, str)",
+    "number": "(isinstance({x}, (int, float)) and not isinstance({x}, bool))",
+    "integer": "((isinstance({x}, int) and not isinstance({x}, bool))"
+               " or (isinstance({x}, float) and {x}.is_integer()))",
+    "boolean": "isinstance({x}, bool)",
+    "object": "isinstance({x}, dict)",
+    "array": "isinstance({x}, list)",
+    "null": "({x} is None)",
+}
+
+
+class _Gen:
+    def __init__(self):
+        self.funcs: List[str] = []
+        self.consts: List[str] = []
+        self.n = 0
+
+    def const(self, value: Any) -> str:
+        name = f"_C{len(self.consts)}"
+        self.consts.append(f"{name} = {value!r}")
+        return name
+
+    def schema(self, sch: Any) -> str:
+        """为子 schema 生成函数，返回函数名。"""
+        if sch is True or sch == {}:
+            return "_true"
+        if sch is False:
+            return "_false"
+        if not isinstance(sch, dict):
+            raise NotImplementedError(f"unsupported schema node: {sch!r}")
+        unknown = set(sch) - _SUPPORTED
+        if unknown:
+            raise NotImplementedError(f"unsupported keywords: {sorted(unknown)}")
+
+        name = f"_v{self.n}"
+        self.n += 1
+        body: List[str] = []
+
+        t = sch.get("type")
+        if t is not None:
+            types = [t] if isinstance(t, str) else list(t)
+            for ty in types:
+                if ty not in _TYPE_CHECKS:
+                    raise NotImplementedError(f"unsupported type: {ty}")
+            cond = " or ".join(_TYPE_CHECKS[ty].format(x="x") for ty in types)
+            body.append(f"if not ({cond}): return False")
+
+        if "enum" in sch:
+            # 用 (type, value) 比较，避免 Python 中 1 == True 的混淆
+            pairs = self.const(frozenset((type(v).__name__, v) for v in sch["enum"]
+                                         if not isinstance(v, (list, dict))))
+            body.append(f"if (type(x).__name__, x) not in {pairs}: return False")
+
+        if "minLength" in sch:
+            body.append(f"if isinstance(x, str) and len(x) < {int(sch['minLength'])}: return False")
+        if "minimum" in sch:
+            body.append(f"if {_TYPE_CHECKS['number'].format(x='x')} and x < {sch['minimum']!r}: return False")
+        if "minItems" in sch:
+            body.append(f"if isinstance(x, list) and len(x) < {int(sch['minItems'])}: return False")
+
+        if "items" in sch:
+            if not isinstance(sch["items"], (dict, bool)):
+                raise NotImplementedError("tuple-form items")
+            fn = self.schema(sch["items"])
+            if fn != "_true":
+                body.append("if isinstance(x, list):")
+                body.append(f"    for it in x:")
+                body.append(f"        if not {fn}(it): return False")
+
+        obj: List[str] = []
+        for k in sch.get("required", []):
+            obj.append(f"if {k!r} not in x: return False")
+        props: Dict[str, Any] = sch.get("properties", {})
+        addl = sch.get("additionalProperties", True)
+        if addl is not True:
+            allowed = self.const(frozenset(props))
+            if addl is False:
+                obj.append(f"for k in x:")
+                obj.append(f"    if k not in {allowed}: return False")
+            else:
+                afn = self.schema(addl)
+                obj.append(f"for k, v in x.items():")
+                obj.append(f"    if k not in {allowed} and not {afn}(v): return False")
+        for k, sub in props.items():
+            fn = self.schema(sub)
+            if fn == "_true":
+                continue
+            obj.append(f"v = x.get({k!r}, _MISSING)")
+            obj.append(f"if v is not _MISSING and not {fn}(v): return False")
+        if obj:
+            body.append("if isinstance(x, dict):")
+            body.extend("    " + line for line in obj)
+
+        body.append("return True")
+        self.funcs.append(f"def {name}(x):\n" + "\n".join("    " + line for line in body) + "\n")
+        return name
+
+
+def compile_schema(schema: Dict[str, Any]) -> str:
+    """生成校验模块源码，入口函数为 is_valid(doc)。"""
+    g = _Gen()
+    root = g.schema(schema)
+    parts = [
+        "# 由 pudao.dsl.schema_compiler 自动生成，请勿手工修改",
+        "_MISSING = object()",
+        "def _true(x): return True",
+        "def _false(x): return False",
+        *g.consts,
+        "",
+        *g.funcs,
+        f"is_valid = {root}",
+        "",
+    ]
+    return "\n".join(parts)
+
+
+def load_compiled_validator(schema: Dict[str, Any]) -> Callable[[Any], bool]:
+    """由 schema 生成校验模块并在内存中编译，返回 is_valid。"""
+    ns: Dict[str, Any] = {}
+    exec(compile(compile_schema(schema), "<compiled-schema>", "exec"), ns)
+    return ns["is_valid"]
@@ -0,0 +1,399 @@
+# pudao/dsl/stream.py
+"""超大策略文档的流式解析（内存与索引成正比，而非与文档成正比）。
+
+整体解析（parser.parse_blob）先把整棵文档树物化再做 schema 校验：几百 MB 的机器生成策略
+需要数倍于文件的内存，且要到最后才发现第一处错误。流式模式按事件逐段读取：
+- 顶层字段（strategy_id / version / scope / guardrails / rollout / metadata）读完即按 schema 的对应分支校验；
+- actions 数组逐条解码、逐条校验，追加进列式动作表（pudao.dsl.columnar.ActionTable），随即丢弃原始对象；
+- 新出现的目标 ID 分批查注册表（scope 校验之后，报错顺序与整体解析一致：scope 在前、actions 在后）；
+- 遇到第一处结构错误即抛出 ValueError("schema_violation: <路径>: <信息>")，不再读后续内容。
+
+JSON 用标准库 JSONDecoder.raw_decode 在分块缓冲上逐个值解码；YAML 用 PyYAML 的事件接口
+（有 libyaml 时用 CParser），按节点组装单个字段 / 单条动作。
+常驻内存 = 列式动作表 + 头部各段 + 一个读缓冲（PFSB_STREAM_CHUNK_BYTES）。
+"""
+import codecs
+import io
+import json
+import mmap
+import os
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pudao.evidence.trace import span
+from .columnar import ActionTable, ColumnarIR
+from .id_registry import get_id_registry
+from . import parser
+
+# 读缓冲大小（JSON 每次读取的字节数）
+STREAM_CHUNK_BYTES = int(os.getenv("PFSB_STREAM_CHUNK_BYTES", str(1024 * 1024)))
+# 每攒够这么多新目标查一次 ID 注册表
+STREAM_ID_BATCH = int(os.getenv("PFSB_STREAM_ID_BATCH", "16384"))
+
+
+# ---- schema 分段校验 ----
+
+@lru_cache(maxsize=None)
+def _section_validators() -> Dict[str, Tuple[Any, Any]]:
+    """顶层各字段与单条动作（"actions.item"）的 (快路径函数或 None, Draft7Validator)。"""
+    from jsonschema import Draft7Validator
+    from .schema_compiler import load_compiled_validator
+
+    props = parser.get_validator().schema["properties"]
+    subs = dict(props)
+    subs["actions.item"] = props["actions"]["items"]
+    out = {}
+    for name, sub in subs.items():
+        fast = None
+        if parser.SCHEMA_FASTPATH:
+            try:
+                fast = load_compiled_validator(sub)
+            except NotImplementedError:
+                fast = None
+        out[name] = (fast, Draft7Validator(sub))
+    return out
+
+
+def _check_section(name: str, value: Any, path: Tuple) -> None:
+    fast, validator = _section_validators()[name]
+    if fast(value) if fast is not None else validator.is_valid(value):
+        return
+    errors = sorted(validator.iter_errors(value), key=lambda e: e.path)
+    msgs = "; ".join(f"{'/'.join(map(str, (*path, *e.path)))}: {e.message}" for e in errors)
+    raise ValueError(f"schema_violation: {msgs}")
+
+
+def _parse_model(model, value: Any, path: Tuple) -> Any:
+    """schema 表达不了的约束交给 pydantic 模型，错误转为与 schema 错误相同的路径格式。"""
+    from pydantic import ValidationError
+    try:
+        return model.parse_obj(value)
+    except ValidationError as e:
+        msgs = "; ".join(f"{'/'.join(map(str, (*path, *err['loc'])))}: {err['msg']}" for err in e.errors())
+        raise ValueError(f"schema_violation: {msgs}")
+
+
+# ---- 事件源：("field", key, value) / ("action", value) ----
+
+class _JsonEvents:
+    """在分块缓冲上逐个值调用 raw_decode；只有 actions 数组按元素拆开。"""
+    __slots__ = ("f", "chunk", "dec", "decoder", "buf", "pos", "base", "eof")
+
+    def __init__(self, f, chunk: int):
+        self.f = f
+        self.chunk = chunk
+        self.dec = codecs.getincrementaldecoder("utf-8-sig")()  # 兼容 UTF-8 BOM
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.base = 0  # buf[0] 在整个文档中的字符偏移
+        self.eof = False
+
+    def _fill(self, want: int = 0) -> bool:
+        """丢弃已消费部分并至少再读一块（want 为期望的缓冲长度）；已到文件尾时返回 False。"""
+        if self.eof:
+            return False
+        parts = [self.buf[self.pos:]]
+        have = len(parts[0])
+        self.base += self.pos
+        self.pos = 0
+        while True:
+            data = self.f.read(self.chunk)
+            if not data:
+                self.eof = True
+                parts.append(self.dec.decode(b"", final=True))
+                break
+            text = self.dec.decode(data)
+            parts.append(text)
+            have += len(text)
+            if have >= want:
+                break
+        self.buf = "".join(parts)
+        return True
+
+    def _error(self, msg: str, pos: Optional[int] = None) -> ValueError:
+        return ValueError(f"{msg}: char {self.base + (self.pos if pos is None else pos)}")
+
+    def _peek(self) -> str:
+        """跳过空白，返回下一个字符（文件尾为空串）。"""
+        while True:
+            buf, n = self.buf, len(self.buf)
+            p = self.pos
+            while p < n and buf[p] in " \t\r\n":
+                p += 1
+            self.pos = p
+            if p < n:
+                return buf[p]
+            if not self._fill():
+                return ""
+
+    def _expect(self, ch: str, what: str) -> None:
+        if self._peek() != ch:
+            raise self._error(f"Expecting {what}")
+        self.pos += 1
+
+    def _value(self) -> Any:
+        """解码下一个完整的值；值可能跨块时扩大缓冲重试（按倍数增长，总代价与值大小成正比）。"""
+        self._peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # 缓冲尾部截断（未闭合的字符串、被截断的字面量 / 分隔符）：读入更多再试
+                truncated = e.msg.startswith("Unterminated string") or len(self.buf) - e.pos <= 16
+                if truncated and self._fill(2 * (len(self.buf) - self.pos) + self.chunk):
+                    continue
+                raise self._error(e.msg, e.pos)
+            if end == len(self.buf) and self._fill(len(self.buf) - self.pos + 1):
+                continue  # 数字可能在块边界被截断
+            self.pos = end
+            return obj
+
+    def events(self) -> Iterator[Tuple]:
+        c = self._peek()
+        if c == "":
+            raise ValueError("schema_violation: empty_or_null_document")
+        if c != "{":
+            root = "list" if c == "[" else type(self._value()).__name__
+            if root == "NoneType":
+                raise ValueError("schema_violation: empty_or_null_document")
+            raise ValueError(f"schema_violation: root_must_be_object_got_{root}")
+        self.pos += 1
+        if self._peek() == "}":
+            self.pos += 1
+        else:
+            while True:
+                if self._peek() != '"':
+                    raise self._error("Expecting property name enclosed in double quotes")
+                key = self._value()
+                self._expect(":", "':' delimiter")
+                if key == "actions" and self._peek() == "[":
+                    yield from self._actions()
+                else:
+                    yield ("field", key, self._value())
+                c = self._peek()
+                self.pos += 1
+                if c == "}":
+                    break
+                if c != ",":
+                    raise self._error("Expecting ',' delimiter", self.pos - 1)
+        if self._peek() != "":
+            raise self._error("Extra data")
+
+    def _actions(self) -> Iterator[Tuple]:
+        self.pos += 1  # "["
+        yield ("actions_begin",)
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield ("action", self._value())
+            c = self._peek()
+            self.pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise self._error("Expecting ',' delimiter", self.pos - 1)
+
+
+def _yaml_loader_class():
+    import yaml
+    from yaml.composer import Composer
+    from yaml.constructor import SafeConstructor
+    from yaml.resolver import Resolver
+
+    try:
+        from yaml.cyaml import CParser as cparser
+    except ImportError:  # 没有 libyaml
+        return yaml.SafeLoader
+
+    class _CStreamLoader(cparser, Composer, SafeConstructor, Resolver):
+        # libyaml 产生事件，逐节点组装仍用 Python 的 Composer
+        def __init__(self, stream):
+            cparser.__init__(self, stream)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+            Composer.__init__(self)
+
+    return _CStreamLoader
+
+
+def _yaml_events(f) -> Iterator[Tuple]:
+    from yaml.events import (DocumentStartEvent, MappingEndEvent, MappingStartEvent,
+                             SequenceEndEvent, SequenceStartEvent, StreamEndEvent)
+
+    loader = _yaml_loader_class()(f)
+
+    def construct():
+        node = loader.compose_node(None, None)
+        obj = loader.construct_object(node, deep=True)
+        loader.constructed_objects.clear()  # 已构造对象不再缓存（别名按需重新构造）
+        return obj
+
+    try:
+        loader.get_event()  # StreamStart
+        if not loader.check_event(DocumentStartEvent):
+            raise ValueError("schema_violation: empty_or_null_document")
+        loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            root = construct()
+            if root is None:
+                raise ValueError("schema_violation: empty_or_null_document")
+            raise ValueError(f"schema_violation: root_must_be_object_got_{type(root).__name__}")
+        loader.get_event()
+        while not loader.check_event(MappingEndEvent):
+            key = construct()
+            ev = loader.peek_event()
+            if key == "actions" and isinstance(ev, SequenceStartEvent) and ev.anchor is None:
+                loader.get_event()
+                yield ("actions_begin",)
+                while not loader.check_event(SequenceEndEvent):
+                    yield ("action", construct())
+                loader.get_event()
+            else:
+                yield ("field", key, construct())
+        loader.get_event()  # MappingEnd
+        loader.get_event()  # DocumentEnd
+        if not loader.check_event(StreamEndEvent):
+            raise ValueError("schema_violation: expected a single document in the stream")
+    finally:
+        loader.dispose()
+
+
+# ---- 组装：逐事件校验并写入 IR ----
+
+class _Assembler:
+    __slots__ = ("header", "actions", "columnar", "n", "has_actions", "seen", "pending", "scope_refs",
+                 "scope_done", "registry")
+
+    def __init__(self, columnar: bool):
+        self.header: Dict[str, Any] = {}
+        self.columnar = columnar
+        self.actions: Any = ActionTable() if columnar else []
+        self.n = 0
+        self.has_actions = False
+        self.seen = set()  # 非列式时去重目标（列式表自带驻留）
+        self.pending: List[Tuple[str, str]] = []
+        self.scope_refs = set()  # 已随 scope 校验过的引用，动作目标不再重复查找
+        self.scope_done = False
+        self.registry = get_id_registry()
+
+    def field(self, key: Any, value: Any) -> None:
+        schema = parser.get_validator().schema
+        if key not in schema["properties"]:
+            if schema.get("additionalProperties", True) is False:
+                raise ValueError("schema_violation: <root>: "
+                                 f"Additional properties are not allowed ({key!r} was unexpected)")
+            return
+        if key == "actions":
+            # 非数组 / 空数组 / 带锚点的数组：整体给出的 actions 也逐条处理
+            _check_section("actions", value, ("actions",))
+            self.begin_actions()
+            for a in value:
+                self.action(a)
+            return
+        _check_section(key, value, (key,))
+        self.header[key] = value
+        if key == "scope":
+            refs = [("segment", s) for s in value.get("segments", [])]
+            refs += [("ramp", r) for r in value.get("ramps", [])]
+            refs += [("vms", v) for v in value.get("vms", [])]
+            self._check_ids(refs)
+            self.scope_refs = set(refs)
+            self.scope_done = True
+            self._flush()
+
+    def begin_actions(self) -> None:
+        # 重复的 actions 键：与整体解析一致，以最后一次为准
+        self.actions = ActionTable() if self.columnar else []
+        self.n = 0
+        self.has_actions = True
+        self.seen.clear()
+        self.pending.clear()
+
+    def action(self, a: Any) -> None:
+        i = self.n
+        _check_section("actions.item", a, ("actions", i))
+        if self.columnar:
+            t = self.actions
+            k = len(t.targets)
+            if not t.extend((a,)):
+                self._missing_id(a, i)
+            if len(t.targets) > k:
+                self.pending.append(t.targets[-1])
+        else:
+            act = parser._trusted_action(a)
+            if act is None:
+                self._missing_id(a, i)
+            self.actions.append(act)
+            ref = parser.action_refs((act,))[0]
+            if ref not in self.seen:
+                self.seen.add(ref)
+                self.pending.append(ref)
+        self.n = i + 1
+        if self.scope_done and len(self.pending) >= STREAM_ID_BATCH:
+            self._flush()
+
+    def _missing_id(self, a: Dict[str, Any], i: int) -> None:
+        from .models import Action
+        _parse_model(Action, a, ("actions", i))
+        raise ValueError(f"schema_violation: actions/{i}: missing target id")  # 不应到达
+
+    def _check_ids(self, refs: List[Tuple[str, str]]) -> None:
+        bad = self.registry.validate_ids(refs)
+        if bad:
+            kind, ref = bad[0]
+            raise ValueError(f"invalid_reference: {kind} {ref}")
+
+    def _flush(self) -> None:
+        if self.pending:
+            self._check_ids([r for r in self.pending if r not in self.scope_refs])
+            self.pending.clear()
+
+    def finish(self) -> Any:
+        schema = parser.get_validator().schema
+        for key in schema.get("required", []):
+            if not (key in self.header or (key == "actions" and self.has_actions)):
+                raise ValueError(f"schema_violation: <root>: {key!r} is a required property")
+        if self.n == 0:
+            _check_section("actions", [], ("actions",))  # minItems
+        self._flush()
+
+        parts = parser._trusted_parts(self.header)
+        if parts is None:  # metadata 字段类型不符：按 pydantic 的规则转换或报错
+            from .models import Metadata
+            parts = parser._trusted_parts({**self.header, "metadata": None})
+            parts["metadata"] = _parse_model(Metadata, self.header["metadata"], ("metadata",))
+        if self.columnar:
+            return ColumnarIR(strategy_id=self.header["strategy_id"], version=self.header["version"],
+                              actions=self.actions.seal(), **parts)
+        from .models import StrategyIR
+        return StrategyIR.construct(strategy_id=self.header["strategy_id"], version=self.header["version"],
+                                    actions=self.actions, **parts)
+
+
+def _open_blob(blob: "parser.InputBlob"):
+    if isinstance(blob.data, mmap.mmap):
+        blob.data.seek(0)
+        return blob.data
+    return io.BytesIO(blob.data)
+
+
+def ir_from_stream(blob: "parser.InputBlob") -> Any:
+    """流式解析 -> 分段 Schema -> IR（动作数达 COLUMNAR_MIN_ACTIONS 阈值的设置时为列式）-> ID 校验。"""
+    f = _open_blob(blob)
+    yaml_input = blob.suffix in (".yaml", ".yml")
+    asm = _Assembler(columnar=parser.COLUMNAR_MIN_ACTIONS > 0)
+    with span("stream", format="yaml" if yaml_input else "json") as sp:
+        events = _yaml_events(f) if yaml_input else _JsonEvents(f, STREAM_CHUNK_BYTES).events()
+        for ev in events:
+            kind = ev[0]
+            if kind == "action":
+                asm.action(ev[1])
+            elif kind == "field":
+                asm.field(ev[1], ev[2])
+            else:
+                asm.begin_actions()
+        ir = asm.finish()
+        sp.set(actions=asm.n, columnar=asm.columnar)
+    return ir
@@ -6,27 +6,25 @@
 
 run_id 可用 PFSB_RUN_ID 固定（比如一次 CI 运行一个 ID）。
 
-可用 PFSB_LABEL 给整批测试打标签（如 unit-tests）。"""
+可用 PFSB_LABEL 给整批测试打标签（如 unit-tests）。
+
+写入经由缓冲 sink（sink.py）：攒批落盘、多进程加锁、按大小/时间轮转并压缩，
+相关 PFSB_EVIDENCE_* 变量见 sink.py。"""
 
-import json
 import os
 import uuid
 import hashlib
 from pathlib import Path
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional
+
+from pudao.evidence.sink import get_sink, flush_all
+from pudao.evidence.trace import iso_utc
 
 # 环境变量可覆盖输出位置 / 运行批次标识 / 用例标签
 EVIDENCE_FILE = os.getenv("PFSB_EVIDENCE_FILE", "evidence/formal_timings.ndjson")
 RUN_ID = os.getenv("PFSB_RUN_ID", uuid.uuid4().hex[:12])  # 每进程唯一批次ID
 DEFAULT_LABEL = os.getenv("PFSB_LABEL")  # 可选：给整批运行打一个标签
 
-def _iso_utc() -> str:
-    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
-
-def _ensure_parent(path: Path) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-
 def _sha256_file(path: Path) -> Optional[str]:
     try:
         h = hashlib.sha256()
@@ -41,40 +39,82 @@ def append_raw(record: Dict[str, Any], out_path: Optional[str] = None) -> str:
     """
     直接写入一条 NDJSON 记录；返回文件路径。
     """
-    out = Path(out_path or EVIDENCE_FILE)
-    _ensure_parent(out)
-    with out.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
-    return str(out)
+    return append_records([record], out_path)
 
-def append_formal_timing(input_path: str, result: Dict[str, Any],
-                         label: Optional[str] = None,
-                         out_path: Optional[str] = None) -> str:
+def append_records(records: Iterable[Dict[str, Any]], out_path: Optional[str] = None) -> str:
     """
-    将 Formal Gate 的结果（含 timestamps/timings_ms）写入 evidence。
-    - input_path: 校验的策略文件路径
-    - result: check_formal_file(...) 返回的 dict
-    - label: 可选标签（不传则用默认环境变量 PFSB_LABEL）
-    - out_path: 可覆写输出文件（默认 EVIDENCE_FILE）
+    批量写入多条 NDJSON 记录；返回文件路径。
+    经由进程级缓冲 sink（见 sink.py）：按批/按时间落盘，进程退出时保证 flush。
+    """
+    out = str(out_path or EVIDENCE_FILE)
+    get_sink(out).write_many(records)
+    return out
+
+def flush_evidence(out_path: Optional[str] = None) -> None:
+    """立即落盘缓冲中的 evidence（不传 out_path 则落盘全部文件）。"""
+    if out_path is None:
+        flush_all()
+    else:
+        get_sink(str(out_path)).flush()
+
+def build_formal_record(input_path: str, result: Dict[str, Any],
+                        label: Optional[str] = None) -> Dict[str, Any]:
+    """
+    由 Formal Gate 的结果构造一条 evidence 记录（不落盘）。
+    批量模式下由 worker 构造、主进程统一写入。
     """
     p = Path(input_path)
+    info = result.get("input")
+    if info is None:
+        # 结果未携带输入信息（如超时/异常）：回退为重新 stat + 哈希
+        exists = p.exists()
+        info = {
+            "exists": exists,
+            "size": (p.stat().st_size if exists else None),
+            "sha256": (_sha256_file(p) if exists else None),
+        }
     rec = {
         "run_id": RUN_ID,
-        "ts_utc": _iso_utc(),
+        "ts_utc": iso_utc(),
         "label": label or DEFAULT_LABEL,
-        "input": {
-            "path": str(p),
-            "exists": p.exists(),
-            "size": (p.stat().st_size if p.exists() else None),
-            "sha256": (_sha256_file(p) if p.exists() else None),
-        },
+        "input": {"path": str(p), **info},
         "verdict": {
             "status": result.get("status"),
             "allow": result.get("allow"),
             "reason_top": (result.get("reasons") or [None])[0],
             "details": result.get("details"),
         },
+        "cache": result.get("cache"),
         "timestamps": result.get("timestamps"),
         "timings_ms": result.get("timings_ms"),
     }
-    return append_raw(rec, out_path)
+    if result.get("solver") is not None:
+        rec["solver"] = result["solver"]  # 求解配置 / 预算 / portfolio 赢家
+    if result.get("violations"):
+        # 按原因类别计数 + 首条违规的结构化记录（完整列表留在结果中，evidence 保持紧凑）
+        by_code: Dict[str, int] = {}
+        for v in result["violations"]:
+            by_code[v["code"]] = by_code.get(v["code"], 0) + 1
+        rec["verdict"]["violations"] = {"total": len(result["violations"]), "by_code": by_code,
+                                        "top": result["violations"][0]}
+    if result.get("unsat_core") is not None:
+        rec["verdict"]["unsat_core"] = result["unsat_core"]
+    if result.get("incremental") is not None:
+        rec["incremental"] = result["incremental"]  # 增量复核：基准版本与复核范围
+    if result.get("trace") is not None:
+        rec["trace"] = result["trace"]  # 采样到的 span 树（见 trace.py）
+    if result.get("profile") is not None:
+        rec["profile"] = result["profile"]  # 剖析文件路径与摘要（见 profile.py）
+    return rec
+
+def append_formal_timing(input_path: str, result: Dict[str, Any],
+                         label: Optional[str] = None,
+                         out_path: Optional[str] = None) -> str:
+    """
+    将 Formal Gate 的结果（含 timestamps/timings_ms）写入 evidence。
+    - input_path: 校验的策略文件路径
+    - result: check_formal_file(...) 返回的 dict
+    - label: 可选标签（不传则用默认环境变量 PFSB_LABEL）
+    - out_path: 可覆写输出文件（默认 EVIDENCE_FILE）
+    """
+    return append_raw(build_formal_record(input_path, result, label), out_path)
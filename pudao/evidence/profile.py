@@ -0,0 +1,240 @@
+# pudao/evidence/profile.py
+"""剖析模式（pudao formal check --profile / check_formal_file(profile=True)）。
+
+一次校验在剖析模式下额外采集：
+- CPU：cProfile 覆盖整次校验，按函数（tottime / cumtime / 调用次数）与顶层包
+  （pydantic / jsonschema / z3 / yaml / pudao / stdlib …）汇总；
+- 内存：tracemalloc 在每个 span 开闭时取峰值，得到各阶段（parse / schema / ir / solver / encode …）
+  相对阶段开始时的内存峰值与净增长；
+- Z3：encoder 中每次 check 后的 Solver.statistics()（conflicts / decisions / memory …），
+  经 trace.record_solver() 记录；差分约束引擎与 portfolio 子进程不经过 Z3，不产生这一项。
+
+结果写成一个自包含的 JSON 文件（默认在 evidence 文件旁的 profiles/ 目录，可用 PFSB_PROFILE_DIR 改），
+结论与 evidence 中的 profile 字段给出文件路径与摘要；`pudao profile show <文件>` 渲染热点。
+
+剖析模式跳过结论缓存与增量复核（总是完整校验），且 cProfile / tracemalloc 本身会显著拉长耗时：
+剖析结果用于看比例与热点，不与常规 evidence 的绝对耗时比较。
+"""
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+from pudao.evidence.evidence import EVIDENCE_FILE, RUN_ID
+from pudao.evidence.trace import Span, Trace, iso_utc
+
+PROFILE_DIR = os.getenv("PFSB_PROFILE_DIR") or os.path.join(os.path.dirname(EVIDENCE_FILE) or ".", "profiles")
+PROFILE_MAX_FUNCS = int(os.getenv("PFSB_PROFILE_MAX_FUNCS", "300"))  # 写入文件的函数条数（按 cumtime）
+PROFILE_VERSION = 1
+
+# 结论中的 Z3 统计摘要只保留这几项（完整统计在剖析文件里）
+Z3_SUMMARY_KEYS = ("conflicts", "decisions", "propagations", "memory", "max memory", "rlimit count")
+
+
+class Profiler:
+    """cProfile + tracemalloc + Z3 统计；作为 Trace.profile 挂在一次校验上。"""
+    __slots__ = ("_cpu", "_frames", "_mem", "_z3", "_own_tracemalloc", "_active")
+
+    def __init__(self):
+        self._cpu = None
+        self._frames: List[List[int]] = []  # [id(span), 开始时的内存, 目前见到的峰值]
+        self._mem: Dict[int, Dict[str, float]] = {}
+        self._z3: Dict[str, Dict[str, Any]] = {}
+        self._own_tracemalloc = False
+        self._active = False
+
+    def start(self) -> "Profiler":
+        import cProfile
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+        self._cpu = cProfile.Profile()
+        try:
+            self._cpu.enable()
+        except ValueError:  # 已有其它剖析器（如外层 cProfile / 覆盖率工具）：只采集内存与 Z3
+            self._cpu = None
+        self._active = True
+        return self
+
+    def enter(self, sp: Span) -> None:
+        if not self._active:
+            return
+        import tracemalloc
+        cur, peak = tracemalloc.get_traced_memory()
+        if self._frames:
+            outer = self._frames[-1]
+            outer[2] = max(outer[2], peak)
+        self._frames.append([id(sp), cur, cur])
+        tracemalloc.reset_peak()
+
+    def exit(self, sp: Span) -> None:
+        if not self._active or not self._frames or self._frames[-1][0] != id(sp):
+            return
+        self._pop_frame()
+
+    def _pop_frame(self) -> None:
+        import tracemalloc
+        cur, peak = tracemalloc.get_traced_memory()
+        key, base, seen = self._frames.pop()
+        peak = max(seen, peak)
+        self._mem[key] = {"peak_kib": (peak - base) / 1024.0, "net_kib": (cur - base) / 1024.0}
+        tracemalloc.reset_peak()
+        if self._frames:
+            outer = self._frames[-1]
+            outer[2] = max(outer[2], peak)
+
+    def solver_stats(self, label: str, solver: Any) -> None:
+        if not self._active:
+            return
+        st = solver.statistics()
+        # 同一 solver 的统计是累计值：同一标签多次记录（时序展开的各检查点）时取最后一次
+        self._z3[label] = {k: st.get_key_value(k) for k in st.keys()}
+
+    def stop(self) -> None:
+        """停止采集；仍未结束的 span（根 span 等）按当前时刻结算内存。"""
+        if not self._active:
+            return
+        if self._cpu is not None:
+            self._cpu.disable()
+        while self._frames:
+            self._pop_frame()
+        if self._own_tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+        self._active = False
+
+    def cpu_stats(self) -> Optional[Dict[str, Any]]:
+        if self._cpu is None:
+            return None
+        import pstats
+        raw = pstats.Stats(self._cpu).stats  # {(file, line, func): (cc, nc, tt, ct, callers)}
+        funcs = []
+        by_package: Dict[str, float] = {}
+        total = 0.0
+        for (file, line, func), (cc, nc, tt, ct, _callers) in raw.items():
+            total += tt
+            pkg = _package_of(file)
+            by_package[pkg] = by_package.get(pkg, 0.0) + tt
+            funcs.append({"func": func, "file": file, "line": line, "package": pkg,
+                          "ncalls": nc, "primcalls": cc, "tottime_s": tt, "cumtime_s": ct})
+        funcs.sort(key=lambda f: f["cumtime_s"], reverse=True)
+        return {
+            "total_s": total,
+            "functions_total": len(funcs),
+            "by_package": dict(sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)),
+            "functions": funcs[:PROFILE_MAX_FUNCS],
+        }
+
+    def phases(self, tr: Trace) -> List[Dict[str, Any]]:
+        depth: List[int] = []
+        out = []
+        for s in tr.spans:
+            d = depth[s.parent] + 1 if s.parent >= 0 else 0
+            depth.append(d)
+            row: Dict[str, Any] = {"name": s.name, "depth": d, "ms": s.ms}
+            row.update(self._mem.get(id(s), {}))
+            out.append(row)
+        return out
+
+
+def _package_of(file: str) -> str:
+    """cProfile 的文件名归到顶层包：site-packages/<pkg>/… → pkg，本仓库 → pudao，内建函数 → builtins。"""
+    if file == "~" or file.startswith("<"):
+        return "builtins"
+    parts = file.replace("\\", "/").split("/")
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            i = parts.index(marker)
+            if i + 1 < len(parts):
+                return parts[i + 1].split(".")[0].split("-")[0]
+    if "pudao" in parts:
+        return "pudao"
+    return "stdlib"
+
+
+def write_profile(tr: Trace, input_path: str, result: Dict[str, Any],
+                  out_dir: Optional[str] = None) -> Dict[str, Any]:
+    """停止 tr.profile 的采集，写剖析文件；返回结论里的 profile 摘要 {artifact, peak_kib, cpu_s, z3?}。"""
+    prof: Profiler = tr.profile
+    prof.stop()
+    inp = result.get("input") or {}
+    phases = prof.phases(tr)
+    artifact = {
+        "kind": "pudao-profile",
+        "version": PROFILE_VERSION,
+        "created_utc": iso_utc(),
+        "run_id": RUN_ID,
+        "input": {"path": input_path, "sha256": inp.get("sha256"), "size": inp.get("size")},
+        "status": result.get("status"),
+        "solver": result.get("solver"),
+        "phases": phases,
+        "cpu": prof.cpu_stats(),
+        "z3": prof._z3,
+    }
+    d = out_dir or PROFILE_DIR
+    name = f"{RUN_ID}-{(inp.get('sha256') or 'noinput')[:12]}-{uuid.uuid4().hex[:6]}.json"
+    path = os.path.join(d, name)
+    summary: Dict[str, Any] = {
+        "artifact": path,
+        "peak_kib": phases[0].get("peak_kib") if phases else None,
+        "cpu_s": artifact["cpu"]["total_s"] if artifact["cpu"] else None,
+    }
+    if prof._z3:
+        summary["z3"] = {label: {k: v for k, v in st.items() if k in Z3_SUMMARY_KEYS}
+                         for label, st in prof._z3.items()}
+    try:
+        os.makedirs(d, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, ensure_ascii=False, indent=1)
+    except OSError as e:
+        summary["artifact"] = None
+        summary["error"] = f"{type(e).__name__}: {e}"
+    return summary
+
+
+def load_profile(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        art = json.load(f)
+    if art.get("kind") != "pudao-profile":
+        raise ValueError(f"profile_invalid: {path} is not a pudao profile artifact")
+    return art
+
+
+SORT_KEYS = {"tottime": "tottime_s", "cumtime": "cumtime_s", "ncalls": "ncalls"}
+
+
+def format_profile(art: Dict[str, Any], top: int = 20, sort: str = "tottime") -> str:
+    """渲染剖析文件：各阶段耗时 / 内存峰值、按包汇总的 CPU、热点函数、Z3 统计。"""
+    lines = [f"input:  {art['input'].get('path')}  status={art.get('status')}  "
+             f"engine={(art.get('solver') or {}).get('engine', '-')}",
+             "",
+             f"{'phase':<36}{'ms':>10}{'peak KiB':>12}{'net KiB':>12}"]
+    for p in art.get("phases", []):
+        name = "  " * p["depth"] + p["name"]
+        peak = p.get("peak_kib")
+        net = p.get("net_kib")
+        lines.append(f"{name:<36}{p['ms']:>10.2f}"
+                     f"{'-' if peak is None else format(peak, '.1f'):>12}"
+                     f"{'-' if net is None else format(net, '.1f'):>12}")
+    cpu = art.get("cpu")
+    if cpu:
+        lines += ["", f"cpu total {cpu['total_s'] * 1000:.1f} ms by package:"]
+        for pkg, t in cpu["by_package"].items():
+            lines.append(f"  {pkg:<24}{t * 1000:>10.2f} ms  {100 * t / (cpu['total_s'] or 1):5.1f}%")
+        key = SORT_KEYS.get(sort)
+        if key is None:
+            raise ValueError(f"profile_sort_invalid: {sort} (choose from {', '.join(SORT_KEYS)})")
+        funcs = sorted(cpu["functions"], key=lambda f: f[key], reverse=True)[:top]
+        lines += ["", f"top {len(funcs)} by {sort}:",
+                  f"{'ncalls':>9}{'tottime ms':>12}{'cumtime ms':>12}  function"]
+        for f in funcs:
+            calls = str(f["ncalls"]) if f["ncalls"] == f["primcalls"] else f"{f['ncalls']}/{f['primcalls']}"
+            where = f"{f['func']}" if f["file"] == "~" else f"{f['file']}:{f['line']}({f['func']})"
+            lines.append(f"{calls:>9}{f['tottime_s'] * 1000:>12.3f}{f['cumtime_s'] * 1000:>12.3f}  {where}")
+    else:
+        lines += ["", "cpu: not captured (another profiler was active)"]
+    for label, st in (art.get("z3") or {}).items():
+        lines += ["", f"z3 {label}:"]
+        lines += [f"  {k:<24}{v}" for k, v in st.items()]
+    return "\n".join(lines)
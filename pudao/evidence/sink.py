@@ -0,0 +1,317 @@
+# pudao/evidence/sink.py
+"""缓冲、多进程安全的 evidence 写入器。
+
+- 内存攒批：满 flush_every 条或距上次落盘超过 flush_interval_s 时一次性写入（单次 write）；
+- fsync 策略：never（默认，交给 OS）| flush（每次落盘后 fsync）| always（每条记录立即落盘并 fsync）；
+- 并发：默认对目标文件加 fcntl 建议锁，整批写入不与其它进程交错；
+  也可改为按进程分片（<stem>.<pid>.ndjson），事后用 merge_shards 合并；
+- 轮转：当前文件超过 rotate_bytes 或首条记录早于 rotate_interval_s 时改名为
+  <stem>.<UTC时间>.<pid>.ndjson，释放锁后由后台线程压缩为 .gz（或 .zst，需安装 zstandard）；
+- 进程退出时（atexit）保证 flush，此时的轮转分段在当前线程同步压缩（解释器已不再等待新线程）；fork 出的子进程丢弃继承来的缓冲，避免重复写入。
+
+环境变量（均可选）：
+PFSB_EVIDENCE_FLUSH_EVERY（默认 64）、PFSB_EVIDENCE_FLUSH_INTERVAL_S（默认 1.0）、
+PFSB_EVIDENCE_FSYNC（never|flush|always）、PFSB_EVIDENCE_ROTATE_BYTES（默认 0=不轮转）、
+PFSB_EVIDENCE_ROTATE_INTERVAL_S（默认 0=不轮转）、PFSB_EVIDENCE_COMPRESS（gzip|zstd|none）、
+PFSB_EVIDENCE_SHARDS（1=按进程分片，不加锁）。
+"""
+import atexit
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from time import monotonic, time
+from typing import Any, Dict, Iterable, List, Optional
+
+try:  # 建议锁仅 POSIX 可用；其它平台退化为进程内锁
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+FLUSH_EVERY = int(os.getenv("PFSB_EVIDENCE_FLUSH_EVERY", "64"))
+FLUSH_INTERVAL_S = float(os.getenv("PFSB_EVIDENCE_FLUSH_INTERVAL_S", "1.0"))
+FSYNC_POLICY = os.getenv("PFSB_EVIDENCE_FSYNC", "never")
+ROTATE_BYTES = int(os.getenv("PFSB_EVIDENCE_ROTATE_BYTES", "0"))
+ROTATE_INTERVAL_S = float(os.getenv("PFSB_EVIDENCE_ROTATE_INTERVAL_S", "0"))
+COMPRESS = os.getenv("PFSB_EVIDENCE_COMPRESS", "gzip")
+SHARDS = os.getenv("PFSB_EVIDENCE_SHARDS", "0") == "1"
+
+
+def _utc_stamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def segment_re(path: Path) -> "re.Pattern[str]":
+    """path 轮转出的分段文件名：<stem>.<UTC时间>.<pid><suffix>[.gz|.zst]（不含 *.tmp 与按进程分片）。"""
+    return re.compile(rf"{re.escape(path.stem)}\.\d{{8}}T\d+Z\.\d+{re.escape(path.suffix)}(\.gz|\.zst)?")
+
+
+def _parse_iso(ts: str) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp()
+    except (ValueError, AttributeError):
+        return None
+
+
+def compress_segment(path: Path, method: str = COMPRESS) -> Path:
+    """
+    压缩已关闭的分段文件，返回压缩后路径（method=none 时原样返回）。
+    先写临时文件再原子改名：读者不会看到写了一半的 .gz / .zst；失败时保留未压缩的分段。
+    """
+    if method == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            method = "gzip"  # 未安装 zstandard 时退回 gzip
+    if method not in ("gzip", "zstd"):
+        return path
+    dst = path.with_name(path.name + (".gz" if method == "gzip" else ".zst"))
+    tmp = path.with_name(f"{dst.name}.{os.getpid()}.tmp")
+    try:
+        if method == "zstd":
+            with path.open("rb") as src, tmp.open("wb") as out:
+                zstandard.ZstdCompressor().copy_stream(src, out)
+        else:
+            with path.open("rb") as src, gzip.open(tmp, "wb") as out:
+                shutil.copyfileobj(src, out)
+        os.replace(str(tmp), str(dst))
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    path.unlink()
+    return dst
+
+
+def _compress_quietly(path: Path, method: str) -> None:
+    try:
+        compress_segment(path, method)
+    except OSError:
+        pass  # 保留未压缩的分段，数据不丢
+
+
+class EvidenceSink:
+    def __init__(self, path: str,
+                 flush_every: int = FLUSH_EVERY,
+                 flush_interval_s: float = FLUSH_INTERVAL_S,
+                 fsync: str = FSYNC_POLICY,
+                 rotate_bytes: int = ROTATE_BYTES,
+                 rotate_interval_s: float = ROTATE_INTERVAL_S,
+                 compress: str = COMPRESS,
+                 shard: bool = SHARDS):
+        if fsync not in ("never", "flush", "always"):
+            raise ValueError(f"invalid fsync policy: {fsync}")
+        self.base_path = Path(path)
+        self.flush_every = 1 if fsync == "always" else max(1, flush_every)
+        self.flush_interval_s = flush_interval_s
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval_s = rotate_interval_s
+        self.compress = compress
+        self.shard = shard
+
+        self._buf: List[str] = []
+        self._lock = threading.RLock()
+        self._last_flush = monotonic()
+        self._timer: Optional[threading.Timer] = None
+        self._segment_start: Dict[int, Optional[float]] = {}  # inode -> 首条记录时间
+        self._compressors: List[threading.Thread] = []  # 后台压缩已轮转分段的线程
+        self._sync_compress = False  # 进程退出阶段：同步压缩
+
+    @property
+    def path(self) -> Path:
+        if not self.shard:
+            return self.base_path
+        p = self.base_path
+        return p.with_name(f"{p.stem}.{os.getpid()}{p.suffix}")
+
+    # ---- 写入 ----
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.write_many([record])
+
+    def write_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        lines = [json.dumps(r, ensure_ascii=False) + "\n" for r in records]
+        if not lines:
+            return
+        with self._lock:
+            self._buf.extend(lines)
+            due = (len(self._buf) >= self.flush_every
+                   or monotonic() - self._last_flush >= self.flush_interval_s)
+            if due:
+                self.flush()
+            else:
+                self._arm_timer()
+
+    def _arm_timer(self) -> None:
+        # 空闲时也保证 flush_interval_s 内落盘（守护线程，不阻止进程退出）
+        if self._timer is None and self.flush_interval_s > 0:
+            self._timer = threading.Timer(self.flush_interval_s, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._last_flush = monotonic()
+            if not self._buf:
+                return
+            data = "".join(self._buf).encode("utf-8")
+            self._buf = []
+            self._write_locked(data)
+
+    def _open_locked(self) -> int:
+        """以追加模式打开当前文件并加锁；若在加锁前被其它进程轮转掉，则重开新文件。"""
+        path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if fcntl is None or self.shard:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(str(path)).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _write_locked(self, data: bytes) -> None:
+        closed = None
+        fd = self._open_locked()
+        try:
+            os.write(fd, data)
+            if self.fsync != "never":
+                os.fsync(fd)
+            closed = self._maybe_rotate(fd)
+        finally:
+            os.close(fd)  # 关闭即释放 flock
+        if closed is not None:
+            self._compress_async(closed)  # 压缩在锁外进行，不阻塞其它写入进程
+
+    # ---- 轮转 ----
+
+    def _segment_age_s(self, fd: int) -> Optional[float]:
+        ino = os.fstat(fd).st_ino
+        if ino not in self._segment_start:
+            start = None
+            try:
+                with self.path.open("r", encoding="utf-8") as f:
+                    start = _parse_iso(json.loads(f.readline()).get("ts_utc"))
+            except (OSError, ValueError, AttributeError):
+                pass
+            self._segment_start = {ino: start}
+        start = self._segment_start[ino]
+        return None if start is None else time() - start
+
+    def _maybe_rotate(self, fd: int) -> Optional[Path]:
+        """需要轮转时持锁改名当前文件，返回改名后的分段路径（由调用方在释放锁后压缩）。"""
+        size = os.fstat(fd).st_size
+        rotate = bool(self.rotate_bytes) and size >= self.rotate_bytes
+        if not rotate and self.rotate_interval_s:
+            age = self._segment_age_s(fd)
+            rotate = age is not None and age >= self.rotate_interval_s
+        if not rotate:
+            return None
+        p = self.path
+        closed = p.with_name(f"{p.stem}.{_utc_stamp()}.{os.getpid()}{p.suffix}")
+        os.replace(str(p), str(closed))  # 持锁改名：其它进程加锁后发现 inode 变化会重开
+        self._segment_start = {}
+        return closed
+
+    def _compress_async(self, closed: Path) -> None:
+        if self.compress not in ("gzip", "zstd"):
+            return
+        if self._sync_compress:
+            _compress_quietly(closed, self.compress)
+            return
+        # 非守护线程：解释器退出前等待压缩完成，不会留下半截的临时文件
+        t = threading.Thread(target=_compress_quietly, args=(closed, self.compress),
+                             name="evidence-compress")
+        with self._lock:
+            self._compressors = [c for c in self._compressors if c.is_alive()]
+            self._compressors.append(t)
+        t.start()
+
+    def close(self) -> None:
+        self.flush()
+        for t in self._compressors:
+            t.join()
+        self._compressors = []
+
+
+# ---- 进程级 sink 注册表 ----
+
+_sinks: Dict[str, EvidenceSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sink(path: str) -> EvidenceSink:
+    key = os.path.abspath(path)
+    s = _sinks.get(key)
+    if s is None:
+        with _sinks_lock:
+            s = _sinks.get(key)
+            if s is None:
+                s = _sinks[key] = EvidenceSink(path)
+    return s
+
+
+def flush_all() -> None:
+    for s in list(_sinks.values()):
+        try:
+            s.flush()
+        except OSError:
+            pass
+
+
+def _close_all_at_exit() -> None:
+    # atexit 在 threading 等待非守护线程之后才运行：此时新开的压缩线程不会被等待，
+    # 可能被截断而留下 *.tmp 与未压缩分段。因此最后一次落盘同步压缩，并等完仍在进行的压缩。
+    for s in list(_sinks.values()):
+        s._sync_compress = True
+        try:
+            s.close()
+        except OSError:
+            pass
+
+
+def _after_fork_in_child() -> None:
+    # 子进程不继承父进程尚未落盘的缓冲（否则会重复写入）
+    for s in _sinks.values():
+        s._buf = []
+        s._timer = None
+        s._lock = threading.RLock()
+        s._compressors = []
+
+
+atexit.register(_close_all_at_exit)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def merge_shards(path: str, remove: bool = True) -> int:
+    """
+    将 <stem>.<pid>.ndjson 分片按行追加合并到 path（加锁写入），返回合并的记录数。
+    分片内的顺序保持不变；分片之间按文件名排序。
+    """
+    base = Path(path)
+    shards = sorted(f for f in base.parent.glob(f"{base.stem}.*{base.suffix}")
+                    if f.name[len(base.stem) + 1:-len(base.suffix)].isdigit())
+    total = 0
+    sink = EvidenceSink(path, shard=False, flush_every=1 << 30, flush_interval_s=0)
+    for f in shards:
+        data = f.read_bytes()
+        if data and not data.endswith(b"\n"):
+            data += b"\n"
+        total += data.count(b"\n")
+        if data:
+            sink._write_locked(data)
+        if remove:
+            f.unlink()
+    return total
@@ -0,0 +1,238 @@
+# pudao/evidence/stats.py
+"""流式 evidence 统计（pudao evidence stats）。
+
+逐行读取（可能已轮转/压缩的）evidence 文件，内存只与分组数 × 耗时阶段数成正比：
+每个 (分组, 阶段) 用一个可合并的分位数草图（对数分桶，DDSketch 思路，默认 1% 相对误差）
+汇总 count / p50 / p95 / p99 / max。
+
+- 分组维度：run_id / label / status / sha256（输入文件哈希）/ cache（是否命中缓存）
+- 对比模式：比较两个 run_id 的各阶段 p50/p95，超过阈值的记为回归
+"""
+import glob
+import gzip
+import io
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+GROUP_FIELDS = ("run_id", "label", "status", "sha256", "cache")
+QUANTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+
+
+class QuantileSketch:
+    """
+    对数分桶分位数草图：值 x>0 落入桶 ceil(log_gamma(x))，gamma=(1+a)/(1-a)，
+    任一分位数的相对误差不超过 a；同参数草图可直接按桶相加合并。
+    """
+    __slots__ = ("alpha", "_log_gamma", "bins", "zero", "count", "total", "min", "max")
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.alpha = relative_accuracy
+        self._log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.bins: Dict[int, int] = {}
+        self.zero = 0  # <= 0 的值（如缓存命中时的 smt_ms=0）
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        self.total += x
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if x <= 0:
+            self.zero += 1
+        else:
+            k = math.ceil(math.log(x) / self._log_gamma)
+            self.bins[k] = self.bins.get(k, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.alpha != self.alpha:
+            raise ValueError("cannot merge sketches with different accuracy")
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.zero += other.zero
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero:
+            return min(self.min, 0.0)
+        seen = self.zero
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                # 桶 (gamma^(k-1), gamma^k] 的代表值，保证相对误差 <= alpha
+                v = 2 * math.exp(k * self._log_gamma) / (1 + math.exp(self._log_gamma))
+                return min(max(v, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"count": self.count}
+        for name, q in QUANTILES:
+            out[name] = self.quantile(q)
+        out["max"] = self.max if self.count else None
+        out["mean"] = self.total / self.count if self.count else None
+        return out
+
+
+# ---- 读取 ----
+
+def default_inputs(evidence_file: str) -> List[str]:
+    """evidence 主文件 + 同目录下轮转出的分段（含 .gz/.zst）；压缩中的 *.tmp 与未合并的分片不读。"""
+    from pudao.evidence.sink import segment_re
+
+    p = Path(evidence_file)
+    pat = segment_re(p)
+    segs = sorted(str(f) for f in p.parent.glob(f"{p.stem}.*") if pat.fullmatch(f.name))
+    return segs + ([str(p)] if p.exists() else [])
+
+
+def expand_paths(specs: Iterable[str]) -> List[str]:
+    out: List[str] = []
+    for spec in specs:
+        p = Path(spec)
+        if p.is_dir():
+            out += sorted(str(f) for f in p.iterdir()
+                          if f.is_file() and ".ndjson" in f.name)
+        elif glob.has_magic(spec):
+            out += sorted(glob.glob(spec, recursive=True))
+        else:
+            out.append(spec)
+    return out
+
+
+def _open_text(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        import zstandard  # 可选依赖：读取 zstd 分段时才需要
+        fh = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(fh), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_records(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """逐行产出记录；损坏行（如被截断的最后一行）跳过，损坏 / 截断的压缩分段读到出错处为止。"""
+    for path in paths:
+        try:
+            with _open_text(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(rec, dict):
+                        yield rec
+        except (EOFError, gzip.BadGzipFile, UnicodeDecodeError):
+            continue  # 同损坏行：跳过，不中断整份报告
+
+
+def _field(rec: Dict[str, Any], name: str) -> Any:
+    if name == "status":
+        return (rec.get("verdict") or {}).get("status")
+    if name == "sha256":
+        return (rec.get("input") or {}).get("sha256")
+    if name == "cache":
+        return bool((rec.get("cache") or {}).get("hit"))
+    return rec.get(name)
+
+
+# ---- 聚合 ----
+
+class EvidenceStats:
+    def __init__(self, group_by: Tuple[str, ...] = ("run_id",), relative_accuracy: float = 0.01):
+        for g in group_by:
+            if g not in GROUP_FIELDS:
+                raise ValueError(f"unknown group field: {g} (choose from {', '.join(GROUP_FIELDS)})")
+        self.group_by = tuple(group_by)
+        self.alpha = relative_accuracy
+        self.groups: Dict[Tuple[Any, ...], Dict[str, QuantileSketch]] = {}
+        self.records: Dict[Tuple[Any, ...], int] = {}
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        key = tuple(_field(rec, g) for g in self.group_by)
+        phases = self.groups.get(key)
+        if phases is None:
+            phases = self.groups[key] = {}
+        self.records[key] = self.records.get(key, 0) + 1
+        for phase, v in (rec.get("timings_ms") or {}).items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                sk = phases.get(phase)
+                if sk is None:
+                    sk = phases[phase] = QuantileSketch(self.alpha)
+                sk.add(float(v))
+
+    def add_all(self, records: Iterable[Dict[str, Any]]) -> "EvidenceStats":
+        for rec in records:
+            self.add(rec)
+        return self
+
+    def report(self) -> List[Dict[str, Any]]:
+        out = []
+        for key in sorted(self.groups, key=lambda k: tuple("" if x is None else str(x) for x in k)):
+            out.append({
+                "group": dict(zip(self.group_by, key)),
+                "records": self.records[key],
+                "phases": {ph: sk.summary() for ph, sk in sorted(self.groups[key].items())},
+            })
+        return out
+
+
+def compare_runs(paths: Iterable[str], base_run: str, new_run: str,
+                 threshold: float = 0.10, min_count: int = 1) -> Dict[str, Any]:
+    """
+    比较两个 run_id 的各阶段分位数；(new - base) / base > threshold 的 p50/p95 记为回归。
+    """
+    st = EvidenceStats(("run_id",))
+    st.add_all(r for r in iter_records(paths) if r.get("run_id") in (base_run, new_run))
+    base = st.groups.get((base_run,), {})
+    new = st.groups.get((new_run,), {})
+
+    phases: Dict[str, Any] = {}
+    regressions: List[Dict[str, Any]] = []
+    for ph in sorted(set(base) & set(new)):
+        b, n = base[ph].summary(), new[ph].summary()
+        row: Dict[str, Any] = {"base": b, "new": n}
+        for q in ("p50", "p95"):
+            bv, nv = b[q], n[q]
+            if not bv or nv is None or b["count"] < min_count or n["count"] < min_count:
+                continue
+            change = (nv - bv) / bv
+            row[f"{q}_change"] = change
+            if change > threshold:
+                regressions.append({"phase": ph, "quantile": q, "base": bv, "new": nv, "change": change})
+        phases[ph] = row
+    return {
+        "base_run": base_run,
+        "new_run": new_run,
+        "threshold": threshold,
+        "records": {"base": st.records.get((base_run,), 0), "new": st.records.get((new_run,), 0)},
+        "phases": phases,
+        "regressions": regressions,
+    }
+
+
+def format_table(report: List[Dict[str, Any]]) -> str:
+    lines = []
+    for g in report:
+        head = ", ".join(f"{k}={v}" for k, v in g["group"].items())
+        lines.append(f"[{head}] records={g['records']}")
+        lines.append(f"  {'phase':<24}{'count':>8}{'p50':>12}{'p95':>12}{'p99':>12}{'max':>12}")
+        for ph, s in g["phases"].items():
+            cells = "".join(f"{(s[k] if s[k] is not None else float('nan')):>12.3f}"
+                            for k in ("p50", "p95", "p99", "max"))
+            lines.append(f"  {ph:<24}{s['count']:>8}{cells}")
+    return "\n".join(lines)
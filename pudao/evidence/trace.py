@@ -0,0 +1,226 @@
+# pudao/evidence/trace.py
+"""轻量 span 追踪：Formal Gate 各阶段的耗时与时间戳统一由这里给出。
+
+- 一次校验是一个 Trace，内部是嵌套的 Span（parse → read/decode/schema/ir/ids → solver →
+  invariants → invariant:<rule> → smt → encode/z3_check/difference → report → hints → evidence_write）；
+- 每个 span 只在开始、结束各读一次单调时钟（perf_counter_ns）；UTC 时间戳由 trace 起点的
+  (墙钟, 单调时钟) 锚点换算，不在热路径上再调用 datetime.now；
+- 当前 trace 存在 contextvar 中，span() 在没有活动 trace 时返回独立的 span（仍可计时，只是不记录）；
+- 采样（PFSB_TRACE_SAMPLE，0~1，默认 0）只决定是否导出 span 树：采中的 trace 写入结果与 evidence
+  的 trace 字段，并在配置 PFSB_TRACE_OTLP_FILE 时按 OTLP/JSON（ExportTraceServiceRequest）逐行追加。
+  耗时统计（timings_ms）不受采样影响。
+- 剖析模式（pudao.evidence.profile）挂在 trace 上：span 开闭时记录各阶段的内存峰值，
+  record_solver() 记录 Z3 求解统计；未剖析时这些钩子只多一次属性判断。
+"""
+import json
+import os
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from time import perf_counter_ns, time_ns
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_SAMPLE = float(os.getenv("PFSB_TRACE_SAMPLE", "0"))
+TRACE_OTLP_FILE = os.getenv("PFSB_TRACE_OTLP_FILE", "")
+SERVICE_NAME = "pudao-formal-gate"
+
+# 进程级锚点：没有活动 trace 时换算时间戳用
+_WALL0 = time_ns()
+_PERF0 = perf_counter_ns()
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("pudao_trace", default=None)
+_otlp_lock = threading.Lock()
+
+
+def iso_utc(ns: Optional[int] = None) -> str:
+    """UTC 时间戳，形如 2025-11-17T15:32:10.123Z（毫秒精度）；ns 为 Unix 纳秒，缺省取当前时间。"""
+    dt = datetime.fromtimestamp((time_ns() if ns is None else ns) / 1e9, timezone.utc)
+    return dt.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class Span:
+    __slots__ = ("name", "parent", "start", "end", "attrs", "_trace")
+
+    def __init__(self, name: str, trace: Optional["Trace"] = None, parent: int = -1,
+                 attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.start = 0
+        self.end = 0
+        self.attrs = attrs
+        self._trace = trace
+
+    def open(self) -> "Span":
+        tr = self._trace
+        if tr is not None:
+            tr._stack.append(len(tr.spans))
+            tr.spans.append(self)
+            if tr.profile is not None:
+                tr.profile.enter(self)
+        self.start = perf_counter_ns()
+        return self
+
+    def close(self) -> "Span":
+        self.end = perf_counter_ns()
+        tr = self._trace
+        if tr is not None:
+            tr._stack.pop()
+            if tr.profile is not None:
+                tr.profile.exit(self)
+        return self
+
+    def __enter__(self) -> "Span":
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+        if exc_type is not None:
+            self.set(error=exc_type.__name__)
+
+    def set(self, **attrs: Any) -> None:
+        if self.attrs is None:
+            self.attrs = attrs
+        else:
+            self.attrs.update(attrs)
+
+    @property
+    def ms(self) -> float:
+        return ((self.end or perf_counter_ns()) - self.start) / 1e6
+
+    def iso_start(self) -> str:
+        return (self._trace or _PROCESS).iso(self.start)
+
+    def iso_end(self) -> str:
+        return (self._trace or _PROCESS).iso(self.end)
+
+
+class Trace:
+    __slots__ = ("name", "sampled", "profile", "trace_id", "spans", "_stack", "_wall0", "_perf0")
+
+    def __init__(self, name: str, sampled: bool = False, profile: Any = None):
+        self.name = name
+        self.sampled = sampled
+        self.profile = profile  # pudao.evidence.profile.Profiler（剖析模式）
+        self.trace_id = os.urandom(16).hex() if sampled else None
+        self.spans: List[Span] = []
+        self._stack: List[int] = []
+        self._wall0 = time_ns()
+        self._perf0 = perf_counter_ns()
+
+    def span(self, name: str, **attrs: Any) -> Span:
+        return Span(name, self, self._stack[-1] if self._stack else -1, attrs or None)
+
+    def iso(self, perf_ns: int) -> str:
+        return iso_utc(self._wall0 + perf_ns - self._perf0)
+
+    def unix_ns(self, perf_ns: int) -> int:
+        return self._wall0 + perf_ns - self._perf0
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def tree(self) -> Dict[str, Any]:
+        """嵌套的 span 树：{name, start_ms（相对根 span）, dur_ms, attrs?, children?}；未结束的 span 取到目前为止的耗时。"""
+        t0 = self.root.start
+        nodes: List[Dict[str, Any]] = []
+        for s in self.spans:
+            node: Dict[str, Any] = {"name": s.name, "start_ms": (s.start - t0) / 1e6, "dur_ms": s.ms}
+            if s.attrs:
+                node["attrs"] = s.attrs
+            nodes.append(node)
+            if s.parent >= 0:
+                nodes[s.parent].setdefault("children", []).append(node)
+        return {"trace_id": self.trace_id, **nodes[0]}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        ids = [os.urandom(8).hex() for _ in self.spans]
+        spans = []
+        for i, s in enumerate(self.spans):
+            sp = {
+                "traceId": self.trace_id,
+                "spanId": ids[i],
+                "name": s.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(self.unix_ns(s.start)),
+                "endTimeUnixNano": str(self.unix_ns(s.end or s.start)),
+                "attributes": [_otlp_attr(k, v) for k, v in (s.attrs or {}).items()],
+            }
+            if s.parent >= 0:
+                sp["parentSpanId"] = ids[s.parent]
+            spans.append(sp)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attr("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "pudao"}, "spans": spans}],
+        }]}
+
+
+class _ProcessAnchor:
+    # 独立 span 的时间戳换算（进程启动时的锚点）
+    @staticmethod
+    def iso(perf_ns: int) -> str:
+        return iso_utc(_WALL0 + perf_ns - _PERF0)
+
+
+_PROCESS = _ProcessAnchor()
+
+
+def _otlp_attr(key: str, v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        val = {"boolValue": v}
+    elif isinstance(v, int):
+        val = {"intValue": str(v)}
+    elif isinstance(v, float):
+        val = {"doubleValue": v}
+    else:
+        val = {"stringValue": str(v)}
+    return {"key": key, "value": val}
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def span(name: str, **attrs: Any) -> Span:
+    """当前 trace 下的子 span（with 使用，或 open()/close()）；没有活动 trace 时只计时不记录。"""
+    tr = _current.get()
+    if tr is None:
+        return Span(name, None, -1, attrs or None)
+    return tr.span(name, **attrs)
+
+
+def record_solver(label: str, solver: Any) -> None:
+    """剖析模式下记录 Z3 solver 的统计（conflicts / decisions / memory …）；否则什么也不做。"""
+    tr = _current.get()
+    if tr is not None and tr.profile is not None:
+        tr.profile.solver_stats(label, solver)
+
+
+@contextmanager
+def start_trace(name: str, sample: Optional[float] = None, profile: Any = None,
+                **attrs: Any) -> Iterator[Trace]:
+    """开启一个 trace 并打开根 span；退出时关闭根 span，采中且配置了 OTLP 文件时导出。"""
+    rate = TRACE_SAMPLE if sample is None else sample
+    tr = Trace(name, sampled=rate > 0 and random.random() < rate, profile=profile)
+    token = _current.set(tr)
+    try:
+        with tr.span(name, **attrs):
+            yield tr
+    finally:
+        _current.reset(token)
+        if tr.sampled and TRACE_OTLP_FILE:
+            export_otlp(tr, TRACE_OTLP_FILE)
+
+
+def export_otlp(tr: Trace, path: str) -> None:
+    line = json.dumps(tr.to_otlp(), ensure_ascii=False) + "\n"
+    try:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with _otlp_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError:
+        pass
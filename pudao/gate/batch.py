@@ -0,0 +1,218 @@
+# pudao/gate/batch.py
+"""批量 Formal Gate：对多个策略文件（文件/通配符/目录）并行校验。
+
+- 进程池中每个 worker 只导入一次 gate/z3/jsonschema/pydantic，并预热 Z3 上下文；
+- 每条策略完成即产出一条 NDJSON 结论（completion 顺序或 input 顺序）；
+- evidence 由主进程批量写入（worker 只构造记录，不落盘）；
+- 单文件超时（worker 内 SIGALRM），超时给出 status="unknown"。
+"""
+import glob
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+STRATEGY_SUFFIXES = (".yaml", ".yml", ".json")
+
+# 主进程攒够多少条 evidence 记录再写一次
+EVIDENCE_BATCH = int(os.getenv("PFSB_BATCH_EVIDENCE_EVERY", "64"))
+
+
+def expand_inputs(specs: Iterable[str]) -> List[str]:
+    """
+    将文件 / 通配符 / 目录展开为去重后的策略文件列表（保持输入顺序）。
+    目录递归收集 .yaml/.yml/.json；通配符支持 **。
+    """
+    out: List[str] = []
+    seen = set()
+
+    def _add(p: str) -> None:
+        if p not in seen:
+            seen.add(p)
+            out.append(p)
+
+    for spec in specs:
+        p = Path(spec)
+        if p.is_dir():
+            for f in sorted(p.rglob("*")):
+                if f.is_file() and f.suffix in STRATEGY_SUFFIXES:
+                    _add(str(f))
+        elif glob.has_magic(spec):
+            for f in sorted(glob.glob(spec, recursive=True)):
+                if Path(f).is_file():
+                    _add(f)
+        else:
+            # 不存在的文件也保留：由 gate 给出 I1 失败结论
+            _add(spec)
+    return out
+
+
+# ---- worker 侧 ----
+
+class _FileTimeout(BaseException):
+    # 与 KeyboardInterrupt 一样不继承 Exception：gate 内部的 except Exception（如解析失败 -> I1）不能吞掉超时
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _FileTimeout()
+
+
+def _worker_init() -> None:
+    """worker 启动时导入一次重依赖并预热 Z3。"""
+    from z3 import Solver
+    import pudao.gate.formal_gate  # noqa: F401
+    from pudao.dsl.id_registry import get_id_registry
+
+    Solver().check()
+    get_id_registry()
+
+
+def _timeout_result(timeout_s: float, elapsed_ms: float) -> Dict[str, Any]:
+    return {
+        "allow": False,
+        "status": "unknown",
+        "reasons": [f"timeout: exceeded {timeout_s}s"],
+        "details": {},
+        "timings_ms": {"total_ms": elapsed_ms},
+    }
+
+
+def _error_result(e: BaseException) -> Dict[str, Any]:
+    return {
+        "allow": False,
+        "status": "unknown",
+        "reasons": [f"worker_error: {type(e).__name__}: {e}"],
+        "details": {},
+        "timings_ms": {},
+    }
+
+
+def check_one(path: str, timeout_s: Optional[float] = None,
+              label: Optional[str] = None,
+              budget: Optional[Dict[str, Any]] = None,
+              fleet_summary: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    校验单个文件，返回 (result, evidence_record)；不落盘。
+    fleet_summary=True 时通过校验的结果带在役库摘要（见 check_formal_file）。
+    timeout_s 仅在主线程且平台支持 SIGALRM 时生效；
+    SIGALRM 无法打断 Z3 内部计算，因此 timeout_s 同时作为求解超时（budget 未指定时）。
+    """
+    from pudao.gate.formal_gate import check_formal_file
+    from pudao.evidence.evidence import build_formal_record
+
+    if timeout_s and not (budget or {}).get("timeout_ms"):
+        budget = {**(budget or {}), "timeout_ms": timeout_s * 1000.0}
+    use_alarm = bool(timeout_s) and hasattr(signal, "setitimer")
+    t0 = perf_counter()
+    if use_alarm:
+        prev = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout_s)
+    try:
+        res = check_formal_file(path, write_evidence=False, budget=budget, fleet_summary=fleet_summary)
+    except _FileTimeout:
+        res = _timeout_result(timeout_s, (perf_counter() - t0) * 1000.0)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, prev)
+    return res, build_formal_record(path, res, label)
+
+
+# ---- 主进程侧 ----
+
+def _verdict_line(index: int, path: str, res: Dict[str, Any]) -> Dict[str, Any]:
+    return {"index": index, "path": path, **res}
+
+
+def iter_batch(paths: List[str], workers: Optional[int] = None,
+               ordered: bool = False, timeout_s: Optional[float] = None,
+               label: Optional[str] = None,
+               budget: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    并行校验 paths，逐条产出 (verdict, evidence_record)。
+    - workers: 进程数；<=1 时在当前进程串行执行（无进程池开销）
+    - ordered: True 按输入顺序产出；False 按完成顺序产出
+    - timeout_s: 单文件超时（秒）
+    - budget: 求解预算 {timeout_ms, rlimit, memory_mb}
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(paths)) if paths else 0
+
+    from pudao.evidence.evidence import build_formal_record
+
+    if workers <= 1:
+        for i, p in enumerate(paths):
+            try:
+                res, rec = check_one(p, timeout_s, label, budget)
+            except Exception as e:
+                res = _error_result(e)
+                rec = build_formal_record(p, res, label)
+            yield _verdict_line(i, p, res), rec
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as pool:
+        futures = {pool.submit(check_one, p, timeout_s, label, budget): i for i, p in enumerate(paths)}
+
+        def _collect(fut, i):
+            try:
+                res, rec = fut.result()
+            except Exception as e:
+                res = _error_result(e)
+                rec = build_formal_record(paths[i], res, label)
+            return _verdict_line(i, paths[i], res), rec
+
+        if not ordered:
+            for fut in as_completed(futures):
+                yield _collect(fut, futures[fut])
+            return
+
+        # 按输入顺序：缓存先完成的结果，直到轮到它
+        pending: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        next_idx = 0
+        for fut in as_completed(futures):
+            i = futures[fut]
+            pending[i] = _collect(fut, i)
+            while next_idx in pending:
+                yield pending.pop(next_idx)
+                next_idx += 1
+
+
+def run_batch(specs: Iterable[str], workers: Optional[int] = None,
+              ordered: bool = False, timeout_s: Optional[float] = None,
+              label: Optional[str] = None, out: Optional[IO[str]] = None,
+              write_evidence: bool = True,
+              evidence_path: Optional[str] = None,
+              budget: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """
+    CLI 入口：展开输入、流式输出 NDJSON 结论、批量写 evidence；返回计数汇总。
+    """
+    from pudao.evidence.evidence import append_records, flush_evidence
+
+    out = out or sys.stdout
+    paths = expand_inputs(specs)
+    summary = {"total": len(paths), "sat": 0, "unsat": 0, "unknown": 0}
+    buf: List[Dict[str, Any]] = []
+
+    try:
+        for verdict, rec in iter_batch(paths, workers, ordered, timeout_s, label, budget):
+            status = verdict.get("status")
+            summary[status if status in summary else "unknown"] += 1
+            out.write(json.dumps(verdict, ensure_ascii=False) + "\n")
+            out.flush()
+            if write_evidence:
+                buf.append(rec)
+                if len(buf) >= EVIDENCE_BATCH:
+                    append_records(buf, evidence_path)
+                    buf = []
+    finally:
+        if write_evidence:
+            if buf:
+                append_records(buf, evidence_path)
+            flush_evidence(evidence_path)
+    return summary
@@ -0,0 +1,179 @@
+# pudao/gate/cache.py
+"""内容寻址的 Formal 结论缓存。
+
+缓存键 = sha256(规范化 IR JSON + schema 哈希 + ID 注册表指纹 + 拓扑指纹 + 不变式/编码器版本 + 规则集
+         + 时域展开参数 + 求解引擎与快速路径开关)，
+任一输入变化都会自动失效，无需手工清理。
+
+两级存储：
+- 进程内 LRU（OrderedDict），命中为一次字典查找；
+- 磁盘目录（每键一个 JSON 文件，按 mtime 近似 LRU，总大小超限时淘汰最旧的）。
+
+环境变量：
+- PFSB_CACHE_ENABLE：总开关（默认 1）
+- PFSB_CACHE_DIR：磁盘目录（默认 .pudao_cache/verdicts；置空则只用内存）
+- PFSB_CACHE_MAX_BYTES：磁盘总大小上限（默认 64 MiB）
+- PFSB_CACHE_MEM_ENTRIES：内存条目上限（默认 1024）
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+CACHE_ENABLE = os.getenv("PFSB_CACHE_ENABLE", "1") == "1"
+CACHE_DIR = os.getenv("PFSB_CACHE_DIR", ".pudao_cache/verdicts")
+CACHE_MAX_BYTES = int(os.getenv("PFSB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_MEM_ENTRIES = int(os.getenv("PFSB_CACHE_MEM_ENTRIES", "1024"))
+
+# 只缓存判定相关字段；timings/timestamps 每次重新生成
+CACHED_FIELDS = ("allow", "status", "reasons", "violations", "details", "unsat_core")
+
+
+def context_parts() -> Tuple[str, ...]:
+    """IR 之外影响结论的输入：schema + 注册表 + 拓扑 + 引擎版本 + 规则集 + 时域展开参数 + 引擎。"""
+    from pudao.dsl.parser import schema_sha256
+    from pudao.dsl.id_registry import get_id_registry
+    from pudao.topology.index import get_topology
+    from pudao.smt.invariants import registered_rules
+    from pudao.smt.versions import INVARIANTS_VERSION, ENCODER_VERSION
+    from pudao.smt.solver import INVARIANTS_FAIL_FAST, SMT_FASTPATH
+    from pudao.smt import budget, temporal
+
+    # 站点规则与 fail-fast 都会改变 reasons，一并纳入键
+    rules = ",".join(registered_rules()) + (";ff" if INVARIANTS_FAIL_FAST else "")
+    # 有界展开的时域与步长决定随时间变化策略的结论
+    unroll = f"h={temporal.HORIZON_S:g};dt={temporal.STEP_S:g}"
+    # 引擎与快速路径决定 unsat_core（差分约束的负环 / Z3 core）与 solver 字段
+    engine = f"{budget.SMT_ENGINE};fast={int(SMT_FASTPATH)}"
+    return (schema_sha256(), get_id_registry().fingerprint(), get_topology().fingerprint(),
+            INVARIANTS_VERSION, ENCODER_VERSION, rules, unroll, engine)
+
+
+def context_key() -> str:
+    """校验上下文指纹（context_parts 的哈希）；一次校验只算一次，传给 verdict_key 与修订记录查找。"""
+    h = hashlib.sha256()
+    for part in context_parts():
+        h.update(b"\0" + part.encode("utf-8"))
+    return h.hexdigest()
+
+
+def verdict_key(ir, ctx: Optional[str] = None) -> str:
+    """计算 IR 的缓存键（规范化 JSON + 校验上下文）；ctx 为已算好的 context_key()，缺省时现算。"""
+    h = hashlib.sha256()
+    h.update(ir.json(sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(b"\0" + (ctx or context_key()).encode("ascii"))
+    return h.hexdigest()
+
+
+class VerdictCache:
+    def __init__(self, cache_dir: Optional[str] = CACHE_DIR,
+                 max_bytes: int = CACHE_MAX_BYTES,
+                 mem_entries: int = CACHE_MEM_ENTRIES):
+        self.dir = Path(cache_dir) if cache_dir else None
+        self.max_bytes = max_bytes
+        self.mem_entries = mem_entries
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None  # 首次写入时扫描一次
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.json"
+
+    def _mem_put(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._mem[key] = value
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.mem_entries:
+                self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """返回 (value, tier)；tier ∈ {"mem","disk"}，未命中为 (None, None)。"""
+        with self._lock:
+            v = self._mem.get(key)
+            if v is not None:
+                self._mem.move_to_end(key)
+                return v, "mem"
+        if self.dir is None:
+            return None, None
+        p = self._path(key)
+        try:
+            v = json.loads(p.read_text(encoding="utf-8"))
+            os.utime(p)  # 刷新 mtime，作为 LRU 依据
+        except (OSError, ValueError):
+            return None, None
+        self._mem_put(key, v)
+        return v, "disk"
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        value = {k: value[k] for k in CACHED_FIELDS if k in value}
+        self._mem_put(key, value)
+        if self.dir is None:
+            return
+        p = self._path(key)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, p)  # 原子替换，多进程并发写安全
+        except OSError:
+            return
+        if self._disk_bytes is None:
+            self._disk_bytes = self._scan()[1]
+        else:
+            self._disk_bytes += len(data)
+        if self._disk_bytes > self.max_bytes:
+            self._evict()
+
+    def _scan(self):
+        entries = []
+        total = 0
+        for f in self.dir.glob("*/*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+            total += st.st_size
+        return entries, total
+
+    def _evict(self) -> None:
+        # 淘汰到上限的 90%，避免每次写入都触发扫描
+        entries, total = self._scan()
+        target = int(self.max_bytes * 0.9)
+        for _, size, f in sorted(entries):
+            if total <= target:
+                break
+            try:
+                f.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+        if self.dir is not None:
+            for f in self.dir.glob("*/*.json"):
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+
+
+_default: Optional[VerdictCache] = None
+
+
+def get_cache() -> Optional[VerdictCache]:
+    """进程级默认缓存；PFSB_CACHE_ENABLE=0 时返回 None。"""
+    global _default
+    if not CACHE_ENABLE:
+        return None
+    if _default is None:
+        _default = VerdictCache()
+    return _default
@@ -0,0 +1,279 @@
+# pudao/gate/fleet.py
+"""在役策略库：跨策略的冲突检查（同一路段 / 匝道 / VMS 只能由一个在役策略控制）。
+
+单条策略内部的冲突由不变式（I2/I6）负责；这里检查新策略与其它在役策略之间：
+- 匝道：同一匝道已被另一在役策略控制（metering / closure）；
+- VMS：同一情报板已被另一在役策略占用；
+- 限速：同一路段已被另一在役策略设为不同的限速；
+- 边界平滑：新策略的限速路段与另一在役策略的相邻限速路段 |ΔV| > max_delta（取两者中较严者）。
+
+库内按匝道 / VMS / 路段建反向索引，准入检查只查新策略涉及的对象及其拓扑邻居，
+耗时与重叠规模成正比，与在役策略总数无关。
+
+准入与退役是原子的：进程内加锁；配置 journal 时，操作以 NDJSON 追加到 journal，
+并在独占文件锁（<journal>.lock）下先追平其它进程写入的操作再检查，多进程之间也是原子的。
+journal 中的操作数超过在役策略数的 4 倍（且超过 1024）时压缩为当前快照。
+
+环境变量 PFSB_FLEET_JOURNAL：默认 journal 路径（默认 .pudao_cache/fleet.ndjson；置空则只在内存中）。
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from pudao.evidence.trace import iso_utc
+from pudao.topology.index import get_topology
+
+FLEET_JOURNAL = os.getenv("PFSB_FLEET_JOURNAL", ".pudao_cache/fleet.ndjson")
+
+try:  # pragma: no cover  （无 fcntl 的平台只保证进程内原子）
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+
+def summarize(ir) -> Dict[str, Any]:
+    """策略在库中的摘要：只保留跨策略检查需要的字段（可 JSON 序列化）。"""
+    vsl: Dict[str, float] = {}
+    ramps: Dict[str, Set[str]] = {}
+    vms: List[str] = []
+    for a in ir.actions:
+        if a.type == "vsl" and a.segment_id and a.value is not None:
+            vsl[a.segment_id] = a.value  # 与 I2 一致：同段取最后一次的值
+        elif a.type in ("ramp_metering", "ramp_closure") and a.ramp_id:
+            ramps.setdefault(a.ramp_id, set()).add(a.type)
+        elif a.type == "vms_message" and a.vms_id and a.vms_id not in vms:
+            vms.append(a.vms_id)
+    return {
+        "strategy_id": ir.strategy_id,
+        "version": ir.version,
+        "roadchain_id": ir.scope.roadchain_id,
+        "max_delta": ir.guardrails.max_delta,
+        "vsl": vsl,
+        "ramps": {r: sorted(m) for r, m in ramps.items()},
+        "vms": vms,
+    }
+
+
+def admit_file(path: str, store: Optional["FleetStore"] = None, force: bool = False,
+               budget: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """先过 Formal Gate，通过后再做在役冲突检查并准入；返回校验结果 + {"fleet": ...}。
+    摘要由校验时已解析的 IR 生成，文件只读一次。"""
+    from pudao.gate.formal_gate import check_formal_file
+    res = check_formal_file(path, budget=budget, fleet_summary=True)
+    return admit_result(res, store if store is not None else get_fleet(), force)
+
+
+def admit_result(res: Dict[str, Any], store: "FleetStore", force: bool = False) -> Dict[str, Any]:
+    """由带 fleet_summary 的校验结果准入（未通过校验则不准入）；返回校验结果 + {"fleet": ...}。"""
+    summary = res.pop("fleet_summary", None)
+    if not res.get("allow") or summary is None:
+        return {**res, "fleet": {"admitted": False, "reason": "formal_gate_rejected"}}
+    out = store.admit(summary, force=force)
+    return {**res, "allow": out["admitted"], "fleet": out}
+
+
+class FleetStore:
+    def __init__(self, journal: Optional[str] = FLEET_JOURNAL):
+        self.journal = Path(journal) if journal else None
+        self._lock = threading.RLock()
+        self._active: Dict[str, Dict[str, Any]] = {}
+        # 反向索引：对象 ID -> {strategy_id: 取值/模式}
+        self._by_ramp: Dict[str, Dict[str, List[str]]] = {}
+        self._by_vms: Dict[str, Set[str]] = {}
+        self._by_seg: Dict[str, Dict[str, float]] = {}
+        self._offset = 0
+        self._ino: Optional[int] = None
+        self._ops = 0
+
+    # ---- 索引维护 ----
+
+    def _insert(self, s: Dict[str, Any]) -> None:
+        sid = s["strategy_id"]
+        self._remove(sid)
+        self._active[sid] = s
+        for r, modes in s["ramps"].items():
+            self._by_ramp.setdefault(r, {})[sid] = modes
+        for v in s["vms"]:
+            self._by_vms.setdefault(v, set()).add(sid)
+        for seg, val in s["vsl"].items():
+            self._by_seg.setdefault(seg, {})[sid] = val
+
+    def _remove(self, sid: str) -> Optional[Dict[str, Any]]:
+        s = self._active.pop(sid, None)
+        if s is None:
+            return None
+        for index, keys in ((self._by_ramp, s["ramps"]), (self._by_seg, s["vsl"])):
+            for k in keys:
+                d = index.get(k)
+                if d is not None:
+                    d.pop(sid, None)
+                    if not d:
+                        del index[k]
+        for v in s["vms"]:
+            d = self._by_vms.get(v)
+            if d is not None:
+                d.discard(sid)
+                if not d:
+                    del self._by_vms[v]
+        return s
+
+    # ---- journal ----
+
+    def _apply(self, op: Dict[str, Any]) -> None:
+        self._ops += 1
+        if op.get("op") == "admit":
+            self._insert(op["strategy"])
+        elif op.get("op") == "retire":
+            self._remove(op["strategy_id"])
+
+    def _sync(self) -> None:
+        """追平 journal 中其它进程写入的操作（文件被压缩替换时整体重放）。"""
+        try:
+            st = self.journal.stat()
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._ino:
+            self._active.clear()
+            self._by_ramp.clear()
+            self._by_vms.clear()
+            self._by_seg.clear()
+            self._offset, self._ino, self._ops = 0, st.st_ino, 0
+        if st.st_size <= self._offset:
+            return
+        with open(self.journal, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # 只消费完整的行
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._offset += end
+
+    def _append(self, op: Dict[str, Any]) -> None:
+        self._ops += 1
+        if self.journal is None:
+            return
+        data = (json.dumps(op, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.journal, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            if self._ino is None:
+                self._ino = os.fstat(f.fileno()).st_ino
+        self._offset += len(data)
+        if self._ops > max(1024, 4 * len(self._active)):
+            self._compact()
+
+    def _compact(self) -> None:
+        tmp = self.journal.with_suffix(f".{os.getpid()}.tmp")
+        lines = [json.dumps({"op": "admit", "strategy": s}, ensure_ascii=False) + "\n"
+                 for s in self._active.values()]
+        data = "".join(lines).encode("utf-8")
+        tmp.write_bytes(data)
+        os.replace(tmp, self.journal)
+        st = self.journal.stat()
+        self._offset, self._ino, self._ops = len(data), st.st_ino, len(lines)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if self.journal is None:
+                yield
+                return
+            self.journal.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal.with_name(self.journal.name + ".lock"), "a") as lk:
+                if fcntl is not None:
+                    fcntl.flock(lk.fileno(), fcntl.LOCK_EX)
+                try:
+                    self._sync()
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lk.fileno(), fcntl.LOCK_UN)
+
+    # ---- 检查 / 准入 / 退役 ----
+
+    def _conflicts(self, s: Dict[str, Any]) -> Dict[str, Any]:
+        sid = s["strategy_id"]
+        conflicts: List[str] = []
+        overlapping: Set[str] = set()
+        for r, modes in s["ramps"].items():
+            for other, other_modes in self._by_ramp.get(r, {}).items():
+                if other != sid:
+                    overlapping.add(other)
+                    conflicts.append(f"fleet_conflict: ramp {r} {'+'.join(modes)} "
+                                     f"already controlled by {other} ({'+'.join(other_modes)})")
+        for v in s["vms"]:
+            for other in sorted(self._by_vms.get(v, ())):
+                if other != sid:
+                    overlapping.add(other)
+                    conflicts.append(f"fleet_conflict: vms {v} already used by {other}")
+        topo = get_topology()
+        for seg, val in s["vsl"].items():
+            for other, w in self._by_seg.get(seg, {}).items():
+                if other != sid:
+                    overlapping.add(other)
+                    if w != val:
+                        conflicts.append(f"fleet_conflict: vsl({seg})={val:g} but {other} sets {w:g}")
+            for nb in topo.neighbors(seg):
+                for other, w in self._by_seg.get(nb, {}).items():
+                    if other == sid or nb in s["vsl"]:
+                        continue
+                    overlapping.add(other)
+                    md = min(s["max_delta"], self._active[other]["max_delta"])
+                    dv = abs(val - w)
+                    if dv > md:
+                        conflicts.append(f"fleet_spatial_smoothness_violated: |vsl({seg})-vsl({nb})|={dv:g} > {md:g} "
+                                         f"at boundary with {other}")
+        return {"conflicts": conflicts, "overlapping": sorted(overlapping)}
+
+    def check(self, s: Dict[str, Any]) -> Dict[str, Any]:
+        """只检查不准入：{conflicts, overlapping}。"""
+        with self._locked():
+            return self._conflicts(s)
+
+    def admit(self, s: Dict[str, Any], force: bool = False) -> Dict[str, Any]:
+        """
+        检查并准入（同一 strategy_id 已在役时视为替换为新版本，只与其它策略比较）。
+        有冲突且 force=False 时不改变库，返回 admitted=False。
+        """
+        with self._locked():
+            out = self._conflicts(s)
+            out["admitted"] = force or not out["conflicts"]
+            if out["admitted"]:
+                out["replaced"] = s["strategy_id"] in self._active
+                s = {**s, "admitted_utc": iso_utc()}
+                self._insert(s)
+                self._append({"op": "admit", "strategy": s})
+            out["active"] = len(self._active)
+            return out
+
+    def retire(self, strategy_id: str) -> bool:
+        with self._locked():
+            if self._remove(strategy_id) is None:
+                return False
+            self._append({"op": "retire", "strategy_id": strategy_id, "ts_utc": iso_utc()})
+            return True
+
+    def active(self) -> List[Dict[str, Any]]:
+        with self._locked():
+            return [{k: s.get(k) for k in ("strategy_id", "version", "roadchain_id", "admitted_utc")}
+                    for s in self._active.values()]
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+
+_default: Optional[FleetStore] = None
+
+
+def get_fleet() -> FleetStore:
+    """进程级默认在役策略库（journal 取 PFSB_FLEET_JOURNAL）。"""
+    global _default
+    if _default is None:
+        _default = FleetStore()
+    return _default
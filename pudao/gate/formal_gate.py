@@ -1,107 +1,203 @@
 # pudao/gate/formal_gate.py
+import copy
 import json
-from time import perf_counter
-from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from pudao.dsl.parser import load_strategy_ir
-from pudao.smt.solver import check_formal_with_smt
+from pudao.dsl.parser import read_input, ir_from_blob
 from pudao.evidence.evidence import append_formal_timing
-from pudao.hints.suggester import make_hints_payload
+from pudao.evidence.trace import Trace, span, start_trace
+from pudao.gate.cache import context_key, get_cache, verdict_key
+from pudao.gate.revisions import get_revision_store, make_record, prior_for
+from pudao.smt.violations import Violation
 
+# 重依赖按需导入：解析失败不加载 z3（pudao.smt.solver），sat 不加载 hints。
 
-def _iso_utc() -> str:
-    """返回形如 2025-11-17T15:32:10.123Z 的 UTC 时间戳（毫秒精度）。"""
-    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
 
+def make_hints_payload(result: Dict[str, Any], ir=None):
+    from pudao.hints.suggester import make_hints_payload as _make
+    return _make(result, ir=ir)
 
-def check_formal_file(path: str) -> Dict[str, Any]:
+
+def check_formal_file(path: str, write_evidence: bool = True,
+                      use_cache: bool = True,
+                      budget: Optional[Dict[str, Any]] = None,
+                      profile: bool = False,
+                      fleet_summary: bool = False) -> Dict[str, Any]:
     """
     对给定策略文件执行 Formal 校验（解析 -> 不变式 -> SMT），
     返回结构化结论，并将证据落盘（NDJSON）。
+    write_evidence=False 时不落盘（批量模式由调用方统一写入）。
+    use_cache=True 时按规范化 IR 查结论缓存，命中则跳过不变式与 SMT（结果带 cache.hit=true）；
+    未命中但同一 strategy_id 有上一版本的记录时增量复核（结果带 incremental）。
+    budget: 求解预算 {timeout_ms, rlimit, memory_mb}，超出时 status="unknown"。
+    各阶段耗时与时间戳来自 span（pudao.evidence.trace）；采中的请求带 trace（span 树）。
+    profile=True 时跳过缓存与增量复核，采集 CPU / 各阶段内存峰值 / Z3 统计并写剖析文件
+    （结果带 profile 摘要，见 pudao.evidence.profile）。
+    fleet_summary=True 时通过校验的结果带 fleet_summary（由本次解析的 IR 生成的在役库摘要，
+    见 pudao.gate.fleet.summarize），准入无需再读一遍文件；不写入 evidence。
     """
-    # ---- 用例起点（含解析阶段）----
-    t0 = perf_counter()
-    ts0 = _iso_utc()
-
+    prof = None
+    if profile:
+        from pudao.evidence.profile import Profiler
+        prof = Profiler().start()
+        use_cache = False
     try:
-        ir = load_strategy_ir(path)
-        t_parse_end = perf_counter()
-        ts_parse_end = _iso_utc()
+        with start_trace("formal_check", profile=prof) as tr:
+            return _check(tr, path, write_evidence, use_cache, budget, fleet_summary)
+    finally:
+        if prof is not None:
+            prof.stop()  # 异常退出时也要关掉 cProfile / tracemalloc
+
+
+def _check(tr: Trace, path: str, write_evidence: bool, use_cache: bool,
+           budget: Optional[Dict[str, Any]], fleet_summary: bool) -> Dict[str, Any]:
+    root = tr.root
+    blob = None
+    sp_parse = span("parse")
+    try:
+        with sp_parse:
+            # 只读一次文件：哈希/大小随结果传给 evidence
+            with span("read"):
+                blob = read_input(path)
+            ir = ir_from_blob(blob)
     except Exception as e:
         # 解析/Schema/ID 失败：仍返回时间戳与耗时，并写 evidence
-        t_end = perf_counter()
-        ts_end = _iso_utc()
-        total_ms = (t_end - t0) * 1000.0
-
         failure_payload: Dict[str, Any] = {
             "allow": False,
             "status": "unsat",
             "reasons": [str(e)],
+            "violations": [Violation.parse(str(e), "I1_structure").to_dict()],
             "details": {"I1_structure": "fail"},
-            "timestamps": {
-                "start_utc": ts0,
-                "parse_end_utc": ts_end,  # 解析阶段即失败结束
-                "end_utc": ts_end
-            },
-            "timings_ms": {
-                "total_ms": total_ms,
-                "parse_ms": total_ms,
-                "smt_ms": 0.0,
-                "report_ms": 0.0
-            },
+            "input": blob.info() if blob is not None else {"exists": False, "size": None, "sha256": None},
         }
-        
-        # 写入 evidence
-        append_formal_timing(path, failure_payload)
-
         # 插入UNSAT 提示
-        failure_payload["hints"] = make_hints_payload(failure_payload, ir=None)
-
-        return failure_payload
+        with span("hints"):
+            failure_payload["hints"] = make_hints_payload(failure_payload, ir=None)
+        failure_payload["timestamps"] = {
+            "start_utc": root.iso_start(),
+            "parse_end_utc": sp_parse.iso_end(),  # 解析阶段即失败结束
+            "end_utc": sp_parse.iso_end(),
+        }
+        failure_payload["timings_ms"] = {
+            "total_ms": root.ms,
+            "parse_ms": sp_parse.ms,
+            "smt_ms": 0.0,
+            "report_ms": 0.0,
+        }
+        return _finish(tr, path, failure_payload, write_evidence)
+
+    # ---- 结论缓存（命中则跳过不变式 + SMT）----
+    cache = get_cache() if use_cache else None
+    store = get_revision_store() if use_cache else None
+    # 校验上下文（schema / 注册表 / 拓扑指纹 …）每次校验只算一次，缓存键与修订记录共用
+    ctx = context_key() if cache is not None or store is not None else None
+    cache_key = None
+    sp_cache = None
+    if cache is not None:
+        with span("cache_lookup") as sp_cache:
+            cache_key = verdict_key(ir, ctx)
+            cached, tier = cache.get(cache_key)
+            sp_cache.set(hit=cached is not None)
+        if cached is not None:
+            res = _cached_result(tr, path, blob, cached, tier, cache_key, sp_parse, sp_cache, write_evidence)
+            return _with_summary(res, ir) if fleet_summary else res
+
+    # ---- 上一版本记录（增量复核）----
+    prior = revision = None
+    if store is not None:
+        with span("revision_lookup") as sp:
+            prior = prior_for(store, ir, ctx)
+            revision = {}
+            sp.set(found=prior is not None)
 
     # ---- 进入 Formal（含不变式 + SMT）----
-    solver_res = check_formal_with_smt(ir)
-
-    # ---- 用例终点（报告封装时间）----
-    t_end = perf_counter()
-    ts_end = _iso_utc()
-
-    # 组合耗时
-    parse_ms = (t_parse_end - t0) * 1000.0
-    solver_ms = float(solver_res.get("timings_ms", {}).get("solver_ms", 0.0))
-    total_ms = (t_end - t0) * 1000.0
-    report_ms = max(0.0, total_ms - parse_ms - solver_ms)
-
-    # 组合时间戳（兼容 solver_res 中的字段）
+    from pudao.smt.solver import check_formal_with_smt
+    solver_res = check_formal_with_smt(ir, budget=budget, prior=prior, revision=revision)
+
+    # ---- 报告封装（结果合并、写缓存 / 修订记录、提示）----
+    with span("report") as sp_report:
+        merged: Dict[str, Any] = dict(solver_res)
+        merged["input"] = blob.info()
+        if cache is not None:
+            merged["cache"] = {"hit": False, "key": cache_key}
+            # unknown（超时/资源不足）不入缓存
+            if merged.get("status") in ("sat", "unsat"):
+                cache.put(cache_key, merged)
+        if revision and merged.get("status") in ("sat", "unsat"):
+            store.put(make_record(ir, ctx, revision))
+        if merged.get("status") == "unsat":
+            with span("hints"):
+                merged["hints"] = make_hints_payload(merged, ir=None)
+
+    # 时间戳与耗时（compat：solver_res 中的 smt_* 时间戳与 solver 内部各项耗时保留）
     ts_solver = solver_res.get("timestamps", {}) or {}
-    timestamps = {
-        "start_utc": ts0,
-        "parse_end_utc": ts_parse_end,
+    merged["timestamps"] = {
+        "start_utc": root.iso_start(),
+        "parse_end_utc": sp_parse.iso_end(),
         "smt_start_utc": ts_solver.get("smt_start_utc"),
         "smt_end_utc": ts_solver.get("smt_end_utc"),
-        "end_utc": ts_end,
+        "end_utc": sp_report.iso_end(),
     }
-
-    # 合并结果（在 solver_res 基础上补齐/覆盖 timing 与 timestamps）
-    merged: Dict[str, Any] = dict(solver_res)
-    merged["timestamps"] = timestamps
     merged["timings_ms"] = {
         **(solver_res.get("timings_ms", {}) or {}),
-        "parse_ms": parse_ms,
-        "report_ms": report_ms,
-        "total_ms": total_ms,
+        "parse_ms": sp_parse.ms,
+        "report_ms": sp_report.ms,
+        "total_ms": root.ms,
     }
-    if merged.get("status") == "unsat":
-        merged["hints"] = make_hints_payload(merged,ir=None)
-
-    # 写入 evidence
-    append_formal_timing(path, merged)
-
-    return merged
+    if sp_cache is not None:
+        merged["timings_ms"]["cache_ms"] = sp_cache.ms
+    res = _finish(tr, path, merged, write_evidence)
+    return _with_summary(res, ir) if fleet_summary else res
+
+
+def _with_summary(res: Dict[str, Any], ir) -> Dict[str, Any]:
+    if res.get("allow"):
+        from pudao.gate.fleet import summarize
+        res["fleet_summary"] = summarize(ir)
+    return res
+
+
+def _finish(tr: Trace, path: str, res: Dict[str, Any], write_evidence: bool) -> Dict[str, Any]:
+    """采中时附上 span 树（剖析模式先写剖析文件），再写 evidence（evidence_write 只出现在 OTLP 导出中）。"""
+    if tr.profile is not None:
+        from pudao.evidence.profile import write_profile
+        res["profile"] = write_profile(tr, path, res)
+    if tr.sampled:
+        res["trace"] = tr.tree()
+    if write_evidence:
+        with span("evidence_write"):
+            append_formal_timing(path, res)
+    return res
+
+
+def _cached_result(tr: Trace, path: str, blob, cached: Dict[str, Any], tier: str, key: str,
+                   sp_parse, sp_cache, write_evidence: bool) -> Dict[str, Any]:
+    """缓存命中：复用判定字段，时间戳/耗时如实反映本次（解析 + 查缓存）。"""
+    with span("report") as sp_report:
+        res: Dict[str, Any] = copy.deepcopy(cached)
+        res["input"] = blob.info()
+        res["cache"] = {"hit": True, "tier": tier, "key": key}
+        if res.get("status") == "unsat":
+            with span("hints"):
+                res["hints"] = make_hints_payload(res, ir=None)
+    res["timestamps"] = {
+        "start_utc": tr.root.iso_start(),
+        "parse_end_utc": sp_parse.iso_end(),
+        "end_utc": sp_report.iso_end(),
+    }
+    res["timings_ms"] = {
+        "parse_ms": sp_parse.ms,
+        "cache_ms": sp_cache.ms,
+        "invariants_ms": 0.0,
+        "smt_ms": 0.0,
+        "report_ms": sp_report.ms,
+        "total_ms": tr.root.ms,
+    }
+    return _finish(tr, path, res, write_evidence)
 
 
-def check_formal_file_json(path: str) -> str:
+def check_formal_file_json(path: str, budget: Optional[Dict[str, Any]] = None,
+                           profile: bool = False) -> str:
     """同上，但以 JSON 字符串形式返回，方便 CLI 直接打印。"""
-    res = check_formal_file(path)
+    res = check_formal_file(path, budget=budget, profile=profile)
     return json.dumps(res, ensure_ascii=False, indent=2)
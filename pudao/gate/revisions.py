@@ -0,0 +1,126 @@
+# pudao/gate/revisions.py
+"""策略修订记录：每个 strategy_id 最近一次完整结论所需的中间结果，供下一版本增量复核。
+
+记录 = {strategy_id, version, context, ir, rules, smt}：
+- context：校验上下文指纹（schema / 注册表 / 拓扑 / 引擎版本 / 规则集，见 cache.context_key），
+  不一致时记录作废，走完整校验；
+- rules：  每条不变式规则的违规记录（Violation.to_dict()）；
+- smt：    {status, model?}，model 为差分约束求解器给出的可行解（热启动用）。
+
+两级存储与结论缓存相同：进程内 LRU + 磁盘目录（每个 strategy_id 一个 JSON 文件，原子替换）。
+
+环境变量：
+- PFSB_INCREMENTAL：总开关（默认 1）
+- PFSB_REVISION_DIR：磁盘目录（默认 .pudao_cache/revisions；置空则只用内存）
+- PFSB_REVISION_MEM_ENTRIES：内存条目上限（默认 256）
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+INCREMENTAL = os.getenv("PFSB_INCREMENTAL", "1") == "1"
+REVISION_DIR = os.getenv("PFSB_REVISION_DIR", ".pudao_cache/revisions")
+REVISION_MEM_ENTRIES = int(os.getenv("PFSB_REVISION_MEM_ENTRIES", "256"))
+
+
+class RevisionStore:
+    def __init__(self, store_dir: Optional[str] = REVISION_DIR,
+                 mem_entries: int = REVISION_MEM_ENTRIES):
+        self.dir = Path(store_dir) if store_dir else None
+        self.mem_entries = mem_entries
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, strategy_id: str) -> Path:
+        h = hashlib.sha256(strategy_id.encode("utf-8")).hexdigest()
+        return self.dir / f"{h[:32]}.json"
+
+    def _mem_put(self, strategy_id: str, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            self._mem[strategy_id] = rec
+            self._mem.move_to_end(strategy_id)
+            while len(self._mem) > self.mem_entries:
+                self._mem.popitem(last=False)
+
+    def get(self, strategy_id: str, context: str) -> Optional[Dict[str, Any]]:
+        """返回上下文一致的最近记录；没有或上下文已变化时返回 None。"""
+        with self._lock:
+            rec = self._mem.get(strategy_id)
+        if rec is None and self.dir is not None:
+            try:
+                rec = json.loads(self._path(strategy_id).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                rec = None
+            if rec is not None:
+                self._mem_put(strategy_id, rec)
+        if rec is None or rec.get("context") != context or rec.get("strategy_id") != strategy_id:
+            return None
+        return rec
+
+    def put(self, rec: Dict[str, Any]) -> None:
+        self._mem_put(rec["strategy_id"], rec)
+        if self.dir is None:
+            return
+        p = self._path(rec["strategy_id"])
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(rec, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, p)  # 原子替换，多进程并发写安全
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+        if self.dir is not None:
+            for f in self.dir.glob("*.json"):
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+
+
+_default: Optional[RevisionStore] = None
+
+
+def get_revision_store() -> Optional[RevisionStore]:
+    """进程级默认存储；PFSB_INCREMENTAL=0 时返回 None。"""
+    global _default
+    if not INCREMENTAL:
+        return None
+    if _default is None:
+        _default = RevisionStore()
+    return _default
+
+
+def prior_for(store: RevisionStore, ir, context: str) -> Optional[Dict[str, Any]]:
+    """取出上一版本记录并还原 IR（check_formal_with_smt 的 prior 参数）。"""
+    from pudao.dsl.models import StrategyIR
+    from pudao.dsl.parser import COLUMNAR_MIN_ACTIONS, to_ir_columnar
+    from pudao.smt.violations import Violation
+    rec = store.get(ir.strategy_id, context)
+    if rec is None:
+        return None
+    rules = {r: [Violation.from_dict(v) for v in vs] for r, vs in rec["rules"].items()}
+    raw = rec["ir"]
+    # 大策略的上一版本同样还原为列式 IR（记录来自 IR 的 json()，结构已合法）
+    large = COLUMNAR_MIN_ACTIONS and len(raw["actions"]) >= COLUMNAR_MIN_ACTIONS
+    prior_ir = to_ir_columnar(raw) if large else StrategyIR.parse_obj(raw)
+    return {"version": rec["version"], "ir": prior_ir,
+            "rules": rules, "smt": rec.get("smt")}
+
+
+def make_record(ir, context: str, revision: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "strategy_id": ir.strategy_id,
+        "version": ir.version,
+        "context": context,
+        "ir": json.loads(ir.json()),
+        "rules": {r: [v.to_dict() for v in vs] for r, vs in revision["rules"].items()},
+        "smt": revision["smt"],
+    }
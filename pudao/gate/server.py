@@ -0,0 +1,340 @@
+# pudao/gate/server.py
+"""常驻 Formal Gate 服务（pudao serve）。
+
+asyncio 前端 + 预热的 worker 进程池（worker 启动时导入 z3/jsonschema/pydantic 并预热 Z3），
+避免每次校验都付一次解释器与依赖的冷启动成本。
+
+接口：
+- Unix socket：每行一个 JSON 请求，每行一个 JSON 响应（同一连接可连续发送）
+    {"path": "...", "timeout_s": 5, "label": "ui", "budget": {"rlimit": 5000000}}
+                                                    -> check_formal_file 等价结果
+    {"op": "health"} / {"op": "metrics"}
+    {"op": "admit", "path": ...}         校验通过后与在役策略做冲突检查并准入（见 gate.fleet）
+    {"op": "retire", "strategy_id": ...} 退役
+    {"op": "fleet"}                      在役策略列表
+    {"op": "hint", "key": ..., "wait_s": 0} 查询异步 LLM 润色结果（hints.llm_key，见 hints.llm；
+                                         润色在 worker 中生成，经持久缓存查询，需 PFSB_HINTS_CACHE_DIR）
+- 本机 HTTP：
+    POST /check    body 同上
+    GET  /healthz  存活探针
+    GET  /metrics  队列深度、并发、延迟分位数（p50/p95/p99）
+    POST /admit    body 同 /check；POST /retire {"strategy_id": ...}；GET /fleet
+    GET  /hints/<llm_key>  LLM 润色结果
+
+并发控制：最多 max_concurrency 个请求同时在 worker 中执行，其余排队；
+排队数达到 max_queue 时立即拒绝（HTTP 503 / {"error": "busy"}），由调用方退避重试。
+evidence 由服务进程统一写入。
+"""
+import asyncio
+import json
+import os
+import signal
+import socket
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from pudao.gate.batch import check_one, _worker_init
+
+LATENCY_WINDOW = int(os.getenv("PFSB_SERVE_LATENCY_WINDOW", "2048"))
+MAX_BODY_BYTES = 1024 * 1024
+
+_HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                 405: "Method Not Allowed", 413: "Payload Too Large",
+                 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Busy(Exception):
+    pass
+
+
+def _percentile(sorted_vals, q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+class GateServer:
+    def __init__(self, workers: Optional[int] = None,
+                 max_concurrency: Optional[int] = None,
+                 max_queue: int = 256,
+                 default_timeout_s: Optional[float] = None,
+                 write_evidence: bool = True):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        self.max_queue = max_queue
+        self.default_timeout_s = default_timeout_s
+        self.write_evidence = write_evidence
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._servers = []
+        self._queued = 0
+        self._inflight = 0
+        self._counts = {"total": 0, "sat": 0, "unsat": 0, "unknown": 0, "rejected": 0, "errors": 0}
+        self._latency_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._t_start = perf_counter()
+
+    # ---- 生命周期 ----
+
+    async def start(self, socket_path: Optional[str] = None,
+                    http_host: str = "127.0.0.1",
+                    http_port: Optional[int] = None) -> None:
+        from pudao.hints import llm, suggester
+        if suggester.HINTS_USE_LLM and not llm.HINTS_CACHE_DIR:
+            # 润色在 worker 进程里生成，服务进程只能经持久缓存查询（GET /hints/<llm_key>）
+            raise ValueError("hints_cache_required: PFSB_HINTS_USE_LLM=1 requires PFSB_HINTS_CACHE_DIR in serve mode")
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_worker_init)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        # 提前拉起全部 worker，让首个请求也是热的
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._pool, _worker_init)
+                               for _ in range(self.workers)])
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._servers.append(await asyncio.start_unix_server(self._handle_socket, path=socket_path))
+        if http_port is not None:
+            self._servers.append(await asyncio.start_server(self._handle_http, http_host, http_port))
+
+    async def close(self) -> None:
+        for srv in self._servers:
+            srv.close()
+            await srv.wait_closed()
+        self._servers = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    @property
+    def http_port(self) -> Optional[int]:
+        for srv in self._servers:
+            for sock in srv.sockets or []:
+                if sock.family in (socket.AF_INET, socket.AF_INET6):
+                    return sock.getsockname()[1]
+        return None
+
+    # ---- 校验 ----
+
+    async def check(self, req: Dict[str, Any], fleet_summary: bool = False) -> Dict[str, Any]:
+        path = req.get("path")
+        if not isinstance(path, str) or not path:
+            raise ValueError("request requires 'path'")
+        if self._queued >= self.max_queue:
+            self._counts["rejected"] += 1
+            raise Busy()
+
+        timeout_s = req.get("timeout_s", self.default_timeout_s)
+        label = req.get("label")
+        budget = req.get("budget")
+        if budget is not None:
+            from pudao.smt.budget import SolverBudget
+            SolverBudget.coerce(budget)  # 非法字段 / 取值在入队前就返回 400
+        t0 = perf_counter()
+        self._queued += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self._queued -= 1
+        self._inflight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            res, rec = await loop.run_in_executor(self._pool, check_one, path, timeout_s, label, budget,
+                                                  fleet_summary)
+        except Exception:
+            self._counts["errors"] += 1
+            raise
+        finally:
+            self._inflight -= 1
+            self._sem.release()
+
+        if self.write_evidence:
+            from pudao.evidence.evidence import append_raw
+            append_raw(rec)
+
+        self._latency_ms.append((perf_counter() - t0) * 1000.0)
+        self._counts["total"] += 1
+        status = res.get("status")
+        self._counts[status if status in ("sat", "unsat") else "unknown"] += 1
+        return res
+
+    async def admit(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        # 摘要随校验结果由 worker 一并返回（同一次解析、同一份并发/排队额度）；
+        # 在役库的文件锁与 journal fsync 放到线程里，不阻塞事件循环
+        from pudao.gate.fleet import admit_result, get_fleet
+        res = await self.check(req, fleet_summary=True)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, admit_result, res, get_fleet(), bool(req.get("force")))
+
+    async def retire(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        from pudao.gate.fleet import get_fleet
+        sid = req.get("strategy_id")
+        if not isinstance(sid, str) or not sid:
+            raise ValueError("request requires 'strategy_id'")
+        loop = asyncio.get_running_loop()
+        return {"strategy_id": sid, "retired": await loop.run_in_executor(None, get_fleet().retire, sid)}
+
+    async def hint(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        from pudao.hints.llm import check_key, hint_status
+        key = check_key(req.get("key"))
+        try:
+            wait_s = float(req.get("wait_s") or 0)
+        except (TypeError, ValueError):
+            raise ValueError("'wait_s' must be a number")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, hint_status, key, wait_s)
+
+    def health(self) -> Dict[str, Any]:
+        return {"ok": self._pool is not None, "workers": self.workers,
+                "uptime_s": perf_counter() - self._t_start}
+
+    def metrics(self) -> Dict[str, Any]:
+        lat = sorted(self._latency_ms)
+        return {
+            "queue_depth": self._queued,
+            "inflight": self._inflight,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "counts": dict(self._counts),
+            "latency_ms": {
+                "window": len(lat),
+                "p50": _percentile(lat, 0.50),
+                "p95": _percentile(lat, 0.95),
+                "p99": _percentile(lat, 0.99),
+                "max": lat[-1] if lat else None,
+            },
+        }
+
+    async def dispatch(self, req: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """统一分发：返回 (http_status, body)。"""
+        op = req.get("op", "check")
+        if op == "health":
+            return 200, self.health()
+        if op == "metrics":
+            return 200, self.metrics()
+        if op == "fleet":
+            from pudao.gate.fleet import get_fleet
+            loop = asyncio.get_running_loop()
+            return 200, {"active": await loop.run_in_executor(None, get_fleet().active)}
+        if op not in ("check", "admit", "retire", "hint"):
+            return 400, {"error": f"unknown op: {op}"}
+        try:
+            if op == "hint":
+                return 200, await self.hint(req)
+            if op == "retire":
+                return 200, await self.retire(req)
+            if op == "admit":
+                return 200, await self.admit(req)
+            return 200, await self.check(req)
+        except Busy:
+            return 503, {"error": "busy", "queue_depth": self._queued}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    # ---- Unix socket：NDJSON ----
+
+    async def _handle_socket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    req = json.loads(line)
+                    if not isinstance(req, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    body = {"error": f"bad_request: {e}"}
+                else:
+                    _, body = await self.dispatch(req)
+                writer.write((json.dumps(body, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # ---- 本机 HTTP（最小实现，Connection: close）----
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            status, body = await self._http_request(reader)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            status, body = 400, {"error": "bad_request"}
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_HTTP_REASONS.get(status, 'Error')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n")
+        try:
+            writer.write(head.encode("ascii") + data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _http_request(self, reader: asyncio.StreamReader) -> Tuple[int, Dict[str, Any]]:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        method, target, _ = request_line.split(" ", 2)
+        headers: Dict[str, str] = {}
+        while True:
+            h = (await reader.readline()).decode("latin-1").strip()
+            if not h:
+                break
+            k, _, v = h.partition(":")
+            headers[k.strip().lower()] = v.strip()
+
+        route = target.split("?", 1)[0]
+        if route == "/healthz":
+            return 200, self.health()
+        if route == "/metrics":
+            return 200, self.metrics()
+        if route.startswith("/hints/"):
+            return await self.dispatch({"op": "hint", "key": route[len("/hints/"):]})
+        if route == "/fleet":
+            return await self.dispatch({"op": "fleet"})
+        if route not in ("/check", "/admit", "/retire"):
+            return 404, {"error": f"no route {route}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            return 413, {"error": "body too large"}
+        req = json.loads(await reader.readexactly(length) if length else b"{}")
+        if not isinstance(req, dict):
+            return 400, {"error": "request must be a JSON object"}
+        req["op"] = route[1:]
+        return await self.dispatch(req)
+
+
+async def _serve_forever(server: GateServer, socket_path: Optional[str],
+                         http_host: str, http_port: Optional[int]) -> None:
+    await server.start(socket_path, http_host, http_port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def serve(socket_path: Optional[str] = None, http_host: str = "127.0.0.1",
+          http_port: Optional[int] = None, workers: Optional[int] = None,
+          max_concurrency: Optional[int] = None, max_queue: int = 256,
+          timeout_s: Optional[float] = None) -> None:
+    """阻塞运行服务，直到 SIGINT/SIGTERM。"""
+    server = GateServer(workers, max_concurrency, max_queue, timeout_s)
+    asyncio.run(_serve_forever(server, socket_path, http_host, http_port))
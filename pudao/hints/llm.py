@@ -0,0 +1,249 @@
+# pudao/hints/llm.py
+"""LLM 润色：异步、带缓存，不阻塞校验结论。
+
+- 结论与确定性提示立即返回；润色请求交给有界线程池（PFSB_HINTS_LLM_WORKERS），
+  排队数达到 PFSB_HINTS_LLM_QUEUE 时直接丢弃（llm_status="dropped"），不拖慢校验；
+- 结果按提示词输入的哈希（suggester._hash_inputs，含模型名）写入持久缓存（每个键一个 JSON 文件，原子替换），
+  同样的失败再次出现时直接命中；
+- 同一键正在生成时不重复请求（合并到同一个 Future）；
+- 每次调用带超时（PFSB_HINTS_LLM_TIMEOUT_S），超时 / 出错不入缓存，下次重试。
+
+客户端可插拔：client(prompt, timeout_s) -> str。默认客户端在 PFSB_HINTS_LLM_URL 配置时
+以 OpenAI 兼容的 chat/completions 协议调用（PFSB_LLM_MODEL、PFSB_LLM_API_KEY），
+也可用 set_client() 注入任意实现（例如测试里的本地桩服务）。
+
+环境变量：
+- PFSB_HINTS_LLM_URL：chat/completions 端点（空则不调用远端）
+- PFSB_LLM_MODEL / PFSB_LLM_API_KEY：模型名 / 鉴权（可选）
+- PFSB_HINTS_LLM_TIMEOUT_S：单次调用超时（默认 10）
+- PFSB_HINTS_LLM_WORKERS：并发调用数（默认 2）
+- PFSB_HINTS_LLM_QUEUE：排队上限（默认 64）
+- PFSB_HINTS_CACHE_DIR：持久缓存目录（默认 .pudao_cache/hints；置空则只用内存）
+- PFSB_HINTS_MAX_WAIT_S：hint_status 的 wait_s 上限（默认 30）
+
+润色在发起校验的进程里生成（服务模式下是 worker 进程），其它进程只能经持久缓存看到结果，
+因此服务模式要求 PFSB_HINTS_CACHE_DIR 非空（见 pudao.gate.server）。
+"""
+import json
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib import request
+
+from pudao.evidence.trace import iso_utc
+
+LLM_URL = os.getenv("PFSB_HINTS_LLM_URL", "")
+LLM_MODEL = os.getenv("PFSB_LLM_MODEL", "gpt-4o-mini")
+LLM_API_KEY = os.getenv("PFSB_LLM_API_KEY", "")
+LLM_TIMEOUT_S = float(os.getenv("PFSB_HINTS_LLM_TIMEOUT_S", "10"))
+LLM_WORKERS = int(os.getenv("PFSB_HINTS_LLM_WORKERS", "2"))
+LLM_QUEUE = int(os.getenv("PFSB_HINTS_LLM_QUEUE", "64"))
+HINTS_CACHE_DIR = os.getenv("PFSB_HINTS_CACHE_DIR", ".pudao_cache/hints")
+HINTS_MAX_WAIT_S = float(os.getenv("PFSB_HINTS_MAX_WAIT_S", "30"))
+
+# llm_key 的形式（suggester._hash_inputs：sha256 前 16 位十六进制）；同时也是缓存文件名
+_KEY_RE = re.compile(r"[0-9a-f]{16}")
+_POLL_S = 0.05
+
+Client = Callable[[str, float], str]
+
+SYSTEM_PROMPT = "你是严谨的交通策略校验助手。"
+
+
+
+def http_chat_client(url: str, model: str = LLM_MODEL, api_key: str = LLM_API_KEY) -> Client:
+    """OpenAI 兼容的 chat/completions 客户端（只依赖标准库）。"""
+    def call(prompt: str, timeout_s: float) -> str:
+        body = json.dumps({
+            "model": model,
+            "messages": [{"role": "system", "content": SYSTEM_PROMPT},
+                         {"role": "user", "content": prompt}],
+            "temperature": 0.0,
+        }, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        req = request.Request(url, data=body, headers=headers, method="POST")
+        with request.urlopen(req, timeout=timeout_s) as resp:
+            data = json.loads(resp.read().decode("utf-8"))
+        return data["choices"][0]["message"]["content"].strip()
+    return call
+
+
+class HintCache:
+    def __init__(self, cache_dir: Optional[str] = HINTS_CACHE_DIR):
+        self.dir = Path(cache_dir) if cache_dir else None
+        self._mem: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._mem.get(key)
+        if text is None and self.dir is not None:
+            try:
+                text = json.loads((self.dir / f"{key}.json").read_text(encoding="utf-8"))["text"]
+            except (OSError, ValueError, KeyError):
+                return None
+            with self._lock:
+                self._mem[key] = text
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            self._mem[key] = text
+        if self.dir is None:
+            return
+        p = self.dir / f"{key}.json"
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"key": key, "text": text, "ts_utc": iso_utc()}, ensure_ascii=False),
+                           encoding="utf-8")
+            os.replace(tmp, p)  # 原子替换，多进程并发写安全
+        except OSError:
+            pass
+
+
+class LLMHinter:
+    """有界线程池 + 按键合并 + 持久缓存。"""
+
+    def __init__(self, client: Client, cache: Optional[HintCache] = None,
+                 workers: int = LLM_WORKERS, max_queue: int = LLM_QUEUE,
+                 timeout_s: float = LLM_TIMEOUT_S):
+        self.client = client
+        self.cache = cache if cache is not None else HintCache()
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="pudao-hint")
+        self._inflight: Dict[str, Future] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "cached": 0, "coalesced": 0, "dropped": 0, "calls": 0, "errors": 0}
+
+    def submit(self, key: str, prompt: str) -> Tuple[str, Optional[str]]:
+        """返回 (状态, 文本)：ready（缓存命中）/ pending（已排队或合并）/ dropped（队列已满）。"""
+        text = self.cache.get(key)
+        with self._lock:
+            self.counts["requests"] += 1
+            if text is not None:
+                self.counts["cached"] += 1
+                return "ready", text
+            if key in self._inflight:
+                self.counts["coalesced"] += 1
+                return "pending", None
+            if len(self._inflight) >= self.max_queue:
+                self.counts["dropped"] += 1
+                return "dropped", None
+            self._errors.pop(key, None)
+            fut = self._pool.submit(self._run, key, prompt)
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _f, k=key: self._done(k))
+        return "pending", None
+
+    def _run(self, key: str, prompt: str) -> Optional[str]:
+        with self._lock:
+            self.counts["calls"] += 1
+        try:
+            text = self.client(prompt, self.timeout_s)
+        except Exception as e:  # 超时 / 网络 / 格式错误：不入缓存
+            with self._lock:
+                self.counts["errors"] += 1
+                self._errors[key] = f"{type(e).__name__}: {e}"
+            return None
+        self.cache.put(key, text)
+        return text
+
+    def _done(self, key: str) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def status(self, key: str, wait_s: float = 0.0) -> Dict[str, Any]:
+        """查询润色结果；wait_s > 0 时最多等待这么久。"""
+        with self._lock:
+            fut = self._inflight.get(key)
+        if fut is not None and wait_s > 0:
+            try:
+                fut.result(timeout=wait_s)
+            except Exception:
+                pass
+        text = self.cache.get(key)
+        if text is not None:
+            return {"key": key, "status": "ready", "text": text}
+        with self._lock:
+            if key in self._inflight:
+                return {"key": key, "status": "pending", "text": None}
+            err = self._errors.get(key)
+        if err is not None:
+            return {"key": key, "status": "error", "text": None, "error": err}
+        return {"key": key, "status": "unknown", "text": None}
+
+    def close(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+_client: Optional[Client] = None
+_default: Optional[LLMHinter] = None
+_default_lock = threading.Lock()
+
+
+def set_client(client: Optional[Client]) -> None:
+    """注入客户端（None 恢复为按 PFSB_HINTS_LLM_URL 构造）；已有的默认 hinter 会被替换。"""
+    global _client, _default
+    with _default_lock:
+        _client = client
+        old, _default = _default, None
+    if old is not None:
+        old.close(wait=False)
+
+
+def get_client() -> Optional[Client]:
+    if _client is not None:
+        return _client
+    return http_chat_client(LLM_URL) if LLM_URL else None
+
+
+def get_hinter() -> Optional[LLMHinter]:
+    """进程级默认 hinter；没有可用客户端时返回 None。"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            client = get_client()
+            if client is None:
+                return None
+            _default = LLMHinter(client)
+        return _default
+
+
+def check_key(key: Any) -> str:
+    """校验外部传入的 llm_key（16 位小写十六进制），不合法时抛 ValueError。"""
+    if not isinstance(key, str) or not _KEY_RE.fullmatch(key):
+        raise ValueError(f"invalid_hint_key: {key!r}")
+    return key
+
+
+def hint_status(key: str, wait_s: float = 0.0) -> Dict[str, Any]:
+    """
+    按键查询润色结果；wait_s 截断到 [0, PFSB_HINTS_MAX_WAIT_S]。
+    本进程发起的请求直接等待其 Future；其它进程发起的请求轮询持久缓存直到就绪或超时
+    （缓存目录为空时看不到其它进程的结果，仍为 unknown）。
+    """
+    check_key(key)
+    wait_s = min(max(float(wait_s or 0), 0.0), HINTS_MAX_WAIT_S)
+    deadline = monotonic() + wait_s
+    hinter = get_hinter()
+    if hinter is not None:
+        res = hinter.status(key, wait_s)
+        if res["status"] != "unknown":
+            return res
+        cache = hinter.cache
+    else:
+        cache = HintCache(HINTS_CACHE_DIR)
+    text = cache.get(key)
+    while text is None and cache.dir is not None and monotonic() < deadline:
+        sleep(min(_POLL_S, max(0.0, deadline - monotonic())))
+        text = cache.get(key)
+    return {"key": key, "status": "ready" if text is not None else "unknown", "text": text}
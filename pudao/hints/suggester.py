@@ -1,8 +1,10 @@
 # pudao/hints/suggester.py
 from __future__ import annotations
-import os, re, json, hashlib
+import os, json, hashlib
 from typing import Any, Dict, List, Optional
 
+from pudao.smt.violations import Violation, as_violations, by_invariant
+
 # 环境开关
 HINTS_ENABLE      = os.getenv("PFSB_HINTS_ENABLE", "1") == "1"          # 总开关
 HINTS_USE_LLM     = os.getenv("PFSB_HINTS_USE_LLM", "0") == "1"         # 是否调用LLM润色
@@ -26,55 +28,70 @@ def _dedup_keep_order(items: List[str]) -> List[str]:
         seen.add(x); out.append(x)
     return out[:HINTS_MAX_BULLETS]
 
+def _violations(result: Dict[str, Any]) -> List[Violation]:
+    # 优先读结构化记录；旧结果（无 violations 字段）按原因字符串前缀还原
+    vs = result.get("violations")
+    if vs is not None:
+        return [Violation.from_dict(v) for v in vs]
+    return as_violations(result.get("reasons") or [])
+
 def suggest_deterministic(result: Dict[str, Any],
                           ir: Optional[Any] = None) -> List[str]:
     """
-    基于 reasons/details 生成确定性、可复现的修复建议（不依赖LLM）。
+    基于 violations/details 生成确定性、可复现的修复建议（不依赖LLM）。
+    违规记录按所属不变式索引一次，各规则直接查索引、从 targets 取对象ID。
     """
-    reasons = [str(r) for r in (result.get("reasons") or [])]
     details = result.get("details") or {}
+    index = by_invariant(_violations(result))
+    codes = {v.code for vs in index.values() for v in vs}
+
+    def failed(inv: str) -> bool:
+        return details.get(inv) == "fail" or inv in index
 
     tips: List[str] = []
 
     # I1 结构/引用
-    if details.get("I1_structure") == "fail" or any("invalid_reference" in r or "schema_violation" in r for r in reasons):
+    if failed("I1_structure"):
         tips.append("检查ID/字段：确保 segment_id/ramp_id/vms_id 存在且拼写正确，必填字段齐全。")
         tips.append("如由UI模板生成，请确认未删除必填字段（如 rollout.max_revert_time_s）。")
 
     # I2 空间平滑
-    if details.get("I2_spatial") == "fail" or any("spatial_smoothness_violated" in r for r in reasons):
+    if failed("I2_spatial"):
         tips.append("相邻路段限速差超阈值：把相邻段的限速差收敛到 guardrails.max_delta 以内。")
         tips.append("优先调整变化更剧烈的路段，使 VSL 梯度更平滑。")
 
     # I3 时间稳定
-    if details.get("I3_temporal") == "fail" or any("temporal_stability_violated" in r for r in reasons):
+    if failed("I3_temporal"):
         tips.append("同一路段存在多次/冲突限速：合并为单一目标值，或放宽 max_changes_per_5min。")
 
     # I4 安全边界
-    if details.get("I4_safety") == "fail" or any("safety_bounds_violated" in r for r in reasons):
+    if failed("I4_safety"):
         tips.append("限速越界：将 value 限制在 guardrails.min_vsl ~ guardrails.max_vsl 之间，禁止以 vsl=0 伪装封闭。")
 
     # I5 回滚可行性
-    if details.get("I5_rollback") == "fail" or any("rollback_missing_or_infinite" in r for r in reasons):
+    if failed("I5_rollback"):
         tips.append("强干预缺少回滚：补充 rollout.max_revert_time_s，且不超过 guardrails.max_closure_s。")
 
     # I6 互斥动作
-    if details.get("I6_conflict") == "fail" or any("mutually_exclusive_actions" in r for r in reasons):
-        # 尝试提取冲突对象ID
-        conflict_objs = []
-        for r in reasons:
-            m = re.search(r"(segment|ramp|vms)\s+([A-Za-z0-9\-\_]+)", r)
-            if m: conflict_objs.append(f"{m.group(1)}={m.group(2)}")
-        obj_txt = f"（{', '.join(conflict_objs)}）" if conflict_objs else ""
+    if failed("I6_conflict"):
+        conflict_objs = [f"{k}={i}" for v in index.get("I6_conflict", ()) for k, i in v.targets]
+        obj_txt = f"（{', '.join(dict.fromkeys(conflict_objs))}）" if conflict_objs else ""
         tips.append(f"互斥动作冲突{obj_txt}：同一对象请仅保留一种动作（例如 ramp 只能二选一：metering 或 closure）。")
 
     # I7 控制流/时序
-    if details.get("I7_flow") == "fail" or any("flow_invariants_violated" in r for r in reasons):
+    if failed("I7_flow"):
         tips.append("流程约束不满足：封闭/强干预必须设置有限时长，并与回滚时间一致或更短。")
 
+    # Z3 最小冲突集：直接指出需要调整的动作与护栏
+    core = result.get("unsat_core") or {}
+    if core.get("actions") or core.get("guardrails"):
+        acts = "、".join(f"#{i}" for i in core.get("actions", [])) or "无"
+        grs = "、".join(core.get("guardrails", [])) or "无"
+        tips.append(f"最小冲突集：动作 {acts} 与护栏 {grs} 无法同时满足；调整其中任一项即可，其余动作无需改动。")
+
     # 兜底
     if not tips:
-        if any("smt_unsat_without_local_reason" in r for r in reasons):
+        if "smt_unsat_without_local_reason" in codes:
             tips.append("Z3 不可满足但未定位具体原因：建议逐步精简动作，只保留最小子集定位冲突。")
         else:
             tips.append("未命中标准错误模板：请检查 guardrails 与 actions 的组合是否存在隐式矛盾。")
@@ -91,7 +108,7 @@ def suggest_deterministic(result: Dict[str, Any],
 def _hash_inputs(*parts: str) -> str:
     h = hashlib.sha256()
     for p in parts:
-        h.update((p or "").encode("utf-8"))
+        h.update((p or "").encode("utf-8") + b"\0")
     return h.hexdigest()[:16]
 
 def _compose_llm_prompt(deterministic_tips: List[str],
@@ -111,41 +128,28 @@ def _compose_llm_prompt(deterministic_tips: List[str],
     )
 
 def generate_llm_hint(deterministic_tips: List[str],
-                      result: Dict[str, Any]) -> Optional[str]:
+                      result: Dict[str, Any]) -> Dict[str, Any]:
     """
-    这里仅示意：保留接口，让你接到任意大模型SDK（OpenAI/Azure/DeepSeek等）。
-    默认返回 None；启用时请在外层注入实际客户端。
+    LLM 润色（见 pudao.hints.llm）：不阻塞校验，只在缓存命中时立即给出文本。
+    返回 {"llm": 文本或 None, "llm_status": ready|pending|dropped|template, "llm_key"?}；
+    pending 时可凭 llm_key 之后查询（llm.get_hinter().status(key) / 服务端 {"op": "hint"}）。
+    未配置客户端（PFSB_HINTS_LLM_URL / llm.set_client）时退回模板化占位文本。
     """
-    if not HINTS_USE_LLM:
-        return None
-    try:
-        prompt = _compose_llm_prompt(deterministic_tips, result)
-
-        # === 在此接入你的LLM客户端 ===
-        # 伪代码示例：
-        # from openai import OpenAI
-        # client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        # resp = client.chat.completions.create(
-        #   model=os.getenv("PFSB_LLM_MODEL", "gpt-4o-mini"),
-        #   messages=[{"role":"system","content":"你是严谨的交通策略校验助手。"},
-        #             {"role":"user","content":prompt}],
-        #   temperature=0.0,
-        # )
-        # text = resp.choices[0].message.content.strip()
-
-        # 这里先返回模板化占位，确保代码可运行
-        text = "\n".join(deterministic_tips[:HINTS_MAX_BULLETS])
-        return text
-    except Exception:
-        return None
+    from pudao.hints import llm
+    hinter = llm.get_hinter()
+    if hinter is None:
+        return {"llm": "\n".join(deterministic_tips[:HINTS_MAX_BULLETS]), "llm_status": "template"}
+    prompt = _compose_llm_prompt(deterministic_tips, result)
+    key = _hash_inputs(llm.LLM_MODEL, prompt)
+    status, text = hinter.submit(key, prompt)
+    return {"llm": text, "llm_status": status, "llm_key": key}
 
 def make_hints_payload(result: Dict[str, Any],
                        ir: Optional[Any] = None) -> Optional[Dict[str, Any]]:
     if not HINTS_ENABLE or (result.get("status") != "unsat"):
         return None
     det = suggest_deterministic(result, ir)
-    llm_text = generate_llm_hint(det, result)
-    return {
-        "deterministic": det,
-        "llm": llm_text
-    }
+    payload: Dict[str, Any] = {"deterministic": det, "llm": None}
+    if HINTS_USE_LLM:
+        payload.update(generate_llm_hint(det, result))
+    return payload
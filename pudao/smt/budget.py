@@ -0,0 +1,148 @@
+# pudao/smt/budget.py
+"""求解资源预算与求解器配置。
+
+预算（按请求，可被请求参数覆盖）：
+- timeout_ms：整次 SMT 阶段的墙钟上限（增量求解/最小化共享同一截止时间）；
+- rlimit：    Z3 资源计数上限（与机器快慢无关，结果可复现）；
+- memory_mb： Z3 内存上限（进程级参数，只在本次求解期间生效，结束后恢复原值）。
+超出任一预算时 Z3 返回 unknown，Formal Gate 给出 status="unknown"，而不是误报 unsat。
+
+环境变量：PFSB_SOLVER_TIMEOUT_MS（默认 30000，0=不限）、PFSB_SOLVER_RLIMIT（默认 0=不限）、
+PFSB_SOLVER_MEMORY_MB（默认 0=不限）、PFSB_SOLVER_CONFIG（默认 default）、PFSB_SMT_ENGINE（默认 auto）、
+PFSB_CORE_BUDGET_MS（unsat core 最小化预算，默认 500）。
+"""
+import math
+import os
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, Optional
+
+SOLVER_TIMEOUT_MS = float(os.getenv("PFSB_SOLVER_TIMEOUT_MS", "30000"))
+SOLVER_RLIMIT = int(os.getenv("PFSB_SOLVER_RLIMIT", "0"))
+SOLVER_MEMORY_MB = int(os.getenv("PFSB_SOLVER_MEMORY_MB", "0"))
+SOLVER_CONFIG = os.getenv("PFSB_SOLVER_CONFIG", "default")
+# 静态策略的求解引擎：auto = 差分约束求解器（pudao.smt.difference），z3 = 始终用 Z3
+# （放在不导入 z3 的模块中：结论缓存键读取它时不触发 z3 导入）
+SMT_ENGINE = os.getenv("PFSB_SMT_ENGINE", "auto")
+# unsat core 最小化的时间预算（毫秒）：Z3 与差分约束两条路径共用
+CORE_BUDGET_MS = float(os.getenv("PFSB_CORE_BUDGET_MS", "500"))
+
+# 可选求解器配置（portfolio 的候选）：logic -> SolverFor(logic)；params -> solver.set(...)
+# 只收录支持假设与 unsat core 的配置（纯 tactic 管线不返回 core）
+SOLVER_CONFIGS: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "qf_lia": {"logic": "QF_LIA"},
+    "simplex_seed7": {"params": {"arith.solver": 2, "random_seed": 7}},
+    "seed42": {"params": {"random_seed": 42}},
+}
+
+
+class SolverBudget:
+    __slots__ = ("timeout_ms", "rlimit", "memory_mb", "_deadline", "_started", "_prev_memory")
+
+    def __init__(self, timeout_ms: Optional[float] = SOLVER_TIMEOUT_MS,
+                 rlimit: Optional[int] = SOLVER_RLIMIT,
+                 memory_mb: Optional[int] = SOLVER_MEMORY_MB):
+        self.timeout_ms = timeout_ms or None
+        self.rlimit = rlimit or None
+        self.memory_mb = memory_mb or None
+        self._deadline: Optional[float] = None
+        self._started = False
+        self._prev_memory: Optional[str] = None
+
+    @classmethod
+    def coerce(cls, obj: Any) -> "SolverBudget":
+        """
+        None -> 环境默认；dict -> 覆盖环境默认中的对应项；SolverBudget 原样返回。
+        dict 来自客户端请求：rlimit / memory_mb 须为正整数，timeout_ms 须为正数（null / 0 表示不限），
+        否则抛 ValueError（服务端返回 400），不把非法值交给 Z3。
+        """
+        if isinstance(obj, SolverBudget):
+            return obj
+        if obj is not None and not isinstance(obj, dict):
+            raise ValueError("invalid_budget: budget must be an object")
+        b = cls()
+        for k, v in (obj or {}).items():
+            if k not in cls.__slots__ or k.startswith("_"):
+                raise ValueError(f"unknown budget field: {k}")
+            setattr(b, k, _check_limit(k, v))
+        return b
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"timeout_ms": self.timeout_ms, "rlimit": self.rlimit, "memory_mb": self.memory_mb}
+
+    def start(self) -> "SolverBudget":
+        """开始计时（SMT 阶段入口调用一次）；同时设置进程级内存上限（finish 时恢复原值）。"""
+        self._deadline = (perf_counter() + self.timeout_ms / 1000.0) if self.timeout_ms else None
+        self._started = True
+        if self.memory_mb:
+            import z3
+            if self._prev_memory is None:
+                self._prev_memory = z3.get_param("memory_max_size")
+            z3.set_param("memory_max_size", int(self.memory_mb))
+        return self
+
+    def finish(self) -> None:
+        """恢复 start 之前的进程级内存上限：同一 worker 中后续请求不受本次预算影响。"""
+        if self._prev_memory is not None:
+            import z3
+            z3.set_param("memory_max_size", self._prev_memory)
+            self._prev_memory = None
+
+    @contextmanager
+    def running(self) -> Iterator["SolverBudget"]:
+        """未开始时 start，退出时 finish；已开始（外层已进入）时原样使用。"""
+        if self._started:
+            yield self
+            return
+        self.start()
+        try:
+            yield self
+        finally:
+            self.finish()
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def remaining_ms(self) -> Optional[float]:
+        if self._deadline is None:
+            return None
+        return max(0.0, (self._deadline - perf_counter()) * 1000.0)
+
+    def expired(self) -> bool:
+        r = self.remaining_ms()
+        return r is not None and r <= 0
+
+    def apply(self, solver) -> None:
+        """在每次 check 之前调用：把剩余时间与 rlimit 设到 solver 上。"""
+        r = self.remaining_ms()
+        if r is not None:
+            solver.set("timeout", max(1, int(r)))
+        if self.rlimit:
+            solver.set("rlimit", int(self.rlimit))
+
+
+def _check_limit(name: str, v: Any) -> Any:
+    if v is None or (v == 0 and not isinstance(v, bool)):
+        return None
+    if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v) or v <= 0:
+        kind = "number" if name == "timeout_ms" else "integer"
+        raise ValueError(f"invalid_budget: {name} must be a positive {kind}, got {v!r}")
+    if name != "timeout_ms":
+        if v != int(v):
+            raise ValueError(f"invalid_budget: {name} must be a positive integer, got {v!r}")
+        v = int(v)
+    return v
+
+
+def new_solver(config: str = SOLVER_CONFIG):
+    import z3
+    try:
+        cfg = SOLVER_CONFIGS[config]
+    except KeyError:
+        raise ValueError(f"unknown solver config: {config} (choose from {', '.join(SOLVER_CONFIGS)})")
+    s = z3.SolverFor(cfg["logic"]) if "logic" in cfg else z3.Solver()
+    for k, v in cfg.get("params", {}).items():
+        s.set(k, v)
+    return s
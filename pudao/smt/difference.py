@@ -0,0 +1,274 @@
+# pudao/smt/difference.py
+"""差分约束求解器：静态 VSL 可行性（不依赖 z3）。
+
+静态编码（见 encoder.encode）中的约束都是差分约束 x - y <= c：
+- 护栏：   min_vsl <= v <= max_vsl         -> v - Z <= max_vsl，Z - v <= -min_vsl
+- 动作：   v == value                      -> v - Z <= value，Z - v <= -value
+- 平滑：   |v_a - v_b| <= max_delta        -> v_a - v_b <= max_delta，v_b - v_a <= max_delta
+其中 Z 是取值为 0 的参考变量。约束 x - y <= c 对应边 y -> x（权 c）：
+- 无负环时，从虚拟源点出发的最短距离 d 给出一组可行解 v = d[v] - d[Z]（整数）；
+- 有负环时，环上的约束（带 action:<下标> / guardrail:<字段名> 标签）不可同时满足；
+  一个标签可能对应多条约束，因此再按标签做删除法最小化（只在冲突标签的子系统上重解，
+  预算 PFSB_CORE_BUDGET_MS，超出时返回当前的冲突集，minimal=False）。
+
+最短路用 SPFA（队列优化的 Bellman-Ford），每 n 次松弛检查一次前驱图中是否已成环。
+scope.segments 中没有 vsl 动作的路段只受护栏与平滑约束，由求解结果给出取值。
+"""
+from collections import deque
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pudao.dsl.columnar import iter_vsl
+from pudao.dsl.models import StrategyIR
+from pudao.smt.budget import CORE_BUDGET_MS
+from pudao.topology.index import get_topology
+
+ZERO = "0"
+
+# 负环中的一条约束：(x, y, c, label)，表示 x - y <= c
+Constraint = Tuple[str, str, int, str]
+
+
+class DifferenceSystem:
+    __slots__ = ("names", "_index", "_src", "_dst", "_w", "_label", "_adj", "_radj")
+
+    def __init__(self):
+        self.names: List[str] = [ZERO]
+        self._index: Dict[str, int] = {ZERO: 0}
+        self._src: List[int] = []
+        self._dst: List[int] = []
+        self._w: List[int] = []
+        self._label: List[str] = []
+        self._adj: List[List[int]] = [[]]
+        self._radj: List[List[int]] = [[]]
+
+    def var(self, name: str) -> int:
+        i = self._index.get(name)
+        if i is None:
+            i = self._index[name] = len(self.names)
+            self.names.append(name)
+            self._adj.append([])
+            self._radj.append([])
+        return i
+
+    def add(self, x: str, y: str, c: int, label: str) -> None:
+        """添加约束 x - y <= c。"""
+        u, v = self.var(y), self.var(x)
+        self._adj[u].append(len(self._w))
+        self._radj[v].append(len(self._w))
+        self._src.append(u)
+        self._dst.append(v)
+        self._w.append(int(c))
+        self._label.append(label)
+
+    def upper(self, x: str, c: int, label: str) -> None:
+        self.add(x, ZERO, c, label)
+
+    def lower(self, x: str, c: int, label: str) -> None:
+        self.add(ZERO, x, -c, label)
+
+    def __len__(self) -> int:
+        return len(self._w)
+
+    def subsystem(self, labels) -> "DifferenceSystem":
+        """只保留给定标签的约束（变量不变）。"""
+        sub = DifferenceSystem()
+        for name in self.names[1:]:
+            sub.var(name)
+        names = self.names
+        for e, lab in enumerate(self._label):
+            if lab in labels:
+                sub.add(names[self._dst[e]], names[self._src[e]], self._w[e], lab)
+        return sub
+
+    def _cycle_from(self, v: int, pred: List[int]) -> Optional[List[int]]:
+        # 沿前驱边回溯：回到已访问过的点即为环，返回环上的边（按方向排列）
+        seen: Dict[int, int] = {}
+        path: List[int] = []
+        while v not in seen:
+            e = pred[v]
+            if e < 0:
+                return None
+            seen[v] = len(path)
+            path.append(e)
+            v = self._src[e]
+        cyc = path[seen[v]:]
+        cyc.reverse()
+        return cyc
+
+    def _find_cycle(self, pred: List[int]) -> Optional[List[int]]:
+        n = len(self.names)
+        state = [0] * n  # 0 未访问，1 本轮路径上，2 已确认无环
+        for s in range(n):
+            if state[s]:
+                continue
+            path = []
+            v = s
+            while v >= 0 and state[v] == 0:
+                state[v] = 1
+                path.append(v)
+                e = pred[v]
+                v = self._src[e] if e >= 0 else -1
+            if v >= 0 and state[v] == 1:
+                return self._cycle_from(v, pred)
+            for u in path:
+                state[u] = 2
+        return None
+
+    def solve(self, init: Optional[Dict[str, int]] = None,
+              changed: Iterable[str] = ()) -> Tuple[Optional[Dict[str, int]], Optional[List[Constraint]]]:
+        """
+        返回 (可行解, None) 或 (None, 负环上的约束)。
+        热启动：init 为上一版本的可行解，changed 为约束有变化的变量（及新变量）；
+        未变化的约束在 init 下仍然满足，只需从变化处开始松弛。
+        """
+        n = len(self.names)
+        adj, dst, w = self._adj, self._dst, self._w
+        pred = [-1] * n
+        if init is None:
+            d = [0] * n  # 虚拟源点到每个点的边权为 0
+            in_q = [True] * n
+            q = deque(range(n))
+        else:
+            d = [0] + [init.get(name, 0) for name in self.names[1:]]
+            in_q = [False] * n
+            q = deque()
+            seeds = {i for i, name in enumerate(self.names) if i and name not in init}
+            for name in changed:
+                i = self._index.get(name)
+                if i is not None:
+                    seeds.add(i)
+            for v in list(seeds):
+                for e in self._radj[v]:  # 入边被违反：从其起点重新松弛
+                    u = self._src[e]
+                    if d[u] + w[e] < d[v]:
+                        seeds.add(u)
+            for i in sorted(seeds):
+                in_q[i] = True
+                q.append(i)
+        relax = 0
+        while q:
+            u = q.popleft()
+            in_q[u] = False
+            du = d[u]
+            for e in adj[u]:
+                v = dst[e]
+                nd = du + w[e]
+                if nd < d[v]:
+                    d[v] = nd
+                    pred[v] = e
+                    relax += 1
+                    if relax % n == 0:
+                        cyc = self._find_cycle(pred)
+                        if cyc is not None:
+                            return None, self._constraints(cyc)
+                    if not in_q[v]:
+                        in_q[v] = True
+                        q.append(v)
+        cyc = self._find_cycle(pred)
+        if cyc is not None:  # pragma: no cover  （收敛后前驱图无环）
+            return None, self._constraints(cyc)
+        z = d[0]
+        return {name: d[i] - z for i, name in enumerate(self.names) if i}, None
+
+    def _constraints(self, edges: List[int]) -> List[Constraint]:
+        names = self.names
+        return [(names[self._dst[e]], names[self._src[e]], self._w[e], self._label[e]) for e in edges]
+
+
+def encode_difference(ir: StrategyIR, only: Optional[Set[str]] = None,
+                      boundary: Optional[Dict[str, int]] = None) -> DifferenceSystem:
+    """
+    与 encoder.encode 的静态编码逐条对应（取值同样按 int 截断）。
+    only / boundary：只编码 only 中的路段；与区域外相邻路段的平滑约束按 boundary 中的
+    固定取值折算为上下界（局部修复用，见 incremental.resolve_smt）。
+    """
+    g = ir.guardrails
+    lo, hi, md = int(g.min_vsl), int(g.max_vsl), int(g.max_delta)
+    ds = DifferenceSystem()
+    segs: Dict[str, None] = {}
+
+    def bounds(seg: str) -> None:
+        segs[seg] = None
+        ds.upper(seg, hi, "guardrail:max_vsl")
+        ds.lower(seg, lo, "guardrail:min_vsl")
+
+    for seg in ir.scope.segments:
+        if seg not in segs and (only is None or seg in only):
+            bounds(seg)
+    for i, seg, value, _ in iter_vsl(ir.actions):
+        if only is not None and seg not in only:
+            continue
+        if seg not in segs:
+            bounds(seg)
+        ds.upper(seg, int(value), f"action:{i}")
+        ds.lower(seg, int(value), f"action:{i}")
+    topo = get_topology()
+    for a, b in topo.edges_among(segs):
+        ds.add(a, b, md, "guardrail:max_delta")
+        ds.add(b, a, md, "guardrail:max_delta")
+    if boundary:
+        for seg in segs:
+            for nb in topo.neighbors(seg):
+                v = boundary.get(nb)
+                if v is not None and nb not in segs:
+                    ds.upper(seg, v + md, "guardrail:max_delta")
+                    ds.lower(seg, v - md, "guardrail:max_delta")
+    return ds
+
+
+def _describe(c: Constraint) -> str:
+    x, y, k, _ = c
+    if y == ZERO:
+        return f"vsl({x}) <= {k}"
+    if x == ZERO:
+        return f"vsl({y}) >= {-k}"
+    return f"vsl({x}) - vsl({y}) <= {k}"
+
+
+def solve_difference(ir: StrategyIR, init: Optional[Dict[str, int]] = None,
+                     changed: Iterable[str] = (), core_budget_ms: float = CORE_BUDGET_MS) -> Dict[str, Any]:
+    """
+    返回 {"status": "sat", "reasons": [], "model": {路段: 限速}} 或
+    {"status": "unsat", "reasons": [], "core": {actions, guardrails, minimal, minimize_ms, cycle}}，
+    core 与 encoder.solve_static 的格式一致，cycle 为负环上约束的可读形式。
+    init / changed：上一版本的可行解与有变化的路段，用于热启动（见 DifferenceSystem.solve）。
+    core_budget_ms：core 最小化的时间预算，超出时 core.minimal=False（与 encoder.solve_static 一致）。
+    """
+    ds = encode_difference(ir)
+    model, cycle = ds.solve(init, changed)
+    if model is not None:
+        return {"status": "sat", "reasons": [], "model": model}
+    t0 = perf_counter()
+    cycle, labels, minimal = minimize_labels(ds, cycle, core_budget_ms)
+    core = {
+        "actions": sorted(int(n.split(":", 1)[1]) for n in labels if n.startswith("action:")),
+        "guardrails": sorted(n.split(":", 1)[1] for n in labels if n.startswith("guardrail:")),
+        "minimal": minimal,
+        "minimize_ms": (perf_counter() - t0) * 1000.0,
+        "cycle": [_describe(c) for c in cycle],
+    }
+    return {"status": "unsat", "reasons": [], "core": core}
+
+
+def minimize_labels(ds: DifferenceSystem, cycle: List[Constraint],
+                    budget_ms: float = CORE_BUDGET_MS) -> Tuple[List[Constraint], List[str], bool]:
+    """
+    删除法：逐个去掉一个标签，子系统仍有负环则去掉（并换成新的更小的环）。
+    超出预算时返回当前（仍有负环的）环与标签，第三个返回值为 False。
+    """
+    deadline = perf_counter() + budget_ms / 1000.0
+    labels = sorted({c[3] for c in cycle})
+    i = 0
+    while i < len(labels):
+        if perf_counter() >= deadline:
+            return cycle, labels, False
+        trial = labels[:i] + labels[i + 1:]
+        _, sub_cycle = ds.subsystem(set(trial)).solve()
+        if sub_cycle is None:
+            i += 1  # 去掉它就可满足：属于最小冲突集
+        else:
+            cycle = sub_cycle
+            kept = {c[3] for c in sub_cycle}
+            labels = [lab for lab in trial if lab in kept]
+    return cycle, labels, True
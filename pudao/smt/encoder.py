@@ -1,47 +1,285 @@
-from typing import Dict
-from z3 import Solver, Int, And, Abs, sat
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+from z3 import Solver, Int, Bool, BoolRef, BoolVal, And, Abs, If, Implies, Sum, sat, unsat
+from pudao.dsl.columnar import iter_vsl
 from pudao.dsl.models import StrategyIR
+from pudao.evidence.trace import record_solver, span
+from pudao.topology.index import get_topology
+from pudao.smt import temporal
+from pudao.smt import budget as budget_mod
+from pudao.smt.budget import CORE_BUDGET_MS, SOLVER_CONFIG, SolverBudget, new_solver
+from pudao.smt.violations import Violation
+from pudao.smt.versions import ENCODER_VERSION  # noqa: F401  (re-export)
 
 
-def build_solver(ir: StrategyIR) -> Solver:
-    s = Solver()
+def encode(ir: StrategyIR, track: bool = False,
+           config: str = SOLVER_CONFIG) -> Tuple[Solver, Dict[str, BoolRef]]:
+    """
+    编码为 Z3 约束。track=True 时每条动作与每个护栏挂在一个命名假设上
+    （action:<下标> / guardrail:<字段名>），返回 (solver, {名字: 假设文字})，
+    以便 check(*假设) 之后从 unsat core 还原出冲突的动作与护栏。
+    config: 求解器配置名（见 pudao.smt.budget.SOLVER_CONFIGS）。
+    """
+    s = new_solver(config)
     g = ir.guardrails
+    lits: Dict[str, BoolRef] = {}
+
+    def add(cond, name: str) -> None:
+        if not track:
+            s.add(cond)
+            return
+        lit = lits.get(name)
+        if lit is None:
+            lit = lits[name] = Bool(name)
+        s.add(Implies(lit, cond))
+
+    def bounds(v) -> None:
+        add(v >= int(g.min_vsl), "guardrail:min_vsl")
+        add(v <= int(g.max_vsl), "guardrail:max_vsl")
 
     # 为 scope 内所有 segments 设置 vsl 变量（如果有 vsl 动作则约束等于该值）
     vsl_vars: Dict[str, Int] = {}
 
     for seg in ir.scope.segments:
         v = Int(f"vsl_{seg}")
-        s.add(v >= int(g.min_vsl), v <= int(g.max_vsl))
+        bounds(v)
         vsl_vars[seg] = v
 
-    for act in ir.actions:
-        if act.type == "vsl" and act.segment_id and act.value is not None:
-            seg = act.segment_id
-            if seg not in vsl_vars:
-                vsl_vars[seg] = Int(f"vsl_{seg}")
-                s.add(vsl_vars[seg] >= int(g.min_vsl), vsl_vars[seg] <= int(g.max_vsl))
-            s.add(vsl_vars[seg] == int(act.value))
-
-    # 示例：添加空间平滑约束（与 invariants 一致）
-    neighbors = {
-        "cd-se-101": ["cd-se-102"],
-        "cd-se-102": ["cd-se-101", "cd-se-103"],
-        "cd-se-103": ["cd-se-102", "cd-se-104"],
-        "cd-se-104": ["cd-se-103"],
-    }
-    for seg, v in vsl_vars.items():
-        if seg in neighbors:
-            for nb in neighbors[seg]:
-                if nb in vsl_vars:
-                    s.add(Abs(v - vsl_vars[nb]) <= int(g.max_delta))
+    for i, seg, value, _ in iter_vsl(ir.actions):
+        if seg not in vsl_vars:
+            vsl_vars[seg] = Int(f"vsl_{seg}")
+            bounds(vsl_vars[seg])
+        add(vsl_vars[seg] == int(value), f"action:{i}")
+
+    # 空间平滑约束（与 invariants 共用拓扑索引；每条无向边只加一次）
+    topo = get_topology()
+    for a, b in topo.edges_among(vsl_vars):
+        add(Abs(vsl_vars[a] - vsl_vars[b]) <= int(g.max_delta), "guardrail:max_delta")
 
-    return s
+    return s, lits
 
 
-def solve(ir: StrategyIR) -> str:
+def build_solver(ir: StrategyIR) -> Solver:
+    return encode(ir)[0]
+
+
+def solve(ir: StrategyIR, budget: Optional[SolverBudget] = None) -> str:
     s = build_solver(ir)
-    res = s.check()
+    with SolverBudget.coerce(budget).running() as budget:
+        budget.apply(s)
+        res = s.check()
+    record_solver("solve", s)
     if res == sat:
         return "sat"
-    return "unsat"
+    if res == unsat:
+        return "unsat"
+    return "unknown"  # 超时 / 超出 rlimit / 内存
+
+
+def minimize_core(s: Solver, core: List[BoolRef],
+                  budget_ms: float = CORE_BUDGET_MS,
+                  rlimit: Optional[int] = None) -> Tuple[List[BoolRef], bool]:
+    """
+    删除法最小化：逐个尝试去掉一个假设，仍 unsat 则去掉（并用新 core 进一步收缩）。
+    超出预算时返回当前（仍为 unsat 的）core，第二个返回值为 False。
+    """
+    deadline = perf_counter() + budget_ms / 1000.0
+    if rlimit:
+        s.set("rlimit", int(rlimit))
+    core = list(core)
+    i = 0
+    while i < len(core):
+        remaining_ms = (deadline - perf_counter()) * 1000.0
+        if remaining_ms <= 0:
+            return core, False
+        s.set("timeout", max(1, int(remaining_ms)))
+        trial = core[:i] + core[i + 1:]
+        r = s.check(*trial)
+        if r == unsat:
+            kept = {str(c) for c in s.unsat_core()}
+            core = [c for c in trial if str(c) in kept]
+        elif r == sat:
+            i += 1  # 去掉它就可满足：属于最小冲突集
+        else:
+            return core, False
+    return core, True
+
+
+def _core_payload(names: List[str], minimal: bool, ms: float) -> Dict[str, Any]:
+    return {
+        "actions": sorted(int(n.split(":", 1)[1]) for n in names if n.startswith("action:")),
+        "guardrails": sorted(n.split(":", 1)[1] for n in names if n.startswith("guardrail:")),
+        "minimal": minimal,
+        "minimize_ms": ms,
+    }
+
+
+def _unknown(s: Solver) -> Dict[str, Any]:
+    return {"status": "unknown", "reasons": [], "reason_unknown": s.reason_unknown() or "unknown"}
+
+
+def solve_static(ir: StrategyIR, core_budget_ms: float = CORE_BUDGET_MS,
+                 config: str = SOLVER_CONFIG,
+                 budget: Optional[SolverBudget] = None) -> Dict[str, Any]:
+    """单一快照求解；unsat 时在同一个 solver 会话里提取并最小化 core。"""
+    with SolverBudget.coerce(budget).running() as budget:
+        return _solve_static(ir, core_budget_ms, config, budget)
+
+
+def _solve_static(ir: StrategyIR, core_budget_ms: float, config: str,
+                  budget: SolverBudget) -> Dict[str, Any]:
+    with span("encode"):
+        s, lits = encode(ir, track=True, config=config)
+    budget.apply(s)
+    with span("z3_check"):
+        r = s.check(*lits.values())
+    record_solver("z3_check", s)
+    if r == sat:
+        return {"status": "sat", "reasons": []}
+    if r != unsat:
+        return _unknown(s)
+    # 最小化不超过剩余的整体预算
+    remaining = budget.remaining_ms()
+    if remaining is not None:
+        core_budget_ms = min(core_budget_ms, remaining)
+    with span("core_minimize") as sp:
+        core, minimal = minimize_core(s, list(s.unsat_core()), core_budget_ms, budget.rlimit)
+    record_solver("core_minimize", s)  # 同一 solver 的累计统计（含 z3_check）
+    return {"status": "unsat", "reasons": [],
+            "core": _core_payload([str(c) for c in core], minimal, sp.ms)}
+
+
+def solve_temporal(ir: StrategyIR,
+                   horizon_s: float = temporal.HORIZON_S,
+                   step_s: float = temporal.STEP_S,
+                   config: str = SOLVER_CONFIG,
+                   budget: Optional[SolverBudget] = None) -> Dict[str, Any]:
+    """
+    有界展开：在 [0, horizon_s) 上按 step_s 逐步添加各路段的限速变量，约束
+    - 每步取值在 [min_vsl, max_vsl]，处于 vsl 时段内的路段取该时段的值；
+    - 每步相邻路段 |ΔV| <= max_delta；
+    - 任一 5 分钟窗口内同一路段的变化次数 <= max_changes_per_5min（为 0/空时不限制）。
+    增量求解：同一个 Solver 逐步追加约束，只在时段开始/结束的步及最后一步 check，
+    已有约束与学到的子句在各检查点之间复用。返回 {"status", "reasons", "reason_unknown"?}；
+    各检查点共享同一预算截止时间。
+    """
+    with SolverBudget.coerce(budget).running() as budget:
+        return _solve_temporal(ir, horizon_s, step_s, config, budget)
+
+
+def _solve_temporal(ir: StrategyIR, horizon_s: float, step_s: float, config: str,
+                    budget: SolverBudget) -> Dict[str, Any]:
+    g = ir.guardrails
+    lo, hi, md = int(g.min_vsl), int(g.max_vsl), int(g.max_delta)
+    limit = g.max_changes_per_5min or 0
+    sched = temporal.vsl_schedule(ir)
+    segs = list(dict.fromkeys([*ir.scope.segments, *sched]))
+    edges = list(get_topology().edges_among(segs))
+    n = temporal.steps(horizon_s, step_s)
+    w = temporal.window_steps(step_s)
+    checkpoints = set(temporal.event_steps(sched, n, step_s))
+    checkpoints.add(n - 1)
+
+    s = new_solver(config)
+    # 命名约束（assert_and_track）-> (原因, 步)，unsat 时由 core 还原为可读原因
+    tracked: Dict[str, Tuple[Violation, int]] = {}
+
+    def _track(label: str, cond, reason: Violation, k: int) -> None:
+        s.assert_and_track(cond, Bool(label))
+        tracked[label] = (reason, k)
+
+    # 处于时段内的路段取 Python 常量，两端都是常量的约束在 Python 侧直接求值，
+    # 只有默认控制下的路段才引入 z3 变量
+    changes: Dict[str, list] = {seg: [] for seg in segs}
+    prev: Dict[str, object] = {}
+
+    for k in range(n):
+        t = k * step_s
+        cur: Dict[str, object] = {}
+        for seg in segs:
+            fixed = temporal.value_at(sched.get(seg, []), t)
+            if fixed is not None:
+                v = int(fixed)
+            else:
+                v = Int(f"vsl_{seg}@{k}")
+                s.add(v >= lo, v <= hi)
+            cur[seg] = v
+            if not limit or seg not in prev:
+                continue
+            p = prev[seg]
+            ch = changes[seg]
+            ch.append(int(v != p) if isinstance(v, int) and isinstance(p, int) else If(v != p, 1, 0))
+            if len(ch) <= limit:
+                continue
+            window = ch[-w:]
+            const = sum(c for c in window if isinstance(c, int))
+            terms = [c for c in window if not isinstance(c, int)]
+            if const <= limit and not terms:
+                continue
+            cond = Sum(terms) <= limit - const if terms and const <= limit else BoolVal(False)
+            _track(f"rate:{seg}@{k}", cond,
+                   Violation("temporal_stability_violated",
+                             f"vsl({seg}) changes more than {limit} times within 5min (t={t:g}s)",
+                             targets=(("segment", seg),), limit=limit), k)
+        for a, b in edges:
+            va, vb = cur[a], cur[b]
+            if isinstance(va, int) and isinstance(vb, int):
+                if abs(va - vb) <= md:
+                    continue
+                cond = BoolVal(False)
+            elif isinstance(vb, int):
+                cond = And(va >= vb - md, va <= vb + md)
+            elif isinstance(va, int):
+                cond = And(vb >= va - md, vb <= va + md)
+            else:
+                cond = Abs(va - vb) <= md
+            _track(f"smooth:{a}|{b}@{k}", cond,
+                   Violation("spatial_smoothness_violated", f"|vsl({a})-vsl({b})| > {g.max_delta} at t={t:g}s",
+                             targets=(("segment", a), ("segment", b)), limit=g.max_delta), k)
+        prev = cur
+
+        if k not in checkpoints:
+            continue
+        if budget.expired():
+            return {"status": "unknown", "reasons": [], "reason_unknown": "timeout"}
+        budget.apply(s)
+        r = s.check()
+        record_solver("z3_temporal", s)
+        if r == unsat:
+            core = sorted((tracked[str(c)] for c in s.unsat_core() if str(c) in tracked),
+                          key=lambda x: x[1])
+            return {"status": "unsat", "reasons": list(dict.fromkeys(r for r, _ in core))}
+        if r != sat:
+            return _unknown(s)
+    return {"status": "sat", "reasons": []}
+
+
+def uses_z3(ir: StrategyIR, engine: Optional[str] = None) -> bool:
+    """该策略是否交给 Z3：随时间变化，或引擎为 z3；否则由差分约束求解器判定（不涉及求解器配置与预算）。"""
+    return (engine or budget_mod.SMT_ENGINE) != "auto" or temporal.is_time_varying(ir)
+
+
+def solve_detailed(ir: StrategyIR, config: str = SOLVER_CONFIG,
+                   budget: Optional[SolverBudget] = None, engine: Optional[str] = None) -> Dict[str, Any]:
+    """
+    返回 {"status", "reasons", "core"?, "model"?, "reason_unknown"?, "solver"}：
+    随时间变化的策略走 Z3 有界展开（reasons 来自命名约束）；静态策略只含差分约束，
+    默认由差分约束求解器判定（sat 给出 model，unsat 给出负环对应的最小 core），
+    engine（默认 PFSB_SMT_ENGINE）为 z3 时走 Z3 单一快照。solver.engine 记录实际使用的引擎；
+    config 与预算只作用于 Z3（差分约束求解不导入 z3、不设置进程级参数）。
+    """
+    budget = SolverBudget.coerce(budget)
+    if not uses_z3(ir, engine):
+        from pudao.smt.difference import solve_difference
+        with span("difference"):
+            out = solve_difference(ir)
+        out["solver"] = {"engine": "difference", "budget": budget.to_dict()}
+        return out
+    with budget.running():
+        if temporal.is_time_varying(ir):
+            with span("z3_temporal"):
+                out = solve_temporal(ir, config=config, budget=budget)
+        else:
+            out = solve_static(ir, config=config, budget=budget)
+    out["solver"] = {"engine": "z3", "config": config, "budget": budget.to_dict()}
+    return out
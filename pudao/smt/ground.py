@@ -0,0 +1,40 @@
+# pudao/smt/ground.py
+"""全定值（ground）策略的 Python 侧求值，与 encoder.encode 的静态编码逐条对应。
+
+当策略不随时间变化、且编码中出现的每个路段都有确定的 vsl 取值时，
+Z3 问题只剩整数常量运算：取值唯一、在 [min_vsl, max_vsl] 内、相邻差 <= max_delta。
+这里直接在 Python 中求值（同样按 int 截断），不需要 z3。
+"""
+from typing import Dict, Optional
+
+from pudao.dsl.columnar import iter_vsl
+from pudao.dsl.models import StrategyIR
+from pudao.smt.temporal import is_time_varying
+from pudao.topology.index import get_topology
+
+
+def ground_status(ir: StrategyIR) -> Optional[str]:
+    """全定值时返回 "sat" / "unsat"（即 Z3 会给出的结论）；存在自由变量或随时间变化时返回 None。"""
+    if is_time_varying(ir):
+        return None
+    fixed: Dict[str, int] = {}
+    conflict = False
+    for _, seg, value, _ in iter_vsl(ir.actions):
+        v = int(value)
+        if fixed.setdefault(seg, v) != v:
+            conflict = True  # 同一变量等于两个不同常量
+    for seg in ir.scope.segments:
+        if seg not in fixed:
+            return None  # 有路段交给求解器取值
+    if conflict:
+        return "unsat"
+
+    g = ir.guardrails
+    lo, hi, md = int(g.min_vsl), int(g.max_vsl), int(g.max_delta)
+    for v in fixed.values():
+        if v < lo or v > hi:
+            return "unsat"
+    for a, b in get_topology().edges_among(fixed):
+        if abs(fixed[a] - fixed[b]) > md:
+            return "unsat"
+    return "sat"
@@ -0,0 +1,219 @@
+# pudao/smt/incremental.py
+"""策略修订的增量复核。
+
+同一 strategy_id 的新版本与上一次校验过的版本做动作级 diff（按动作内容的多重集合比较），
+得到受影响的路段 / 匝道 / VMS：
+- 局部规则（I2/I3/I4/I6，见 invariants.register_rule(local=True)）只在受影响路段及其拓扑邻居、
+  受影响匝道与 VMS 的动作子集上重跑：新原因 = 旧原因 - 旧版本子集上的原因 + 新版本子集上的原因；
+- 全局规则（I5 与站点插件）在新 IR 上完整重跑；
+- SMT：VSL 约束未变化时复用上一版本的可满足结论；否则以上一版本的可行解为边界，
+  只在受影响路段周围的邻域上热启动差分约束求解器（见 resolve_smt）。
+护栏、回滚参数变化，或任一版本随时间变化时不做增量（diff_ir 返回 None），走完整校验。
+同一规则内原因的先后顺序可能与完整校验不同，内容（多重集合）一致。
+"""
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pudao.dsl.columnar import action_keys
+from pudao.dsl.models import Action, StrategyIR
+from pudao.smt.invariants import is_local_rule, registered_rules, run_all_invariants
+from pudao.smt.temporal import is_time_varying
+from pudao.smt.violations import Violation
+from pudao.topology.index import get_topology
+
+
+class Delta:
+    """动作级 diff：受影响的路段 / 匝道 / VMS，以及增删的动作数。"""
+    __slots__ = ("segments", "ramps", "vms", "added", "removed")
+
+    def __init__(self):
+        self.segments: Set[str] = set()
+        self.ramps: Set[str] = set()
+        self.vms: Set[str] = set()
+        self.added = 0
+        self.removed = 0
+
+    def touch(self, act: Action) -> None:
+        if act.type == "vsl":
+            if act.segment_id:
+                self.segments.add(act.segment_id)
+        elif act.type in ("ramp_metering", "ramp_closure"):
+            if act.ramp_id:
+                self.ramps.add(act.ramp_id)
+        elif act.type == "vms_message":
+            if act.vms_id:
+                self.vms.add(act.vms_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "actions_added": self.added,
+            "actions_removed": self.removed,
+            "segments": sorted(self.segments),
+            "ramps": sorted(self.ramps),
+            "vms": sorted(self.vms),
+        }
+
+
+def _keyed(actions: List[Action], by_key: Dict[tuple, Action]) -> List[tuple]:
+    # 动作内容作为键（字段值元组；pydantic 与列式 IR 的键相同），同时记下键 -> 动作
+    keys = action_keys(actions)
+    for k, a in zip(keys, actions):
+        by_key[k] = a
+    return keys
+
+
+def diff_ir(old: StrategyIR, new: StrategyIR) -> Optional[Delta]:
+    """可增量复核时返回 Delta；护栏/回滚变化或涉及时序展开时返回 None。"""
+    if old.guardrails != new.guardrails or old.rollout != new.rollout:
+        return None
+    if is_time_varying(old) or is_time_varying(new):
+        return None
+    delta = Delta()
+    old_acts = {}
+    new_acts = {}
+    old_keys = Counter(_keyed(old.actions, old_acts))
+    new_keys = Counter(_keyed(new.actions, new_acts))
+    for k, c in (old_keys - new_keys).items():
+        delta.removed += c
+        delta.touch(old_acts[k])
+    for k, c in (new_keys - old_keys).items():
+        delta.added += c
+        delta.touch(new_acts[k])
+    # scope 中增删的路段也会改变编码（护栏约束与相邻平滑约束）
+    delta.segments.update(set(old.scope.segments) ^ set(new.scope.segments))
+    return delta
+
+
+def neighbourhood(segments: Iterable[str]) -> Set[str]:
+    topo = get_topology()
+    out = set(segments)
+    for seg in list(out):
+        out.update(topo.neighbors(seg))
+    return out
+
+
+def _restrict(ir: StrategyIR, segs: Set[str], ramps: Set[str], vms: Set[str]) -> StrategyIR:
+    keep: List[Action] = []
+    for a in ir.actions:
+        if a.type == "vsl":
+            hit = a.segment_id in segs
+        elif a.type in ("ramp_metering", "ramp_closure"):
+            hit = a.ramp_id in ramps
+        elif a.type == "vms_message":
+            hit = a.vms_id in vms
+        else:
+            hit = False
+        if hit:
+            keep.append(a)
+    return ir.copy(update={"actions": keep})
+
+
+def _subtract(prior: List[Violation], old: List[Violation], new: List[Violation]) -> List[Violation]:
+    drop = Counter(old)
+    out = []
+    for r in prior:
+        if drop[r] > 0:
+            drop[r] -= 1
+            continue
+        out.append(r)
+    return out + list(new)
+
+
+def recheck_rules(ir: StrategyIR, prior_ir: StrategyIR, prior_rules: Dict[str, List[Violation]],
+                  delta: Delta, timings: Optional[Dict[str, float]] = None
+                  ) -> Tuple[Dict[str, List[Violation]], Dict[str, Any]]:
+    """返回 (rule_id -> 原因, 复核信息 {neighbourhood, rules_rechecked, rules_rerun, rules_reused})。"""
+    rules = registered_rules()
+    local = [r for r in rules if is_local_rule(r) and r in prior_rules]
+    full = set(rules) - set(local)
+
+    by_rule: Dict[str, List[Violation]] = {}
+    run_all_invariants(ir, timings=timings, by_rule=by_rule, rule_ids=full)
+
+    segs = neighbourhood(delta.segments)
+    reused: List[str] = []
+    rechecked: List[str] = []
+    if delta.segments or delta.ramps or delta.vms:
+        old_sub: Dict[str, List[Violation]] = {}
+        new_sub: Dict[str, List[Violation]] = {}
+        run_all_invariants(_restrict(prior_ir, segs, delta.ramps, delta.vms),
+                           by_rule=old_sub, rule_ids=set(local))
+        run_all_invariants(_restrict(ir, segs, delta.ramps, delta.vms),
+                           by_rule=new_sub, rule_ids=set(local))
+        for r in local:
+            by_rule[r] = _subtract(prior_rules[r], old_sub[r], new_sub[r])
+        rechecked = local
+    else:
+        for r in local:
+            by_rule[r] = list(prior_rules[r])
+        reused = local
+
+    ordered = {r: by_rule[r] for r in rules if r in by_rule}
+    info = {
+        "neighbourhood_segments": len(segs),
+        "rules_rechecked": rechecked,
+        "rules_rerun": [r for r in rules if r in full],
+        "rules_reused": reused,
+    }
+    return ordered, info
+
+
+def _vsl_segments(ir: StrategyIR) -> Set[str]:
+    segs = set(ir.scope.segments)
+    for a in ir.actions:
+        if a.type == "vsl" and a.segment_id and a.value is not None:
+            segs.add(a.segment_id)
+    return segs
+
+
+def resolve_smt(ir: StrategyIR, prior_smt: Optional[Dict[str, Any]], delta: Delta) -> Optional[Dict[str, Any]]:
+    """
+    增量 SMT：VSL 约束未变且上一版本可满足时直接复用；否则做局部修复：
+    以受影响路段为中心、半径逐次翻倍的邻域，区域外路段固定为上一版本的取值
+    （相邻平滑约束折算为边界上下界），在区域子系统上热启动求解。
+    子系统可满足即整体可满足（合并后的取值满足全部约束）；不可满足时扩大区域，
+    区域超过全部路段的一半时改为完整求解（此时 unsat 与冲突集是精确的）。
+    无法增量时返回 None（由调用方完整求解）。返回值与 encoder.solve_detailed 同格式，
+    solver.incremental 为 "reused" / "warm" / "full"。
+    """
+    if not prior_smt or prior_smt.get("status") != "sat" or prior_smt.get("model") is None:
+        return None
+    if not delta.segments:
+        return {"status": "sat", "reasons": [], "model": prior_smt["model"],
+                "solver": {"engine": "difference", "incremental": "reused"}}
+    from pudao.smt.difference import encode_difference
+    model: Dict[str, int] = prior_smt["model"]
+    segs = _vsl_segments(ir)
+    topo = get_topology()
+    region = set(delta.segments) & segs
+    frontier = set(region)
+    radius = 1
+    while 2 * len(region) < len(segs):
+        for _ in range(radius):  # 再向外扩 radius 跳
+            nxt = {nb for s in frontier for nb in topo.neighbors(s) if nb in segs and nb not in region}
+            region |= nxt
+            frontier = nxt
+        boundary: Dict[str, int] = {}
+        for s in region:
+            for nb in topo.neighbors(s):
+                if nb in segs and nb not in region:
+                    if nb not in model:  # 上一版本没有取值，无法固定
+                        return _full(ir)
+                    boundary[nb] = model[nb]
+        sub, _ = encode_difference(ir, only=region, boundary=boundary).solve(init=model, changed=delta.segments)
+        if sub is not None:
+            merged = {s: v for s, v in model.items() if s in segs}
+            merged.update(sub)
+            return {"status": "sat", "reasons": [], "model": merged,
+                    "solver": {"engine": "difference", "incremental": "warm", "region_segments": len(region)}}
+        if not frontier:
+            break  # 连通分量已全部纳入
+        radius *= 2
+    return _full(ir)
+
+
+def _full(ir: StrategyIR) -> Dict[str, Any]:
+    from pudao.smt.difference import solve_difference
+    out = solve_difference(ir)
+    out["solver"] = {"engine": "difference", "incremental": "full"}
+    return out
@@ -1,249 +1,325 @@
-from typing import List, Tuple, Dict, Set
+import os
+from importlib import import_module
+from typing import Callable, List, Tuple, Dict, Set, Optional
+from pudao.dsl.columnar import RAMP_CLOSURE, RAMP_METERING, TYPES, VMS_MESSAGE, VSL, ActionTable, duration_at
 from pudao.dsl.models import StrategyIR, Action
-
-
-def check_spatial_smoothness(ir: StrategyIR) -> List[str]:
-    # I2: 相邻限速差 — MVP: 只对示例手动定义邻接
-    neighbors = {
-        "cd-se-101": ["cd-se-102"],
-        "cd-se-102": ["cd-se-101", "cd-se-103"],
-        "cd-se-103": ["cd-se-102", "cd-se-104"],
-        "cd-se-104": ["cd-se-103"],
-    }
-    vsl_map: Dict[str, float] = {}
-    for act in ir.actions:
-        if act.type == "vsl" and act.segment_id and act.value is not None:
-            vsl_map[act.segment_id] = act.value
-
-    errs: List[str] = []
+from pudao.evidence.trace import span
+from pudao.topology.index import get_topology
+from pudao.smt.versions import INVARIANTS_VERSION  # noqa: F401  (re-export)
+from pudao.smt.temporal import is_time_varying, vsl_schedule
+from pudao.smt.violations import Violation, as_violations
+
+# 站点自定义规则模块（逗号分隔），首次运行时导入，模块内用 @register_rule 注册
+INVARIANT_PLUGINS = os.getenv("PFSB_INVARIANT_PLUGINS", "")
+
+
+class ActionIndex:
+    """
+    单次遍历 ir.actions 建立的共享索引，所有规则复用，避免每条规则各扫一遍。
+    - vsl_seq:    [(action_idx, segment_id, value)]，按出现顺序（value 非空）
+    - vsl_map:    segment_id -> 最后一次的 vsl 值
+    - ramp_modes: ramp_id -> {ramp_metering, ramp_closure}
+    - vms_counts: vms_id -> 消息条数
+    - closures:   [(action_idx, action)]，全部 ramp_closure
+    - by_type:    type -> [action_idx]
+    列式动作表（pudao.dsl.columnar.ActionTable）直接按列遍历，不生成行对象。
+    """
+    __slots__ = ("vsl_seq", "vsl_map", "ramp_modes", "vms_counts", "closures", "by_type")
+
+    def __init__(self, actions: List[Action]):
+        if isinstance(actions, ActionTable):
+            self._from_table(actions)
+            return
+        vsl_seq: List[Tuple[int, Optional[str], float]] = []
+        vsl_map: Dict[str, float] = {}
+        ramp_modes: Dict[str, Set[str]] = {}
+        vms_counts: Dict[str, int] = {}
+        closures: List[Tuple[int, Action]] = []
+        by_type: Dict[str, List[int]] = {}
+
+        for i, act in enumerate(actions):
+            t = act.type
+            by_type.setdefault(t, []).append(i)
+            if t == "vsl":
+                v = act.value
+                if v is not None:
+                    seg = act.segment_id
+                    vsl_seq.append((i, seg, v))
+                    if seg:
+                        vsl_map[seg] = v
+            elif t == "ramp_metering" or t == "ramp_closure":
+                rid = act.ramp_id
+                if rid:
+                    ramp_modes.setdefault(rid, set()).add(t)
+                if t == "ramp_closure":
+                    closures.append((i, act))
+            elif t == "vms_message":
+                vid = act.vms_id
+                if vid:
+                    vms_counts[vid] = vms_counts.get(vid, 0) + 1
+
+        self.vsl_seq = vsl_seq
+        self.vsl_map = vsl_map
+        self.ramp_modes = ramp_modes
+        self.vms_counts = vms_counts
+        self.closures = closures
+        self.by_type = by_type
+
+    def _from_table(self, t: ActionTable) -> None:
+        vsl_seq: List[Tuple[int, Optional[str], float]] = []
+        vsl_map: Dict[str, float] = {}
+        ramp_modes: Dict[str, Set[str]] = {}
+        vms_counts: Dict[str, int] = {}
+        closures: List[Tuple[int, Action]] = []
+        by_code: List[List[int]] = [[] for _ in TYPES]
+        targets, tgt, val = t.targets, t.target, t.value
+
+        for i, code in enumerate(t.type_code):
+            by_code[code].append(i)
+            if code == VSL:
+                v = val[i]
+                if v == v:  # 非 NaN
+                    seg = targets[tgt[i]][1]
+                    vsl_seq.append((i, seg, v))
+                    vsl_map[seg] = v
+            elif code == RAMP_METERING or code == RAMP_CLOSURE:
+                ramp_modes.setdefault(targets[tgt[i]][1], set()).add(TYPES[code])
+                if code == RAMP_CLOSURE:
+                    closures.append((i, t[i]))
+            elif code == VMS_MESSAGE:
+                vid = targets[tgt[i]][1]
+                vms_counts[vid] = vms_counts.get(vid, 0) + 1
+
+        self.vsl_seq = vsl_seq
+        self.vsl_map = vsl_map
+        self.ramp_modes = ramp_modes
+        self.vms_counts = vms_counts
+        self.closures = closures
+        self.by_type = {TYPES[c]: idx for c, idx in enumerate(by_code) if idx}
+
+
+Rule = Callable[[StrategyIR, ActionIndex], List[Violation]]
+
+# 有序规则表：(rule_id, fn)；执行顺序即注册顺序
+_RULES: List[Tuple[str, Rule]] = []
+# 局部规则：每条原因只取决于某个路段（及其拓扑邻居）/ 匝道 / VMS 上的动作，
+# 增量复核时只需在受影响的邻域上重跑（见 pudao.smt.incremental）
+_LOCAL_RULES: Set[str] = set()
+_plugins_loaded = False
+
+
+def register_rule(rule_id: str, replace: bool = False, local: bool = False) -> Callable[[Rule], Rule]:
+    """
+    注册一条不变式规则：fn(ir, index) -> List[Violation]。
+    也可返回原因字符串，由 run_all_invariants 转为 Violation（code 取 ":" 前的前缀，
+    所属不变式查不到时记为 rule_id）。
+    同名规则默认报错；replace=True 时原位替换（保持执行顺序）。
+    local=True 声明规则是局部的（可只在受影响的邻域上重跑）；默认按全局规则处理。
+    """
+    def deco(fn: Rule) -> Rule:
+        if local:
+            _LOCAL_RULES.add(rule_id)
+        else:
+            _LOCAL_RULES.discard(rule_id)
+        for k, (rid, _) in enumerate(_RULES):
+            if rid == rule_id:
+                if not replace:
+                    raise ValueError(f"invariant rule already registered: {rule_id}")
+                _RULES[k] = (rule_id, fn)
+                return fn
+        _RULES.append((rule_id, fn))
+        return fn
+    return deco
+
+
+def is_local_rule(rule_id: str) -> bool:
+    return rule_id in _LOCAL_RULES
+
+
+def registered_rules() -> List[str]:
+    _load_plugins()
+    return [rid for rid, _ in _RULES]
+
+
+def _load_plugins() -> None:
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    for mod in filter(None, (m.strip() for m in INVARIANT_PLUGINS.split(","))):
+        import_module(mod)
+
+
+@register_rule("I2_spatial", local=True)
+def _rule_spatial(ir: StrategyIR, idx: ActionIndex) -> List[Violation]:
+    # I2: 相邻限速差 — 邻接来自共享拓扑索引，只遍历策略涉及路段的边
+    topo = get_topology()
+    vsl_map = idx.vsl_map
+    errs: List[Violation] = []
     max_delta = ir.guardrails.max_delta
+    if is_time_varying(ir):
+        return _spatial_over_time(ir, topo, max_delta)
     for seg, v in vsl_map.items():
-        if seg not in neighbors:
-            continue
-        for nb in neighbors[seg]:
+        for nb in topo.neighbors(seg):
             if nb in vsl_map:
-                dv = abs(vsl_map[seg] - vsl_map[nb])
+                dv = abs(v - vsl_map[nb])
                 if dv > max_delta:
-                    errs.append(
-                        f"spatial_smoothness_violated: |vsl({seg})-vsl({nb})|={dv} > {max_delta}"
-                    )
+                    errs.append(_smoothness(seg, nb, dv, max_delta))
     return errs
 
 
-def check_safety_bounds(ir: StrategyIR) -> List[str]:
-    # I4: min/max, no zero-speed hack
-    errs: List[str] = []
-    g = ir.guardrails
-    for act in ir.actions:
-        if act.type == "vsl" and act.value is not None:
-            if act.value < g.min_vsl or act.value > g.max_vsl:
-                errs.append(
-                    f"safety_bounds_violated: vsl({act.segment_id})={act.value} not in [{g.min_vsl},{g.max_vsl}]"
-                )
-            if act.value == 0:
-                errs.append(
-                    f"safety_bounds_violated: vsl({act.segment_id})=0 not allowed (use ramp_closure)"
-                )
+def _smoothness(seg: str, nb: str, dv: float, max_delta: float) -> Violation:
+    return Violation("spatial_smoothness_violated", f"|vsl({seg})-vsl({nb})|={dv} > {max_delta}",
+                     targets=(("segment", seg), ("segment", nb)), measured=dv, limit=max_delta)
+
+
+def _spatial_over_time(ir: StrategyIR, topo, max_delta: float) -> List[Violation]:
+    # 带持续时间的策略：只比较在时间上重叠的相邻时段
+    sched = vsl_schedule(ir)
+    errs: List[Violation] = []
+    for seg, slots in sched.items():
+        for nb in topo.neighbors(seg):
+            for s1, e1, v1, _ in slots:
+                for s2, e2, v2, _ in sched.get(nb, ()):
+                    if (e2 is None or s1 < e2) and (e1 is None or s2 < e1):
+                        dv = abs(v1 - v2)
+                        if dv > max_delta:
+                            errs.append(_smoothness(seg, nb, dv, max_delta))
+    return list(dict.fromkeys(errs))
+
+
+@register_rule("I3_temporal", local=True)
+def _rule_temporal(ir: StrategyIR, idx: ActionIndex) -> List[Violation]:
+    # I3: 同一 segment 的前一条 VSL 未设持续时间（一直生效）时，后续不同取值视为冲突；
+    # 设了 ttl_s/max_duration_s 的按时间先后排队，变化频率由编码器的有界展开检查
+    errs: List[Violation] = []
+    seen: Dict[str, Tuple[float, bool]] = {}  # seg -> (值, 是否有限期)
+    for i, seg, v in idx.vsl_seq:
+        if not seg:
+            continue
+        prev = seen.get(seg)
+        if prev is not None and not prev[1]:
+            if prev[0] != v:
+                errs.append(Violation("temporal_stability_violated", f"multiple vsl values for {seg}",
+                                      targets=(("segment", seg),), measured=v, limit=prev[0]))
+            continue
+        seen[seg] = (v, duration_at(ir.actions, i) is not None)
     return errs
 
 
-def check_temporal_stability(ir: StrategyIR) -> List[str]:
-    # I3 (MVP): 同一 segment 多个 VSL 冲突视为不稳定
-    errs: List[str] = []
-    seen: Dict[str, float] = {}
-    for act in ir.actions:
-        if act.type == "vsl" and act.segment_id and act.value is not None:
-            if act.segment_id in seen and seen[act.segment_id] != act.value:
-                errs.append(
-                    f"temporal_stability_violated: multiple vsl values for {act.segment_id}"
-                )
-            else:
-                seen[act.segment_id] = act.value
+@register_rule("I4_safety", local=True)
+def _rule_safety(ir: StrategyIR, idx: ActionIndex) -> List[Violation]:
+    # I4: min/max, no zero-speed hack
+    errs: List[Violation] = []
+    g = ir.guardrails
+    lo, hi = g.min_vsl, g.max_vsl
+    for _, seg, v in idx.vsl_seq:
+        target = (("segment", seg),) if seg else ()
+        if v < lo or v > hi:
+            errs.append(Violation("safety_bounds_violated", f"vsl({seg})={v} not in [{lo},{hi}]",
+                                  targets=target, measured=v, limit=[lo, hi]))
+        if v == 0:
+            errs.append(Violation("safety_bounds_violated", f"vsl({seg})=0 not allowed (use ramp_closure)",
+                                  targets=target, measured=v))
     return errs
 
 
-def check_mutual_exclusion(ir: StrategyIR) -> List[str]:
+@register_rule("I6_conflict", local=True)
+def _rule_mutual_exclusion(ir: StrategyIR, idx: ActionIndex) -> List[Violation]:
     # I6: ramp_closure vs ramp_metering; multiple vms_message for same vms
-    errs: List[str] = []
-    ramp_modes: Dict[str, Set[str]] = {}
-    vms_msgs: Dict[str, int] = {}
-
-    for act in ir.actions:
-        if act.type in ("ramp_metering", "ramp_closure") and act.ramp_id:
-            ramp_modes.setdefault(act.ramp_id, set()).add(act.type)
-        if act.type == "vms_message" and act.vms_id:
-            vms_msgs[act.vms_id] = vms_msgs.get(act.vms_id, 0) + 1
-
-    for ramp_id, modes in ramp_modes.items():
+    errs: List[Violation] = []
+    for ramp_id, modes in idx.ramp_modes.items():
         if "ramp_metering" in modes and "ramp_closure" in modes:
-            errs.append(
-                f"mutually_exclusive_actions: ramp {ramp_id} metering+closure"
-            )
+            errs.append(Violation("mutually_exclusive_actions", f"ramp {ramp_id} metering+closure",
+                                  targets=(("ramp", ramp_id),)))
 
-    for vms_id, count in vms_msgs.items():
+    for vms_id, count in idx.vms_counts.items():
         if count > 1:
-            errs.append(
-                f"mutually_exclusive_actions: vms {vms_id} has {count} messages"
-            )
+            errs.append(Violation("mutually_exclusive_actions", f"vms {vms_id} has {count} messages",
+                                  targets=(("vms", vms_id),), measured=count, limit=1))
     return errs
 
 
-def check_rollback(ir: StrategyIR) -> List[str]:
+@register_rule("I5_rollback")
+def _rule_rollback(ir: StrategyIR, idx: ActionIndex) -> List[Violation]:
     # I5 + I7（部分）：高风险动作必须可回滚 / 有时间上限
-    errs: List[str] = []
-    has_closure = any(a.type == "ramp_closure" for a in ir.actions)
+    errs: List[Violation] = []
+    if not idx.closures:
+        return errs
     g = ir.guardrails
     ro = ir.rollout
 
-    if has_closure:
-        if ro.max_revert_time_s is None:
-            errs.append("rollback_missing_or_infinite: max_revert_time_s is required")
-        else:
-            if g.max_closure_s is not None and ro.max_revert_time_s > g.max_closure_s:
-                errs.append(
-                    f"rollback_missing_or_infinite: max_revert_time_s={ro.max_revert_time_s} > max_closure_s={g.max_closure_s}"
-                )
-
-        # 如果有 closure 动作但没有 max_duration_s，也提示
-        for a in ir.actions:
-            if a.type == "ramp_closure" and (a.max_duration_s is None):
-                errs.append(
-                    "flow_invariants_violated: ramp_closure missing max_duration_s"
-                )
+    if ro.max_revert_time_s is None:
+        errs.append(Violation("rollback_missing_or_infinite", "max_revert_time_s is required"))
+    else:
+        if g.max_closure_s is not None and ro.max_revert_time_s > g.max_closure_s:
+            errs.append(Violation(
+                "rollback_missing_or_infinite",
+                f"max_revert_time_s={ro.max_revert_time_s} > max_closure_s={g.max_closure_s}",
+                measured=ro.max_revert_time_s, limit=g.max_closure_s))
+
+    # 如果有 closure 动作但没有 max_duration_s，也提示
+    for _, a in idx.closures:
+        if a.max_duration_s is None:
+            errs.append(Violation("flow_invariants_violated", "ramp_closure missing max_duration_s",
+                                  targets=(("ramp", a.ramp_id),) if a.ramp_id else ()))
 
     return errs
 
 
-def run_all_invariants(ir: StrategyIR) -> List[str]:
-    errs: List[str] = []
-    errs.extend(check_spatial_smoothness(ir))
-    errs.extend(check_temporal_stability(ir))
-    errs.extend(check_safety_bounds(ir))
-    errs.extend(check_mutual_exclusion(ir))
-    errs.extend(check_rollback(ir))
-    return errs
+# ---- 兼容旧接口：单条规则独立调用 ----
 
-from typing import List, Tuple, Dict, Set
-from ..dsl.models import StrategyIR, Action
+def check_spatial_smoothness(ir: StrategyIR) -> List[Violation]:
+    return _rule_spatial(ir, ActionIndex(ir.actions))
 
 
-def check_spatial_smoothness(ir: StrategyIR) -> List[str]:
-    # I2: 相邻限速差 — MVP: 只对示例手动定义邻接
-    neighbors = {
-        "cd-se-101": ["cd-se-102"],
-        "cd-se-102": ["cd-se-101", "cd-se-103"],
-        "cd-se-103": ["cd-se-102", "cd-se-104"],
-        "cd-se-104": ["cd-se-103"],
-    }
-    vsl_map: Dict[str, float] = {}
-    for act in ir.actions:
-        if act.type == "vsl" and act.segment_id and act.value is not None:
-            vsl_map[act.segment_id] = act.value
+def check_safety_bounds(ir: StrategyIR) -> List[Violation]:
+    return _rule_safety(ir, ActionIndex(ir.actions))
 
-    errs: List[str] = []
-    max_delta = ir.guardrails.max_delta
-    for seg, v in vsl_map.items():
-        if seg not in neighbors:
-            continue
-        for nb in neighbors[seg]:
-            if nb in vsl_map:
-                dv = abs(vsl_map[seg] - vsl_map[nb])
-                if dv > max_delta:
-                    errs.append(
-                        f"spatial_smoothness_violated: |vsl({seg})-vsl({nb})|={dv} > {max_delta}"
-                    )
-    return errs
 
+def check_temporal_stability(ir: StrategyIR) -> List[Violation]:
+    return _rule_temporal(ir, ActionIndex(ir.actions))
 
-def check_safety_bounds(ir: StrategyIR) -> List[str]:
-    # I4: min/max, no zero-speed hack
-    errs: List[str] = []
-    g = ir.guardrails
-    for act in ir.actions:
-        if act.type == "vsl" and act.value is not None:
-            if act.value < g.min_vsl or act.value > g.max_vsl:
-                errs.append(
-                    f"safety_bounds_violated: vsl({act.segment_id})={act.value} not in [{g.min_vsl},{g.max_vsl}]"
-                )
-            if act.value == 0:
-                errs.append(
-                    f"safety_bounds_violated: vsl({act.segment_id})=0 not allowed (use ramp_closure)"
-                )
-    return errs
-
-
-def check_temporal_stability(ir: StrategyIR) -> List[str]:
-    # I3 (MVP): 同一 segment 多个 VSL 冲突视为不稳定
-    errs: List[str] = []
-    seen: Dict[str, float] = {}
-    for act in ir.actions:
-        if act.type == "vsl" and act.segment_id and act.value is not None:
-            if act.segment_id in seen and seen[act.segment_id] != act.value:
-                errs.append(
-                    f"temporal_stability_violated: multiple vsl values for {act.segment_id}"
-                )
-            else:
-                seen[act.segment_id] = act.value
-    return errs
-
-
-def check_mutual_exclusion(ir: StrategyIR) -> List[str]:
-    # I6: ramp_closure vs ramp_metering; multiple vms_message for same vms
-    errs: List[str] = []
-    ramp_modes: Dict[str, Set[str]] = {}
-    vms_msgs: Dict[str, int] = {}
-
-    for act in ir.actions:
-        if act.type in ("ramp_metering", "ramp_closure") and act.ramp_id:
-            ramp_modes.setdefault(act.ramp_id, set()).add(act.type)
-        if act.type == "vms_message" and act.vms_id:
-            vms_msgs[act.vms_id] = vms_msgs.get(act.vms_id, 0) + 1
-
-    for ramp_id, modes in ramp_modes.items():
-        if "ramp_metering" in modes and "ramp_closure" in modes:
-            errs.append(
-                f"mutually_exclusive_actions: ramp {ramp_id} metering+closure"
-            )
 
-    for vms_id, count in vms_msgs.items():
-        if count > 1:
-            errs.append(
-                f"mutually_exclusive_actions: vms {vms_id} has {count} messages"
-            )
-    return errs
+def check_mutual_exclusion(ir: StrategyIR) -> List[Violation]:
+    return _rule_mutual_exclusion(ir, ActionIndex(ir.actions))
 
 
-def check_rollback(ir: StrategyIR) -> List[str]:
-    # I5 + I7（部分）：高风险动作必须可回滚 / 有时间上限
-    errs: List[str] = []
-    has_closure = any(a.type == "ramp_closure" for a in ir.actions)
-    g = ir.guardrails
-    ro = ir.rollout
-
-    if has_closure:
-        if ro.max_revert_time_s is None:
-            errs.append("rollback_missing_or_infinite: max_revert_time_s is required")
-        else:
-            if g.max_closure_s is not None and ro.max_revert_time_s > g.max_closure_s:
-                errs.append(
-                    f"rollback_missing_or_infinite: max_revert_time_s={ro.max_revert_time_s} > max_closure_s={g.max_closure_s}"
-                )
-
-        # 如果有 closure 动作但没有 max_duration_s，也提示
-        for a in ir.actions:
-            if a.type == "ramp_closure" and (a.max_duration_s is None):
-                errs.append(
-                    "flow_invariants_violated: ramp_closure missing max_duration_s"
-                )
+def check_rollback(ir: StrategyIR) -> List[Violation]:
+    return _rule_rollback(ir, ActionIndex(ir.actions))
 
-    return errs
 
+def run_all_invariants(ir: StrategyIR, fail_fast: bool = False,
+                       timings: Optional[Dict[str, float]] = None,
+                       by_rule: Optional[Dict[str, List[Violation]]] = None,
+                       rule_ids: Optional[Set[str]] = None) -> List[Violation]:
+    """
+    建一次 ActionIndex，按注册顺序执行全部规则。
+    - fail_fast: 首条产生违规的规则之后不再执行后续规则
+    - timings:   传入 dict 时写入 inv_index_ms 与每条规则的 inv_<rule_id>_ms
+    - by_rule:   传入 dict 时写入每条已执行规则的原因列表（rule_id -> [原因]）
+    - rule_ids:  只执行这些规则（默认全部）
+    """
+    _load_plugins()
+    with span("inv_index") as sp:
+        idx = ActionIndex(ir.actions)
+    if timings is not None:
+        timings["inv_index_ms"] = sp.ms
 
-def run_all_invariants(ir: StrategyIR) -> List[str]:
-    errs: List[str] = []
-    errs.extend(check_spatial_smoothness(ir))
-    errs.extend(check_temporal_stability(ir))
-    errs.extend(check_safety_bounds(ir))
-    errs.extend(check_mutual_exclusion(ir))
-    errs.extend(check_rollback(ir))
+    errs: List[Violation] = []
+    for rule_id, fn in _RULES:
+        if rule_ids is not None and rule_id not in rule_ids:
+            continue
+        with span(f"invariant:{rule_id}") as sp:
+            out = as_violations(fn(ir, idx), rule_id)
+        if out:
+            sp.set(violations=len(out))
+        if timings is not None:
+            timings[f"inv_{rule_id}_ms"] = sp.ms
+        if by_rule is not None:
+            by_rule[rule_id] = out
+        if out:
+            errs.extend(out)
+            if fail_fast:
+                break
     return errs
@@ -0,0 +1,95 @@
+# pudao/smt/portfolio.py
+"""求解器 portfolio：多个求解器配置在子进程中并行竞速，取第一个确定结论（sat/unsat）。
+
+每个子进程独立编码并求解（z3 对象不跨进程传递；fork 时 IR 直接继承），
+结论通过队列返回，赢家出现后其余进程立即终止。赢家配置记录在结果的 solver.config 中。
+所有配置都给不出确定结论（超时/超资源）时返回 unknown。
+
+环境变量 PFSB_SOLVER_PORTFOLIO：逗号分隔的配置名（见 budget.SOLVER_CONFIGS），
+"all" 表示全部配置；为空（默认）时不启用，单进程求解。
+"""
+import multiprocessing as mp
+import os
+import queue
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from pudao.dsl.models import StrategyIR
+from pudao.smt.budget import SOLVER_CONFIGS, SolverBudget
+
+_PORTFOLIO_ENV = os.getenv("PFSB_SOLVER_PORTFOLIO", "")
+PORTFOLIO: List[str] = (list(SOLVER_CONFIGS) if _PORTFOLIO_ENV.strip() == "all"
+                        else [c.strip() for c in _PORTFOLIO_ENV.split(",") if c.strip()])
+
+# 子进程收尾 / 结果回传的额外宽限时间
+_GRACE_S = 1.0
+
+
+def _race_worker(ir: StrategyIR, config: str, budget: Dict[str, Any], engine: Optional[str], q) -> None:
+    from pudao.smt.encoder import solve_detailed
+    try:
+        out = solve_detailed(ir, config=config, budget=budget, engine=engine)
+    except Exception as e:  # 单个配置出错不影响其它配置
+        out = {"status": "unknown", "reasons": [], "reason_unknown": f"{type(e).__name__}: {e}",
+               "solver": {"config": config}}
+    q.put(out)
+
+
+def _context():
+    # fork：IR 与已导入的 z3 直接继承，无需序列化与重复导入
+    try:
+        return mp.get_context("fork")
+    except ValueError:  # pragma: no cover  （无 fork 的平台）
+        return mp.get_context("spawn")
+
+
+def run_portfolio(ir: StrategyIR, configs: List[str],
+                  budget: Optional[SolverBudget] = None, engine: Optional[str] = None) -> Dict[str, Any]:
+    """
+    各配置各占一个进程竞速；返回赢家的 solve_detailed 结果（solver 中带 portfolio 信息）。
+    只对 Z3 求解的策略有意义（见 encoder.uses_z3），由调用方判断。
+    """
+    for c in configs:
+        if c not in SOLVER_CONFIGS:
+            raise ValueError(f"unknown solver config: {c} (choose from {', '.join(SOLVER_CONFIGS)})")
+    budget = SolverBudget.coerce(budget)
+    ctx = _context()
+    q = ctx.Queue()
+    t0 = perf_counter()
+    procs = [ctx.Process(target=_race_worker, args=(ir, c, budget.to_dict(), engine, q), daemon=True)
+             for c in configs]
+    for p in procs:
+        p.start()
+
+    wait_s = (budget.timeout_ms / 1000.0 + _GRACE_S) if budget.timeout_ms else None
+    deadline = None if wait_s is None else perf_counter() + wait_s
+    winner: Optional[Dict[str, Any]] = None
+    last: Optional[Dict[str, Any]] = None
+    try:
+        for _ in procs:
+            timeout = None if deadline is None else max(0.0, deadline - perf_counter())
+            try:
+                out = q.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if out["status"] in ("sat", "unsat"):
+                winner = out
+                break
+            last = out
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        for p in procs:
+            p.join()
+        q.close()
+
+    res = winner or last or {"status": "unknown", "reasons": [], "reason_unknown": "timeout",
+                             "solver": {"config": None}}
+    res["solver"] = {
+        **(res.get("solver") or {}),
+        "budget": budget.to_dict(),
+        "portfolio": list(configs),
+        "race_ms": (perf_counter() - t0) * 1000.0,
+    }
+    return res
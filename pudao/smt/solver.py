@@ -1,61 +1,141 @@
 # pudao/smt/solver.py
-from typing import Dict, Any, List
-from time import perf_counter
-from datetime import datetime, timezone
+import os
+import random
+from typing import Dict, Any, List, Optional
 
 from pudao.dsl.models import StrategyIR
+from pudao.evidence.trace import span
+from pudao.smt import budget as budget_mod
+from pudao.smt.ground import ground_status
 from pudao.smt.invariants import run_all_invariants
-from pudao.smt.encoder import solve as smt_solve
+from pudao.smt.violations import Violation, as_violations, details_for
 
+# 不变式首个违规即停止（默认跑完全部规则，给出完整原因列表）
+INVARIANTS_FAIL_FAST = os.getenv("PFSB_INVARIANTS_FAIL_FAST", "0") == "1"
 
-def _iso_utc() -> str:
-    # 例如 2025-11-17T15:32:10.123Z
-    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+# 结论已确定时跳过 Z3：不变式已判错（violations），或全定值策略已在 Python 侧求值为 sat（ground）
+SMT_FASTPATH = os.getenv("PFSB_SMT_FASTPATH", "1") == "1"
+# 命中快速路径的请求中，仍按此比例运行 Z3 交叉验证（0~1），结果记在 solver.cross_check
+SMT_CROSSCHECK_RATE = float(os.getenv("PFSB_SMT_CROSSCHECK_RATE", "0"))
 
 
-def check_formal_with_smt(ir: StrategyIR) -> Dict[str, Any]:
+def check_formal_with_smt(ir: StrategyIR, fail_fast: Optional[bool] = None,
+                          budget: Optional[Dict[str, Any]] = None,
+                          prior: Optional[Dict[str, Any]] = None,
+                          revision: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
+    fail_fast: 不变式首个违规即停止（默认取 PFSB_INVARIANTS_FAIL_FAST）
+    budget:    本次请求的求解预算 {timeout_ms, rlimit, memory_mb}（缺省项取环境默认）；
+               超出预算时 status="unknown"，reasons=["smt_unknown: <原因>"]
+    prior:     同一策略上一次校验的记录 {version, ir, rules, smt}（见 pudao.gate.revisions），
+               可增量时只复核受影响的部分（见 pudao.smt.incremental），结果带 incremental 字段
+    revision:  传入 dict 时写入本次的 {rules, smt}，供下一版本增量复核（fail_fast 时不写）
     返回:
     {
       allow: bool,
       status: "sat"|"unsat"|"unknown",
-      reasons: [..],
-      details: {...},
+      reasons: [..],          # Violation（str 子类，字符串即渲染形式）
+      violations: [{code, invariant, targets: [{kind, id}], measured, limit, message}],
+      details: {...},         # 由 violations 的所属不变式一次性汇总
       timestamps: {
         solver_start_utc, smt_start_utc, smt_end_utc, solver_end_utc
       },
       timings_ms: {
-        invariants_ms, smt_ms, solver_ms
-      }
+        invariants_ms, inv_index_ms, inv_<rule_id>_ms..., smt_ms, solver_ms, core_ms?
+      },
+      unsat_core?: {actions: [下标], guardrails: [字段名], minimal, minimize_ms},
+      solver: {engine, config, budget, portfolio?, race_ms?, reason_unknown?, fast_path?, cross_check?,
+               incremental?},
+      incremental?: {base_version, actions_added, actions_removed, segments, ramps, vms,
+                     neighbourhood_segments, rules_rechecked, rules_rerun, rules_reused, smt}
     }
+    快速路径（PFSB_SMT_FASTPATH）：不变式已给出原因，或全定值策略在 Python 侧求值为 sat 时
+    不调用 Z3，solver.fast_path 记录依据（violations / ground）；按 PFSB_SMT_CROSSCHECK_RATE
+    抽样的请求仍运行 Z3，结论以 Z3 为准，solver.cross_check = {expected, smt, agree}。
     """
-    # ---- 计时起点（仅 solver 内部）----
-    t_solver0 = perf_counter()
-    ts_solver0 = _iso_utc()
-
-    details: Dict[str, str] = {}
-    reasons: List[str] = []
+    # ---- 计时起点（仅 solver 内部；各阶段为 span，见 pudao.evidence.trace）----
+    sp_solver = span("solver").open()
 
-    # I1 在 parser 里做过了，这里视为 ok（出错会在上层被捕获）
-    details["I1_structure"] = "ok"
+    reasons: List[Violation] = []
 
     # ---- 不变式检查（Python）----
-    t_inv0 = perf_counter()
-    inv_errors = run_all_invariants(ir)
-    t_inv1 = perf_counter()
+    if fail_fast is None:
+        fail_fast = INVARIANTS_FAIL_FAST
+    rule_timings: Dict[str, float] = {}
+    by_rule: Dict[str, List[Violation]] = {}
+    sp_inv = span("invariants").open()
+    delta = None
+    inc: Optional[Dict[str, Any]] = None
+    if prior is not None and not fail_fast:
+        from pudao.smt import incremental
+        delta = incremental.diff_ir(prior["ir"], ir)
+    if delta is not None:
+        by_rule, info = incremental.recheck_rules(ir, prior["ir"], prior["rules"], delta, rule_timings)
+        inv_errors = [r for rs in by_rule.values() for r in rs]
+        inc = {"base_version": prior.get("version"), **delta.to_dict(), **info}
+    else:
+        inv_errors = run_all_invariants(ir, fail_fast=fail_fast, timings=rule_timings, by_rule=by_rule)
+    sp_inv.close()
     if inv_errors:
         reasons.extend(inv_errors)
 
+    # ---- 快速路径判定：结论已确定时不需要 Z3 ----
+    fast_path: Optional[str] = None
+    expected: Optional[str] = None  # 全定值时 Z3 应给出的结论
+    if SMT_FASTPATH:
+        expected = ground_status(ir)
+        if inv_errors:
+            fast_path = "violations"
+        elif expected == "sat":
+            fast_path = "ground"
+    cross_check = fast_path is not None and random.random() < SMT_CROSSCHECK_RATE
+
     # ---- SMT（Z3）求解 ----
-    ts_smt0 = _iso_utc()
-    t_smt0 = perf_counter()
-    smt_status = smt_solve(ir)
-    t_smt1 = perf_counter()
-    ts_smt1 = _iso_utc()
+    sp_smt = span("smt").open()
+    if fast_path is not None and not cross_check:
+        smt = {"status": expected or "skipped", "reasons": [], "solver": {"fast_path": fast_path}}
+    else:
+        from pudao.smt import encoder  # 延迟导入 z3
+        from pudao.smt.portfolio import PORTFOLIO, run_portfolio
+        smt = None
+        if delta is not None and not cross_check and budget_mod.SMT_ENGINE == "auto":
+            smt = incremental.resolve_smt(ir, prior.get("smt"), delta)
+        if smt is None:
+            # 交叉验证总是用 Z3；portfolio 与求解器配置只用于 Z3 路径（差分约束求解只有一种）
+            engine = "z3" if cross_check else budget_mod.SMT_ENGINE
+            if not encoder.uses_z3(ir, engine):
+                smt = encoder.solve_detailed(ir, budget=budget, engine=engine)
+            elif len(PORTFOLIO) > 1:
+                smt = run_portfolio(ir, PORTFOLIO, budget, engine=engine)
+            else:
+                smt = encoder.solve_detailed(ir, *PORTFOLIO, budget=budget, engine=engine)
+        if cross_check:
+            agree = None if expected is None or smt["status"] == "unknown" else expected == smt["status"]
+            smt["solver"] = {**smt["solver"], "fast_path": fast_path,
+                             "cross_check": {"expected": expected, "smt": smt["status"], "agree": agree}}
+    smt_status = smt["status"]
+    sp_smt.close()
+    if fast_path is not None:
+        sp_smt.set(fast_path=fast_path)
 
-    # 若 Z3 给出 unsat 且本地没有具体原因，补一条兜底
+    # 有界展开给出的时序原因（不与本地不变式重复）
+    if smt["reasons"]:
+        seen = set(reasons)
+        for r in as_violations(smt["reasons"]):
+            if r not in seen:
+                seen.add(r)
+                reasons.append(r)
+
+    # 若 Z3 给出 unsat 且本地没有具体原因：报告最小冲突集（动作下标 + 护栏）
+    core = smt.get("core")
     if smt_status == "unsat" and not reasons:
-        reasons.append("smt_unsat_without_local_reason")
+        if core and (core["actions"] or core["guardrails"]):
+            reasons.append(Violation(
+                "smt_unsat_core", f"actions {core['actions']} conflict under guardrails {core['guardrails']}",
+                targets=[*(("action", str(i)) for i in core["actions"]),
+                         *(("guardrail", g) for g in core["guardrails"])]))
+        else:
+            reasons.append(Violation.parse("smt_unsat_without_local_reason"))
 
     # 合成总体 verdict
     if reasons:
@@ -64,33 +144,45 @@ def check_formal_with_smt(ir: StrategyIR) -> Dict[str, Any]:
     else:
         status = "sat" if smt_status == "sat" else "unknown"
         allow = (status == "sat")
+        if status == "unknown":
+            # 超时 / 超出资源预算：不下结论，也不误报 unsat
+            reasons.append(Violation("smt_unknown", smt.get("reason_unknown") or "unknown"))
 
     # ---- 计时终点（仅 solver 内部）----
-    t_solver1 = perf_counter()
-    ts_solver1 = _iso_utc()
+    sp_solver.close()
 
-    # 标准化 details（与现有实现保持一致）
-    details["I2_spatial"] = "ok" if not any("spatial_smoothness" in r for r in reasons) else "fail"
-    details["I3_temporal"] = "ok" if not any("temporal_stability" in r for r in reasons) else "fail"
-    details["I4_safety"]  = "ok" if not any("safety_bounds" in r  for r in reasons) else "fail"
-    details["I5_rollback"]= "ok" if not any("rollback" in r       for r in reasons) else "fail"
-    details["I6_conflict"]= "ok" if not any("mutually_exclusive" in r for r in reasons) else "fail"
-    details["I7_flow"]    = "ok" if not any("flow_invariants" in r for r in reasons) else "fail"
+    # I1 在 parser 里做过了，这里视为 ok（出错会在上层被捕获）
+    details = {"I1_structure": "ok", **details_for(reasons)}
 
-    return {
+    out = {
         "allow": allow,
         "status": status,
         "reasons": reasons,
+        "violations": [v.to_dict() for v in reasons],
         "details": details,
         "timestamps": {
-            "solver_start_utc": ts_solver0,
-            "smt_start_utc": ts_smt0,
-            "smt_end_utc": ts_smt1,
-            "solver_end_utc": ts_solver1,
+            "solver_start_utc": sp_solver.iso_start(),
+            "smt_start_utc": sp_smt.iso_start(),
+            "smt_end_utc": sp_smt.iso_end(),
+            "solver_end_utc": sp_solver.iso_end(),
         },
         "timings_ms": {
-            "invariants_ms": (t_inv1 - t_inv0) * 1000.0,
-            "smt_ms": (t_smt1 - t_smt0) * 1000.0,
-            "solver_ms": (t_solver1 - t_solver0) * 1000.0,  # (不变式 + SMT + 轻量封装)
+            "invariants_ms": sp_inv.ms,
+            **rule_timings,
+            "smt_ms": sp_smt.ms,
+            "solver_ms": sp_solver.ms,  # (不变式 + SMT + 轻量封装)
         },
     }
+    out["solver"] = dict(smt.get("solver") or {})
+    if smt_status == "unknown":
+        out["solver"]["reason_unknown"] = smt.get("reason_unknown")
+    if core is not None:
+        out["unsat_core"] = core
+        out["timings_ms"]["core_ms"] = core["minimize_ms"]
+    if inc is not None:
+        inc["smt"] = out["solver"].get("incremental") or out["solver"].get("fast_path") or "full"
+        out["incremental"] = inc
+    if revision is not None and not fail_fast:
+        revision["rules"] = by_rule
+        revision["smt"] = {"status": smt_status, "model": smt.get("model")}
+    return out
@@ -0,0 +1,79 @@
+# pudao/smt/temporal.py
+"""策略的时间语义（不依赖 z3，供不变式与编码器共用）。
+
+- 动作持续时间：ttl_s 与 max_duration_s 中较小者；都未给出则一直生效到时域结束；
+- 同一路段的多条 vsl 动作构成时间序列：下一条在上一条到期时开始；
+  序列结束后该路段交还默认控制（限速在 [min_vsl, max_vsl] 内自由取值）；
+- 时域按 step_s 离散为若干步，第 k 步对应时刻 k * step_s。
+
+环境变量：PFSB_TEMPORAL_HORIZON_S（默认 3600）、PFSB_TEMPORAL_STEP_S（默认 30）。
+"""
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from pudao.dsl.columnar import has_vsl_duration, iter_vsl
+from pudao.dsl.models import Action, StrategyIR
+
+HORIZON_S = float(os.getenv("PFSB_TEMPORAL_HORIZON_S", "3600"))
+STEP_S = float(os.getenv("PFSB_TEMPORAL_STEP_S", "30"))
+
+# max_changes_per_5min 的滑动窗口长度
+CHANGE_WINDOW_S = 300.0
+
+# (开始时刻, 结束时刻或 None=持续到时域结束, 限速值, 动作下标)
+Slot = Tuple[float, Optional[float], float, int]
+
+
+def action_duration_s(act: Action) -> Optional[float]:
+    ds = [d for d in (act.ttl_s, act.max_duration_s) if d is not None]
+    return min(ds) if ds else None
+
+
+def vsl_schedule(ir: StrategyIR) -> Dict[str, List[Slot]]:
+    """segment_id -> 按时间排列的 vsl 时段；无限期动作之后的同段动作不会生效（由 I3 报告）。"""
+    out: Dict[str, List[Slot]] = {}
+    t_next: Dict[str, Optional[float]] = {}
+    for i, seg, value, d in iter_vsl(ir.actions):
+        start = t_next.get(seg, 0.0)
+        if start is None:
+            continue
+        end = None if d is None else start + d
+        out.setdefault(seg, []).append((start, end, value, i))
+        t_next[seg] = end
+    return out
+
+
+def is_time_varying(ir: StrategyIR) -> bool:
+    """是否有带持续时间的 vsl 动作（否则单一快照即可完整描述策略）。"""
+    return has_vsl_duration(ir.actions)
+
+
+def steps(horizon_s: float = HORIZON_S, step_s: float = STEP_S) -> int:
+    if step_s <= 0 or horizon_s <= 0:
+        raise ValueError("temporal_config_invalid: horizon and step must be positive")
+    return max(1, int(math.ceil(horizon_s / step_s)))
+
+
+def window_steps(step_s: float = STEP_S) -> int:
+    return max(1, int(round(CHANGE_WINDOW_S / step_s)))
+
+
+def value_at(slots: List[Slot], t: float) -> Optional[float]:
+    for start, end, v, _ in slots:
+        if start <= t and (end is None or t < end):
+            return v
+    return None
+
+
+def event_steps(schedule: Dict[str, List[Slot]], n_steps: int, step_s: float = STEP_S) -> List[int]:
+    """取值发生变化的步（时段开始/结束所在步），用于选择增量求解的检查点。"""
+    ks = set()
+    for slots in schedule.values():
+        for start, end, _, _ in slots:
+            for t in (start, end):
+                if t is not None:
+                    k = int(math.ceil(t / step_s))
+                    if k < n_steps:
+                        ks.add(k)
+    return sorted(ks)
@@ -0,0 +1,9 @@
+# pudao/smt/versions.py
+# 规则 / 编码语义版本号（参与结论缓存键）。
+# 单独成模块：查缓存时无需导入 z3。
+
+# 不变式规则语义变化时递增
+INVARIANTS_VERSION = "3"
+
+# Z3 编码语义变化时递增
+ENCODER_VERSION = "4"
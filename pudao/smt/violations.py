@@ -0,0 +1,98 @@
+# pudao/smt/violations.py
+"""结构化违规记录。
+
+不变式规则与编码器产出 Violation：code（原因类别）、invariant（所属不变式 I1–I7）、
+targets（涉及的对象 (kind, id)）、measured / limit（实测值与限值）。
+Violation 是 str 的子类，字符串内容即 "<code>: <detail>" 的渲染形式，
+因此 reasons 列表、缓存与 JSON 输出保持原样；details / hints / evidence 直接读结构化字段，
+不再对原因字符串做子串匹配。
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 原因类别 -> 所属不变式（details 的键）
+CODE_INVARIANT: Dict[str, str] = {
+    "schema_violation": "I1_structure",
+    "invalid_reference": "I1_structure",
+    "spatial_smoothness_violated": "I2_spatial",
+    "temporal_stability_violated": "I3_temporal",
+    "safety_bounds_violated": "I4_safety",
+    "rollback_missing_or_infinite": "I5_rollback",
+    "mutually_exclusive_actions": "I6_conflict",
+    "flow_invariants_violated": "I7_flow",
+}
+
+# details 中固定输出的不变式（I1 由解析阶段负责，通过校验即为 ok）
+DETAIL_INVARIANTS = ("I2_spatial", "I3_temporal", "I4_safety", "I5_rollback", "I6_conflict", "I7_flow")
+
+Target = Tuple[str, str]
+
+
+class Violation(str):
+    """一条违规：字符串形式为 "<code>: <detail>"，附带结构化字段。"""
+
+    def __new__(cls, code: str, detail: str, invariant: Optional[str] = None,
+                targets: Iterable[Target] = (), measured: Any = None, limit: Any = None):
+        return _make(f"{code}: {detail}", code, invariant if invariant is not None else CODE_INVARIANT.get(code),
+                     tuple(targets), measured, limit)
+
+    def __reduce__(self):
+        # 进程池间传递时保留结构化字段
+        return (_make, (str(self), self.code, self.invariant, self.targets, self.measured, self.limit))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "invariant": self.invariant,
+            "targets": [{"kind": k, "id": i} for k, i in self.targets],
+            "measured": self.measured,
+            "limit": self.limit,
+            "message": str(self),
+        }
+
+    @classmethod
+    def from_dict(cls, d: Any) -> "Violation":
+        if not isinstance(d, dict):
+            return cls.parse(d)
+        return _make(d.get("message") or "", d.get("code") or "", d.get("invariant"),
+                     tuple((t["kind"], t["id"]) for t in d.get("targets") or ()),
+                     d.get("measured"), d.get("limit"))
+
+    @classmethod
+    def parse(cls, text: Any, invariant: Optional[str] = None) -> "Violation":
+        """
+        由字符串原因还原（站点插件规则 / 解析错误 / 旧格式记录）：取首个 ":" 前的前缀为 code，
+        所属不变式按 code 查表，查不到时取 invariant（如插件规则的 rule_id）。
+        """
+        if isinstance(text, Violation):
+            return text
+        text = str(text)
+        code = text.partition(":")[0].strip()
+        return _make(text, code, CODE_INVARIANT.get(code, invariant), (), None, None)
+
+
+def _make(text: str, code: str, invariant: Optional[str], targets: Tuple[Target, ...],
+          measured: Any, limit: Any) -> Violation:
+    v = str.__new__(Violation, text)
+    v.code = code
+    v.invariant = invariant
+    v.targets = targets
+    v.measured = measured
+    v.limit = limit
+    return v
+
+
+def as_violations(items: Iterable[Any], invariant: Optional[str] = None) -> List[Violation]:
+    return [Violation.parse(x, invariant) for x in items]
+
+
+def details_for(violations: Iterable[Violation]) -> Dict[str, str]:
+    """按所属不变式一次性汇总 ok / fail。"""
+    failed = {v.invariant for v in violations}
+    return {inv: ("fail" if inv in failed else "ok") for inv in DETAIL_INVARIANTS}
+
+
+def by_invariant(violations: Iterable[Violation]) -> Dict[str, List[Violation]]:
+    out: Dict[str, List[Violation]] = {}
+    for v in violations:
+        out.setdefault(v.invariant, []).append(v)
+    return out
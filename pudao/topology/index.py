@@ -0,0 +1,189 @@
+# pudao/topology/index.py
+"""路网拓扑索引（CSR 邻接表）。
+
+从文件加载路段邻接关系，构建一次后在进程内共享，供不变式检查（I2）与 SMT 编码共用：
+- ids:      下标 -> 路段 ID
+- index:    路段 ID -> 下标
+- offsets:  array('l')，第 i 个路段的邻居位于 targets[offsets[i]:offsets[i+1]]
+- targets:  array('l')，邻居下标
+
+支持的文件格式：
+- 边表（.txt/.csv/.tsv/.edges）：每行 "seg_a seg_b" 或 "seg_a,seg_b"，# 开头为注释；
+- JSON：{"edges": [["seg_a", "seg_b"], ...]}；
+- GeoJSON FeatureCollection：每个 Feature 的 properties 含
+  {"segment_id", "neighbors": [...]} 或 {"from", "to"}（边要素）。
+
+所有边按无向处理；每个路段的邻居顺序与文件中出现顺序一致。
+
+环境变量 PFSB_TOPOLOGY_FILE 可覆盖默认拓扑文件（默认为包内 default_edges.txt）。
+"""
+import hashlib
+import json
+import os
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_TOPOLOGY_FILE = str(Path(__file__).with_name("default_edges.txt"))
+TOPOLOGY_FILE = os.getenv("PFSB_TOPOLOGY_FILE", DEFAULT_TOPOLOGY_FILE)
+
+
+class TopologyIndex:
+    __slots__ = ("ids", "index", "offsets", "targets", "source", "_fp")
+
+    def __init__(self, ids: List[str], offsets: array, targets: array,
+                 source: Optional[str] = None):
+        self.ids = ids
+        self.index: Dict[str, int] = {s: i for i, s in enumerate(ids)}
+        self.offsets = offsets
+        self.targets = targets
+        self.source = source
+        self._fp: Optional[str] = None
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str]],
+                   source: Optional[str] = None) -> "TopologyIndex":
+        """由 (a, b) 无向边序列构建 CSR；重复边与自环被忽略。"""
+        ids: List[str] = []
+        index: Dict[str, int] = {}
+        adj: List[List[int]] = []
+        seen = set()
+
+        def _id(s: str) -> int:
+            i = index.get(s)
+            if i is None:
+                i = index[s] = len(ids)
+                ids.append(s)
+                adj.append([])
+            return i
+
+        for a, b in edges:
+            ia, ib = _id(a), _id(b)
+            if ia == ib or (ia, ib) in seen:
+                continue
+            seen.add((ia, ib))
+            seen.add((ib, ia))
+            adj[ia].append(ib)
+            adj[ib].append(ia)
+
+        offsets = array("l", [0])
+        targets = array("l")
+        for nbs in adj:
+            targets.extend(nbs)
+            offsets.append(len(targets))
+        return cls(ids, offsets, targets, source)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets) // 2
+
+    def fingerprint(self) -> str:
+        """拓扑内容指纹（用于结论缓存键；首次调用时计算）。"""
+        if self._fp is None:
+            h = hashlib.sha256()
+            h.update("\0".join(self.ids).encode("utf-8"))
+            h.update(self.offsets.tobytes())
+            h.update(self.targets.tobytes())
+            self._fp = h.hexdigest()
+        return self._fp
+
+    def __contains__(self, seg_id: str) -> bool:
+        return seg_id in self.index
+
+    def neighbor_indices(self, i: int) -> array:
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def neighbors(self, seg_id: str) -> List[str]:
+        """O(degree) 邻居查询；未知路段返回空列表。"""
+        i = self.index.get(seg_id)
+        if i is None:
+            return []
+        ids = self.ids
+        return [ids[j] for j in self.targets[self.offsets[i]:self.offsets[i + 1]]]
+
+    def degree(self, seg_id: str) -> int:
+        i = self.index.get(seg_id)
+        return 0 if i is None else self.offsets[i + 1] - self.offsets[i]
+
+    def edges_among(self, segs: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        """
+        产出 segs 内部的无向边（每条只产出一次）。
+        复杂度 O(Σ degree(segs))，与全网规模无关。
+        """
+        local = {}
+        for s in segs:
+            i = self.index.get(s)
+            if i is not None and s not in local:
+                local[s] = i
+        members = set(local.values())
+        ids = self.ids
+        targets, offsets = self.targets, self.offsets
+        for s, i in local.items():
+            for j in targets[offsets[i]:offsets[i + 1]]:
+                if j > i and j in members:
+                    yield s, ids[j]
+
+
+# ---- 文件加载 ----
+
+def _iter_edge_list(text: str) -> Iterator[Tuple[str, str]]:
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = [p.strip() for p in line.replace(",", " ").replace("\t", " ").split()]
+        if len(parts) < 2:
+            raise ValueError(f"topology_invalid: bad edge line {line!r}")
+        yield parts[0], parts[1]
+
+
+def _iter_json_edges(doc) -> Iterator[Tuple[str, str]]:
+    if isinstance(doc, dict) and "edges" in doc:
+        for e in doc["edges"]:
+            yield str(e[0]), str(e[1])
+        return
+    if isinstance(doc, dict) and doc.get("type") == "FeatureCollection":
+        for feat in doc.get("features") or []:
+            props = feat.get("properties") or {}
+            if "from" in props and "to" in props:
+                yield str(props["from"]), str(props["to"])
+            elif "segment_id" in props:
+                for nb in props.get("neighbors") or []:
+                    yield str(props["segment_id"]), str(nb)
+        return
+    raise ValueError("topology_invalid: expected {'edges': [...]} or GeoJSON FeatureCollection")
+
+
+def load_topology_file(path: str) -> TopologyIndex:
+    p = Path(path)
+    text = p.read_text(encoding="utf-8-sig")
+    if p.suffix in (".json", ".geojson"):
+        edges = _iter_json_edges(json.loads(text))
+    else:
+        edges = _iter_edge_list(text)
+    return TopologyIndex.from_edges(edges, source=str(p))
+
+
+_topology: Optional[TopologyIndex] = None
+_lock = threading.Lock()
+
+
+def get_topology() -> TopologyIndex:
+    """进程级共享拓扑（首次调用时从 PFSB_TOPOLOGY_FILE 加载）。"""
+    global _topology
+    if _topology is None:
+        with _lock:
+            if _topology is None:
+                _topology = load_topology_file(TOPOLOGY_FILE)
+    return _topology
+
+
+def set_topology(topo: TopologyIndex) -> None:
+    """替换进程级拓扑（加载新文件或测试注入）。"""
+    global _topology
+    with _lock:
+        _topology = topo
@@ -0,0 +1,33 @@
+# tests/_helpers.py
+"""测试共用的示例策略构造（按示例文件改写 actions / 护栏 / 顶层字段）。"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from pudao.dsl.models import StrategyIR
+
+BASE = Path(__file__).resolve().parents[1]
+VSL = BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"
+
+
+def strategy_ir(path: Path = VSL, actions: Optional[List[Dict[str, Any]]] = None,
+                max_delta: Optional[float] = None, **update: Any) -> StrategyIR:
+    """示例策略的变体：替换 actions / guardrails.max_delta / 顶层字段（不做 ID 校验）。"""
+    doc = yaml.safe_load(path.read_text(encoding="utf-8"))
+    doc.update(update)
+    if actions is not None:
+        doc["actions"] = actions
+    if max_delta is not None:
+        doc["guardrails"]["max_delta"] = max_delta
+    return StrategyIR.parse_obj(doc)
+
+
+def sandwich_ir() -> StrategyIR:
+    # 102 无 vsl 动作，夹在 101=60 与 103=100 之间：max_delta=15 时 102 无解。
+    # 本地不变式只比较有 vsl 的相邻段，不会报错，由求解器（差分约束 / Z3）判定 unsat
+    return strategy_ir(actions=[
+        {"type": "vsl", "segment_id": "cd-se-104", "value": 100},
+        {"type": "vsl", "segment_id": "cd-se-101", "value": 60},
+        {"type": "vsl", "segment_id": "cd-se-103", "value": 100},
+    ], max_delta=15)
@@ -0,0 +1,55 @@
+# tests/test_bench.py
+import copy
+
+import pytest
+
+from pudao.bench import generator, runner
+from pudao.dsl.id_registry import get_id_registry
+
+
+@pytest.mark.parametrize("scenario", generator.SCENARIOS)
+def test_synthetic_scenarios_reach_expected_status(scenario):
+    before = get_id_registry().fingerprint()
+    case = runner.run_case(30, scenario, repeat=1)
+    assert case["status"] == generator.EXPECTED[scenario]
+    assert not case["mismatch"]
+    assert set(runner.PHASES) <= set(case["phases_ms"])
+    # 合成 ID 只在运行期间注入
+    assert get_id_registry().fingerprint() == before
+
+
+def test_grid_topology_and_scaling_exponents():
+    report = runner.run_suite([9, 36], ["sat"], ["grid"], repeat=1)
+    assert [c["status"] for c in report["cases"]] == ["sat", "sat"]
+    curve = report["scaling"]["grid/sat"]["total"]
+    assert curve and curve[0]["from"] == 9 and curve[0]["to"] == 36
+
+
+def test_compare_flags_phase_regressions():
+    base = {"format": 1, "env": {}, "cases": [
+        {"name": "chain/sat/10", "mismatch": False, "phases_ms": {"smt": 10.0, "ir": 1.0}}]}
+    new = copy.deepcopy(base)
+    new["cases"][0]["phases_ms"].update(smt=15.0, ir=1.5)  # ir 变慢 50% 但绝对差 < min_ms
+    cmp = runner.compare(base, new, threshold=0.2, min_ms=1.0)
+    assert [(r["case"], r["phase"]) for r in cmp["regressions"]] == [("chain/sat/10", "smt")]
+    assert runner.compare(base, base)["regressions"] == []
+
+
+def test_phases_come_from_gate_spans(monkeypatch):
+    from pudao.evidence import trace
+    from pudao.gate import formal_gate
+
+    calls = []
+    real = formal_gate.check_formal_file
+
+    def spy(path, **kw):
+        calls.append(kw)
+        return real(path, **kw)
+
+    monkeypatch.setattr(formal_gate, "check_formal_file", spy)
+    before = trace.TRACE_SAMPLE, trace.TRACE_OTLP_FILE
+    case = runner.run_case(30, "unsat-core", repeat=1)
+    assert calls == [{"write_evidence": False, "use_cache": False}]
+    assert case["status"] == "unsat" and case["phases_ms"]["smt"] > 0
+    # 只在运行期间强制采样
+    assert (trace.TRACE_SAMPLE, trace.TRACE_OTLP_FILE) == before
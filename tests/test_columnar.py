@@ -0,0 +1,86 @@
+# tests/test_columnar.py
+import json
+from collections import Counter
+from pathlib import Path
+
+import pytest
+import yaml
+
+from pudao.bench import generator
+from pudao.dsl import id_registry, parser
+from pudao.dsl.columnar import ActionTable, ColumnarIR
+from pudao.dsl.parser import to_ir_columnar, to_ir_trusted, validate_ids
+from pudao.gate.cache import verdict_key
+from pudao.gate.formal_gate import check_formal_file
+from pudao.smt.incremental import diff_ir
+from pudao.smt.solver import check_formal_with_smt
+from pudao.topology import index
+
+BASE = Path(__file__).resolve().parents[1]
+EXAMPLES = sorted((BASE / "examples").glob("*.yaml"))
+
+
+def _verdict(res):
+    core = {k: v for k, v in (res.get("unsat_core") or {}).items() if k != "minimize_ms"}
+    return res["status"], list(res["reasons"]), res["details"], core
+
+
+@pytest.fixture()
+def synthetic():
+    old_topo, old_reg = index.get_topology(), id_registry.get_id_registry()
+    index.set_topology(generator.topology_for(60))
+    id_registry.set_id_registry(generator.registry_for(60))
+    yield
+    index.set_topology(old_topo)
+    id_registry.set_id_registry(old_reg)
+
+
+@pytest.mark.parametrize("path", EXAMPLES, ids=lambda p: p.name)
+def test_same_document_same_ir_json_and_verdict(path):
+    raw = yaml.safe_load(path.read_text(encoding="utf-8"))
+    model, col = to_ir_trusted(raw), to_ir_columnar(raw)
+    assert isinstance(col, ColumnarIR) and isinstance(col.actions, ActionTable)
+    assert col.json(sort_keys=True, ensure_ascii=False) == model.json(sort_keys=True, ensure_ascii=False)
+    assert verdict_key(col) == verdict_key(model)
+    assert [a.dict() for a in col.actions] == [a.dict() for a in model.actions]
+    assert _verdict(check_formal_with_smt(col)) == _verdict(check_formal_with_smt(model))
+
+
+@pytest.mark.parametrize("scenario", generator.SCENARIOS)
+def test_synthetic_scenarios_agree(synthetic, scenario):
+    raw = generator.synthetic_strategy(60, scenario)
+    model, col = to_ir_trusted(raw), to_ir_columnar(raw)
+    validate_ids(col)
+    assert _verdict(check_formal_with_smt(col)) == _verdict(check_formal_with_smt(model))
+    delta = diff_ir(model, col)  # 两种表示的动作键相同：没有增删
+    assert delta.added == delta.removed == 0
+
+
+def test_time_varying_strategy_agrees():
+    raw = yaml.safe_load(EXAMPLES[-1].read_text(encoding="utf-8"))
+    raw["actions"][0]["ttl_s"] = 600
+    raw["actions"].append({"type": "vsl", "segment_id": raw["actions"][0]["segment_id"], "value": 60})
+    model, col = to_ir_trusted(raw), to_ir_columnar(raw)
+    a, b = check_formal_with_smt(model), check_formal_with_smt(col)
+    assert a["status"] == b["status"] and Counter(a["reasons"]) == Counter(b["reasons"])
+
+
+def test_targets_are_interned_and_missing_ids_fall_back():
+    raw = yaml.safe_load(EXAMPLES[0].read_text(encoding="utf-8"))
+    raw["actions"] = raw["actions"] * 3
+    t = to_ir_columnar(raw).actions
+    assert len(t) == len(raw["actions"]) and len(t.targets) == len({t.target_id(i) for i in range(len(t))})
+    assert t.nbytes() < 64 * len(t)
+    raw["actions"].append({"type": "vsl", "value": 80})
+    with pytest.raises(ValueError, match="vsl action requires segment_id"):
+        to_ir_columnar(raw)
+
+
+def test_gate_switches_to_columnar_above_threshold(monkeypatch, tmp_path):
+    src = BASE / "examples" / "strategy-cd-ring-incident-rm-vms.yaml"
+    small = check_formal_file(str(src), write_evidence=False, use_cache=False)
+    monkeypatch.setattr(parser, "COLUMNAR_MIN_ACTIONS", 1)
+    assert isinstance(parser.load_strategy_ir(str(src)), ColumnarIR)
+    large = check_formal_file(str(src), write_evidence=False, use_cache=False)
+    assert _verdict(large) == _verdict(small)
+    assert json.dumps(large["violations"]) == json.dumps(small["violations"])
@@ -0,0 +1,92 @@
+# tests/test_difference.py
+import random
+
+from pudao.smt.difference import DifferenceSystem, encode_difference, solve_difference
+from pudao.smt.encoder import solve_static
+from pudao.smt.solver import check_formal_with_smt
+from tests._helpers import sandwich_ir, strategy_ir
+
+
+def test_partial_strategy_gets_feasible_witness():
+    ir = strategy_ir(actions=[{"type": "vsl", "segment_id": "cd-se-101", "value": 60},
+                             {"type": "vsl", "segment_id": "cd-se-104", "value": 100}], max_delta=15)
+    out = solve_difference(ir)
+    assert out["status"] == "sat"
+    m = out["model"]
+    assert m["cd-se-101"] == 60 and m["cd-se-104"] == 100
+    chain = [m[f"cd-se-10{i}"] for i in range(1, 5)]
+    assert all(60 <= v <= 100 for v in chain)
+    assert all(abs(a - b) <= 15 for a, b in zip(chain, chain[1:]))
+
+
+def test_negative_cycle_is_minimal_core():
+    ir = sandwich_ir()
+    out = solve_difference(ir)
+    assert out["status"] == "unsat"
+    assert out["core"]["actions"] == [1, 2]
+    assert out["core"]["guardrails"] == ["max_delta"]
+    assert "vsl(cd-se-101) <= 60" in out["core"]["cycle"]
+    res = check_formal_with_smt(ir)
+    assert res["solver"]["engine"] == "difference"
+    assert res["reasons"] == ["smt_unsat_core: actions [1, 2] conflict under guardrails ['max_delta']"]
+
+
+def test_agrees_with_z3_on_random_systems():
+    rnd = random.Random(7)
+    segs = [f"cd-se-10{i}" for i in range(1, 5)]
+    for _ in range(60):
+        acts = [{"type": "vsl", "segment_id": s, "value": rnd.choice((50, 60, 70, 80, 90, 100, 110))}
+                for s in segs if rnd.random() < 0.6]
+        ir = strategy_ir(actions=acts, max_delta=rnd.choice((5, 10, 20)))
+        diff, z3 = solve_difference(ir), solve_static(ir)
+        assert diff["status"] == z3["status"]
+        if diff["status"] == "unsat":
+            # 最小冲突集不唯一：只要求 core 本身不可满足
+            core = diff["core"]
+            labels = {f"action:{i}" for i in core["actions"]} | {f"guardrail:{g}" for g in core["guardrails"]}
+            assert encode_difference(ir).subsystem(labels).solve()[1] is not None
+
+
+def test_large_chain_scales():
+    ds = DifferenceSystem()
+    n = 20000
+    for i in range(n):
+        s = f"s{i}"
+        ds.upper(s, 100, "guardrail:max_vsl")
+        ds.lower(s, 60, "guardrail:min_vsl")
+        if i:
+            ds.add(s, f"s{i-1}", 1, "guardrail:max_delta")
+            ds.add(f"s{i-1}", s, 1, "guardrail:max_delta")
+    ds.upper("s0", 60, "action:0")
+    model, cycle = ds.solve()
+    assert cycle is None and model["s0"] == 60
+    assert all(60 <= model[f"s{i}"] <= 100 and abs(model[f"s{i}"] - model[f"s{i-1}"]) <= 1
+               for i in range(1, n))
+    ds.lower(f"s{n//2}", 100, "action:1")  # 距 s0 只有 n/2 步，但限速需要爬升 40 档：仍可行
+    assert ds.solve()[1] is None
+    ds.lower("s10", 100, "action:2")       # 10 步内从 60 升到 100 不可行
+    _, cycle = ds.solve()
+    assert {c[3] for c in cycle} == {"action:0", "action:2", "guardrail:max_delta"}
+
+
+def test_difference_engine_skips_portfolio_and_z3_budget(monkeypatch):
+    from pudao.smt import budget, portfolio
+
+    def fail(*a, **kw):
+        raise AssertionError("Z3-only machinery used for a difference-engine strategy")
+
+    monkeypatch.setattr(portfolio, "PORTFOLIO", ["default", "qf_lia"])
+    monkeypatch.setattr(portfolio, "run_portfolio", fail)
+    monkeypatch.setattr(budget.SolverBudget, "start", fail)
+    ir = strategy_ir(actions=[{"type": "vsl", "segment_id": "cd-se-101", "value": 60}])
+    res = check_formal_with_smt(ir, budget={"memory_mb": 64})
+    assert res["status"] == "sat"
+    assert res["solver"]["engine"] == "difference" and "config" not in res["solver"]
+
+
+def test_core_minimization_honours_budget():
+    out = solve_difference(sandwich_ir(), core_budget_ms=0)
+    assert out["status"] == "unsat" and out["core"]["minimal"] is False
+    # 未最小化的冲突集仍然是冲突集：包含最小 core
+    assert {1, 2} <= set(out["core"]["actions"]) and out["core"]["guardrails"] == ["max_delta"]
+    assert solve_difference(sandwich_ir())["core"]["minimal"] is True
@@ -0,0 +1,104 @@
+# tests/test_evidence_sink.py
+import gzip
+import json
+import multiprocessing as mp
+
+from pudao.evidence.sink import EvidenceSink, merge_shards
+
+
+def _writer(path, n, tag):
+    sink = EvidenceSink(path, flush_every=7, flush_interval_s=60)
+    for i in range(n):
+        sink.write({"tag": tag, "i": i, "pad": "x" * 200})
+    sink.close()
+
+
+def test_concurrent_processes_do_not_tear_lines(tmp_path):
+    path = str(tmp_path / "ev.ndjson")
+    procs = [mp.get_context("fork").Process(target=_writer, args=(path, 200, t)) for t in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    lines = (tmp_path / "ev.ndjson").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 800
+    assert all(json.loads(l)["pad"] for l in lines)
+
+
+def test_batching_rotation_and_gzip(tmp_path):
+    path = tmp_path / "ev.ndjson"
+    sink = EvidenceSink(str(path), flush_every=10, flush_interval_s=60,
+                        rotate_bytes=2000, compress="gzip")
+    for i in range(9):
+        sink.write({"i": i})
+    assert not path.exists()  # 未满一批，不落盘
+    for i in range(9, 200):
+        sink.write({"i": i, "pad": "y" * 50})
+    sink.close()
+
+    segments = sorted(tmp_path.glob("ev.*.ndjson.gz"))
+    assert segments
+    seen = []
+    for seg in segments:
+        with gzip.open(seg, "rt", encoding="utf-8") as f:
+            seen += [json.loads(l)["i"] for l in f]
+    if path.exists():
+        seen += [json.loads(l)["i"] for l in path.read_text(encoding="utf-8").splitlines()]
+    assert sorted(seen) == list(range(200))
+
+
+def test_shards_merge(tmp_path):
+    path = str(tmp_path / "ev.ndjson")
+    s = EvidenceSink(path, shard=True, flush_every=1)
+    s.write({"a": 1})
+    s.write({"a": 2})
+    assert s.path.name != "ev.ndjson" and s.path.exists()
+    assert merge_shards(path) == 2
+    assert not s.path.exists()
+    assert len((tmp_path / "ev.ndjson").read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_rotated_segment_is_compressed_outside_the_lock(tmp_path, monkeypatch):
+    import fcntl
+    import os
+    from pudao.evidence import sink as sink_mod
+
+    path = tmp_path / "ev.ndjson"
+    held = []
+
+    def probe(seg, method):
+        # 压缩时其它进程应能立即拿到当前文件的锁
+        fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            held.append(True)
+        except BlockingIOError:
+            held.append(False)
+        finally:
+            os.close(fd)
+        return seg
+
+    monkeypatch.setattr(sink_mod, "compress_segment", probe)
+    s = EvidenceSink(str(path), flush_every=1, flush_interval_s=0, rotate_bytes=10, compress="gzip")
+    s.write({"i": 1, "pad": "z" * 20})
+    s.close()
+    assert held == [True]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_exit_flush_compresses_synchronously(tmp_path, monkeypatch):
+    from pudao.evidence import sink as sink_mod
+
+    def no_thread(*a, **kw):
+        raise AssertionError("no compression thread at interpreter exit")
+
+    path = str(tmp_path / "ev.ndjson")
+    monkeypatch.setattr(sink_mod, "_sinks", {})
+    s = sink_mod.get_sink(path)
+    s.flush_every, s.flush_interval_s, s.rotate_bytes, s.compress = 1 << 30, 60, 10, "gzip"
+    s.write({"i": 1, "pad": "z" * 20})
+    monkeypatch.setattr(sink_mod.threading, "Thread", no_thread)
+    sink_mod._close_all_at_exit()  # atexit 钩子：落盘触发轮转
+    gz = list(tmp_path.glob("ev.*.ndjson.gz"))
+    assert len(gz) == 1 and json.loads(gzip.decompress(gz[0].read_bytes()))["i"] == 1
+    assert [p.name for p in tmp_path.iterdir() if p.name != "ev.ndjson"] == [gz[0].name]
@@ -0,0 +1,64 @@
+# tests/test_evidence_stats.py
+import gzip
+import json
+import random
+
+from pudao.evidence.stats import EvidenceStats, QuantileSketch, compare_runs, iter_records
+
+
+def test_sketch_relative_error_and_merge():
+    rnd = random.Random(7)
+    vals = [rnd.lognormvariate(1.0, 1.2) for _ in range(5000)]
+    a, b = QuantileSketch(0.01), QuantileSketch(0.01)
+    for i, v in enumerate(vals):
+        (a if i % 2 else b).add(v)
+    a.merge(b)
+    exact = sorted(vals)
+    for q in (0.5, 0.95, 0.99):
+        true = exact[int(q * (len(exact) - 1))]
+        assert abs(a.quantile(q) - true) / true < 0.03
+    assert a.count == 5000 and a.max == exact[-1]
+
+
+def _rec(run, total, status="sat"):
+    return {"run_id": run, "label": None, "verdict": {"status": status},
+            "timings_ms": {"total_ms": total, "smt_ms": total / 2}}
+
+
+def test_grouping_over_gz_segments_and_compare(tmp_path):
+    seg = tmp_path / "ev.20260101T000000Z.1.ndjson.gz"
+    with gzip.open(seg, "wt", encoding="utf-8") as f:
+        for i in range(100):
+            f.write(json.dumps(_rec("base", 10.0 + i % 3)) + "\n")
+    cur = tmp_path / "ev.ndjson"
+    cur.write_text("".join(json.dumps(_rec("new", 15.0, "unsat")) + "\n" for _ in range(50))
+                   + '{"truncated', encoding="utf-8")
+    paths = [str(seg), str(cur)]
+
+    rep = EvidenceStats(("run_id", "status")).add_all(iter_records(paths)).report()
+    assert [(g["group"]["run_id"], g["records"]) for g in rep] == [("base", 100), ("new", 50)]
+    assert abs(rep[1]["phases"]["total_ms"]["p50"] - 15.0) / 15.0 < 0.01
+
+    cmp = compare_runs(paths, "base", "new", threshold=0.2)
+    flagged = {(r["phase"], r["quantile"]) for r in cmp["regressions"]}
+    assert ("total_ms", "p50") in flagged and ("smt_ms", "p50") in flagged
+
+
+def test_default_inputs_and_damaged_segments(tmp_path):
+    from pudao.evidence.stats import default_inputs
+
+    cur = tmp_path / "ev.ndjson"
+    cur.write_text(json.dumps(_rec("r", 5.0)) + "\n", encoding="utf-8")
+    good = tmp_path / "ev.20260101T000000123456Z.7.ndjson.gz"
+    good.write_bytes(gzip.compress(("".join(json.dumps(_rec("r", 5.0)) + "\n" for _ in range(3))).encode()))
+    # 截断的 .gz、压缩中的临时文件、未合并的进程分片
+    (tmp_path / "ev.20260101T000001000000Z.7.ndjson.gz").write_bytes(good.read_bytes()[:-12])
+    (tmp_path / "ev.20260101T000002000000Z.7.ndjson.gz.7.tmp").write_bytes(b"\x1f\x8b partial")
+    (tmp_path / "ev.4242.ndjson").write_text(json.dumps(_rec("r", 5.0)), encoding="utf-8")
+    paths = default_inputs(str(cur))
+    assert [p.rsplit("/", 1)[1] for p in paths] == [
+        "ev.20260101T000000123456Z.7.ndjson.gz", "ev.20260101T000001000000Z.7.ndjson.gz", "ev.ndjson"]
+    (tmp_path / "ev.20260101T000003000000Z.7.ndjson.gz").write_bytes(b"not gzip at all")
+    recs = list(iter_records(default_inputs(str(cur))))
+    assert 4 <= len(recs) <= 7  # 损坏的分段不中断读取
+    assert recs[-1] == _rec("r", 5.0)
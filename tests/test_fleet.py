@@ -0,0 +1,89 @@
+# tests/test_fleet.py
+from time import perf_counter
+
+from pudao.gate.fleet import FleetStore, admit_file, summarize
+from tests._helpers import BASE, VSL, strategy_ir
+
+RM = BASE / "examples" / "strategy-cd-ring-incident-rm-vms.yaml"
+
+
+def _vsl(sid: str, values) -> dict:
+    acts = [{"type": "vsl", "segment_id": s, "value": v} for s, v in values.items()]
+    return summarize(strategy_ir(VSL, strategy_id=sid, actions=acts,
+                                 scope={"roadchain_id": "rc-cd-ring-se", "segments": list(values)}))
+
+
+def test_conflicts_on_shared_ramp_vms_and_boundary():
+    fleet = FleetStore(None)
+    rm = summarize(strategy_ir(RM))
+    assert fleet.admit(rm)["admitted"]
+
+    other = summarize(strategy_ir(RM, strategy_id="rm-2", actions=[
+        {"type": "ramp_metering", "ramp_id": "ramp-ne-201-in", "veh_per_hour": 300},
+        {"type": "vms_message", "vms_id": "vms-ne-150-bypass", "text": "绕行"},
+    ]))
+    out = fleet.admit(other)
+    assert not out["admitted"] and out["overlapping"] == [rm["strategy_id"]]
+    assert any(c.startswith("fleet_conflict: ramp ramp-ne-201-in") for c in out["conflicts"])
+    assert any(c.startswith("fleet_conflict: vms vms-ne-150-bypass") for c in out["conflicts"])
+    assert len(fleet) == 1
+
+    assert fleet.admit(_vsl("west", {"cd-se-101": 80, "cd-se-102": 80}))["admitted"]
+    out = fleet.admit(_vsl("east", {"cd-se-103": 50, "cd-se-104": 50}))
+    assert out["conflicts"] == ["fleet_spatial_smoothness_violated: |vsl(cd-se-103)-vsl(cd-se-102)|=30 > 20 "
+                                "at boundary with west"]
+    assert fleet.admit(_vsl("east", {"cd-se-103": 70, "cd-se-104": 70}))["admitted"]
+    # 同一 strategy_id 再次准入视为替换，不与自身比较
+    assert fleet.admit(_vsl("west", {"cd-se-101": 90, "cd-se-102": 90}))["replaced"]
+    assert fleet.retire("east") and not fleet.retire("east")
+    assert fleet.admit(_vsl("east2", {"cd-se-103": 60}))["conflicts"]
+
+
+def test_journal_is_shared_and_replayed(tmp_path):
+    j = str(tmp_path / "fleet.ndjson")
+    a, b = FleetStore(j), FleetStore(j)
+    assert a.admit(_vsl("west", {"cd-se-101": 80, "cd-se-102": 80}))["admitted"]
+    # 另一实例（另一进程）准入前先追平 journal，看到 west
+    assert not b.admit(_vsl("dup", {"cd-se-102": 70}))["admitted"]
+    assert b.retire("west")
+    assert a.admit(_vsl("dup", {"cd-se-102": 70}))["admitted"]
+    assert [s["strategy_id"] for s in FleetStore(j).active()] == ["dup"]
+
+
+def test_admit_cost_tracks_overlap_not_fleet_size(tmp_path):
+    fleet = FleetStore(None)
+    for i in range(3000):
+        fleet.admit({"strategy_id": f"s{i}", "version": "1", "roadchain_id": "rc", "max_delta": 20,
+                     "vsl": {f"x{i}": 80}, "ramps": {f"r{i}": ["ramp_metering"]}, "vms": [f"v{i}"]})
+    t0 = perf_counter()
+    out = fleet.admit({"strategy_id": "new", "version": "1", "roadchain_id": "rc", "max_delta": 20,
+                       "vsl": {"x7": 80}, "ramps": {"r9": ["ramp_closure"]}, "vms": []})
+    assert (perf_counter() - t0) < 0.05
+    assert out["overlapping"] == ["s7", "s9"] and len(out["conflicts"]) == 1
+
+
+def test_admit_file_runs_formal_gate_first(tmp_path, monkeypatch):
+    monkeypatch.setattr("pudao.gate.fleet._default", FleetStore(None))
+    fleet = FleetStore(str(tmp_path / "fleet.ndjson"))
+    out = admit_file(str(VSL), fleet)
+    assert out["allow"] and out["fleet"]["admitted"]
+    # 空库也是调用方指定的库（FleetStore 定义了 __len__，不能按真值回退到默认库）
+    assert not out["fleet"]["replaced"] and (tmp_path / "fleet.ndjson").exists()
+    assert [s["strategy_id"] for s in FleetStore(str(tmp_path / "fleet.ndjson")).active()] == ["cd-ring-vsl-ampeak-001"]
+    bad = tmp_path / "bad.yaml"
+    bad.write_text(VSL.read_text(encoding="utf-8").replace("value: 70", "value: 30"), encoding="utf-8")
+    out = admit_file(str(bad), fleet)
+    assert out["fleet"] == {"admitted": False, "reason": "formal_gate_rejected"}
+
+
+def test_admit_file_reads_strategy_once(tmp_path, monkeypatch):
+    from pudao.dsl import parser
+
+    reads = []
+    real = parser.read_input
+    monkeypatch.setattr(parser, "read_input", lambda p: reads.append(p) or real(p))
+    monkeypatch.setattr("pudao.gate.formal_gate.read_input", parser.read_input)
+    monkeypatch.setattr("pudao.gate.fleet._default", FleetStore(None))
+    out = admit_file(str(VSL), FleetStore(str(tmp_path / "fleet.ndjson")))
+    assert out["fleet"]["admitted"] and "fleet_summary" not in out
+    assert reads == [str(VSL)]
@@ -0,0 +1,46 @@
+# tests/test_formal_batch.py
+import io
+import json
+from pathlib import Path
+
+from pudao.gate.batch import expand_inputs, run_batch
+
+BASE = Path(__file__).resolve().parents[1]
+
+
+def test_batch_input_order_and_bulk_evidence(tmp_path):
+    ev = tmp_path / "ev.ndjson"
+    out = io.StringIO()
+    summary = run_batch(
+        [str(BASE / "examples"), str(BASE / "examples" / "*.yaml"), str(tmp_path / "missing.yaml")],
+        workers=2, ordered=True, timeout_s=30, out=out, evidence_path=str(ev),
+    )
+    lines = [json.loads(l) for l in out.getvalue().splitlines()]
+    # 目录 + 通配符重复的文件只校验一次
+    assert summary == {"total": 3, "sat": 1, "unsat": 2, "unknown": 0}
+    assert [l["index"] for l in lines] == [0, 1, 2]
+    assert lines[2]["details"]["I1_structure"] == "fail"
+    assert len(ev.read_text(encoding="utf-8").splitlines()) == 3
+
+
+def test_expand_inputs_directory_filters_suffix(tmp_path):
+    (tmp_path / "a.yaml").write_text("x: 1", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("", encoding="utf-8")
+    assert expand_inputs([str(tmp_path)]) == [str(tmp_path / "a.yaml")]
+
+
+def test_timeout_during_parse_is_unknown(monkeypatch):
+    from time import sleep
+
+    from pudao.gate import batch, formal_gate
+
+    real = formal_gate.ir_from_blob
+
+    def slow(blob):
+        sleep(2)
+        return real(blob)
+
+    monkeypatch.setattr(formal_gate, "ir_from_blob", slow)
+    res, rec = batch.check_one(str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"), timeout_s=0.1)
+    assert res["status"] == "unknown" and res["reasons"] == ["timeout: exceeded 0.1s"]
+    assert "hints" not in res and rec["verdict"]["status"] == "unknown"
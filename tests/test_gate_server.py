@@ -0,0 +1,78 @@
+# tests/test_gate_server.py
+import asyncio
+import json
+from pathlib import Path
+
+from pudao.gate.server import GateServer
+
+BASE = Path(__file__).resolve().parents[1]
+
+
+async def _roundtrip(sock_path: str, reqs):
+    reader, writer = await asyncio.open_unix_connection(sock_path)
+    out = []
+    for r in reqs:
+        writer.write((json.dumps(r) + "\n").encode("utf-8"))
+        await writer.drain()
+        out.append(json.loads(await reader.readline()))
+    writer.close()
+    return out
+
+
+async def _http_get(port: int, path: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode("ascii"))
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_serve_socket_and_http_metrics(tmp_path):
+    sock = str(tmp_path / "gate.sock")
+
+    async def run():
+        srv = GateServer(workers=1, write_evidence=False)
+        await srv.start(socket_path=sock, http_port=0)
+        try:
+            vsl = str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml")
+            res, bad = await _roundtrip(sock, [{"path": vsl}, {"op": "check"}])
+            status, metrics = await _http_get(srv.http_port, "/metrics")
+            return res, bad, status, metrics
+        finally:
+            await srv.close()
+
+    res, bad, status, metrics = asyncio.run(run())
+    assert res["status"] == "sat"
+    assert "path" in bad["error"]
+    assert status == 200
+    assert metrics["counts"]["sat"] == 1 and metrics["latency_ms"]["p50"] is not None
+
+
+def test_serve_admit_and_retire(tmp_path, monkeypatch):
+    from pudao.gate import fleet
+
+    monkeypatch.setattr(fleet, "_default", fleet.FleetStore(None))
+    sock = str(tmp_path / "gate.sock")
+
+    async def run():
+        srv = GateServer(workers=1, write_evidence=False)
+        await srv.start(socket_path=sock)
+        try:
+            vsl = str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml")
+            return await _roundtrip(sock, [{"op": "admit", "path": vsl}, {"op": "fleet"}])
+        finally:
+            await srv.close()
+
+    admitted, listing = asyncio.run(run())
+    assert admitted["fleet"]["admitted"] and "fleet_summary" not in admitted
+    sid = listing["active"][0]["strategy_id"]
+
+    async def retire():
+        srv = GateServer(workers=1, write_evidence=False)
+        try:
+            return await srv.dispatch({"op": "retire", "strategy_id": sid})
+        finally:
+            await srv.close()
+
+    assert asyncio.run(retire()) == (200, {"strategy_id": sid, "retired": True})
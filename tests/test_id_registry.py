@@ -0,0 +1,58 @@
+# tests/test_id_registry.py
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from pudao.dsl import id_registry as reg_mod
+from pudao.dsl.id_registry import IDRegistry, compile_inventory, load_inventory_file
+from pudao.dsl.parser import load_strategy_ir, validate_ids
+
+BASE = Path(__file__).resolve().parents[1]
+
+
+def test_packed_lookup_and_batch():
+    segs = [f"seg-{i:06d}" for i in range(0, 20000, 2)]
+    reg = IDRegistry.from_ids(segments=segs, ramps=["r1"], vms=["路牌-1"])
+    assert reg.is_valid_segment("seg-000010") and not reg.is_valid_segment("seg-000011")
+    assert reg.is_valid_vms("路牌-1") and not reg.is_valid_ramp("r2")
+    refs = [("segment", "seg-000011"), ("segment", "seg-000002"), ("ramp", "r2"), ("segment", "seg-000011")]
+    assert reg.validate_ids(refs) == [("segment", "seg-000011"), ("ramp", "r2"), ("segment", "seg-000011")]
+
+
+def test_compiled_idx_matches_text(tmp_path):
+    src = tmp_path / "inv.json"
+    src.write_text(json.dumps({"segments": ["b", "a", "a"], "ramps": ["r"], "vms": []}))
+    counts = compile_inventory(str(src), str(tmp_path / "inv.idx"))
+    assert counts == {"segment": 2, "ramp": 1, "vms": 0}
+    mm = load_inventory_file(str(tmp_path / "inv.idx"))
+    txt = load_inventory_file(str(src))
+    assert list(mm.tables["segment"]) == ["a", "b"]
+    assert mm.fingerprint() == txt.fingerprint()
+    mm.close()
+
+
+def test_hot_reload(tmp_path, monkeypatch):
+    inv = tmp_path / "inv.txt"
+    inv.write_text("segment a\n")
+    monkeypatch.setattr(reg_mod, "INVENTORY_CHECK_S", 0.0)
+    reg_mod.reload_id_registry(str(inv))
+    try:
+        old = reg_mod.get_id_registry()
+        assert old.is_valid_segment("a") and not old.is_valid_segment("b")
+        inv.write_text("segment a\nsegment b\n")
+        os.utime(inv, ns=(1, 1))  # 保证 mtime 变化
+        new = reg_mod.get_id_registry()
+        assert new is not old and new.is_valid_segment("b")
+        assert not old.is_valid_segment("b")  # 旧快照不变
+    finally:
+        reg_mod.reload_id_registry(reg_mod.DEFAULT_INVENTORY_FILE)
+
+
+def test_validate_ids_reports_first_bad_reference():
+    ir = load_strategy_ir(str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"))
+    ir.scope.segments.append("nope-1")
+    ir.actions[0].segment_id = "nope-0"
+    with pytest.raises(ValueError, match="invalid_reference: segment nope-1"):
+        validate_ids(ir)
@@ -0,0 +1,92 @@
+# tests/test_incremental.py
+import random
+from collections import Counter
+from pathlib import Path
+
+import yaml
+
+from pudao.dsl.models import StrategyIR
+from pudao.gate import cache, revisions
+from pudao.gate.formal_gate import check_formal_file
+from pudao.smt.solver import check_formal_with_smt
+
+BASE = Path(__file__).resolve().parents[1]
+VSL = BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"
+SEGS = ["cd-se-101", "cd-se-102", "cd-se-103", "cd-se-104"]
+RAMPS = ["ramp-ne-201-in", "ramp-ne-202-in"]
+
+
+def _random_ir(rnd: random.Random, version: str) -> StrategyIR:
+    doc = yaml.safe_load(VSL.read_text(encoding="utf-8"))
+    doc["version"] = version
+    doc["guardrails"]["max_closure_s"] = 900
+    acts = [{"type": "vsl", "segment_id": s, "value": rnd.choice((60, 70, 80, 90, 100, 110))}
+            for s in SEGS if rnd.random() < 0.6]
+    for r in RAMPS:
+        if rnd.random() < 0.5:
+            acts.append({"type": "ramp_metering", "ramp_id": r, "veh_per_hour": 400})
+        if rnd.random() < 0.3:
+            acts.append({"type": "ramp_closure", "ramp_id": r, "max_duration_s": 600})
+    if rnd.random() < 0.3:
+        acts.append({"type": "vms_message", "vms_id": "vms-ne-201-main", "text": "减速慢行"})
+    doc["actions"] = acts
+    return StrategyIR.parse_obj(doc)
+
+
+def _edit(rnd: random.Random, ir: StrategyIR, version: str) -> StrategyIR:
+    d = ir.dict()
+    d["version"] = version
+    acts = d["actions"]
+    for _ in range(rnd.randint(1, 2)):
+        op = rnd.random()
+        if op < 0.4 and acts:
+            acts.pop(rnd.randrange(len(acts)))
+        elif op < 0.8:
+            acts.append({"type": "vsl", "segment_id": rnd.choice(SEGS), "value": rnd.choice((60, 80, 100))})
+        else:
+            acts.append({"type": "ramp_closure", "ramp_id": rnd.choice(RAMPS), "max_duration_s": 300})
+    return StrategyIR.parse_obj(d)
+
+
+def test_incremental_matches_full_reverification():
+    rnd = random.Random(11)
+    modes = Counter()
+    for i in range(80):
+        v1 = _random_ir(rnd, "1")
+        rev = {}
+        first = check_formal_with_smt(v1, revision=rev)
+        prior = {"version": "1", "ir": v1, "rules": rev["rules"], "smt": rev["smt"]}
+        v2 = _edit(rnd, v1, "2")
+        inc = check_formal_with_smt(v2, prior=prior)
+        full = check_formal_with_smt(v2)
+        assert inc["status"] == full["status"], (v1, v2)
+        assert Counter(inc["reasons"]) == Counter(full["reasons"]), (v1, v2)
+        assert inc["incremental"]["base_version"] == "1"
+        modes[inc["incremental"]["smt"]] += 1
+        assert first["status"] in ("sat", "unsat")
+    # 随机编辑应覆盖跳过 / 复用 / 热启动等多种 SMT 路径
+    assert len(modes) >= 3, modes
+
+
+def test_gate_reports_reverified_scope(tmp_path, monkeypatch):
+    monkeypatch.setattr(revisions, "_default", revisions.RevisionStore(str(tmp_path / "rev")))
+    monkeypatch.setattr(cache, "_default", cache.VerdictCache(str(tmp_path / "verdicts")))
+    doc = yaml.safe_load(VSL.read_text(encoding="utf-8"))
+    doc["strategy_id"] = "incremental-gate-test"
+    p1 = tmp_path / "v1.yaml"
+    p1.write_text(yaml.safe_dump(doc, allow_unicode=True), encoding="utf-8")
+    r1 = check_formal_file(str(p1), write_evidence=False)
+    assert "incremental" not in r1
+
+    doc["version"] = "0.1.1"
+    doc["actions"][3]["value"] = 100  # 104: 70 -> 100，与 103=70 相差 30
+    p2 = tmp_path / "v2.yaml"
+    p2.write_text(yaml.safe_dump(doc, allow_unicode=True), encoding="utf-8")
+    r2 = check_formal_file(str(p2), write_evidence=False)
+    inc = r2["incremental"]
+    assert inc["base_version"] == "0.1.0"
+    assert inc["segments"] == ["cd-se-104"] and inc["actions_added"] == 1
+    assert inc["neighbourhood_segments"] == 2
+    assert "I2_spatial" in inc["rules_rechecked"] and "I5_rollback" in inc["rules_rerun"]
+    assert r2["status"] == "unsat"
+    assert any("spatial_smoothness_violated" in r for r in r2["reasons"])
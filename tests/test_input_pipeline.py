@@ -0,0 +1,49 @@
+# tests/test_input_pipeline.py
+import hashlib
+import json
+from pathlib import Path
+
+from pudao.dsl import parser
+from pudao.evidence.evidence import build_formal_record
+from pudao.gate.formal_gate import check_formal_file
+
+BASE = Path(__file__).resolve().parents[1]
+
+
+def test_read_once_hash_flows_into_evidence(tmp_path):
+    src = BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"
+    res = check_formal_file(str(src), write_evidence=False, use_cache=False)
+    digest = hashlib.sha256(src.read_bytes()).hexdigest()
+    assert res["input"] == {"exists": True, "size": src.stat().st_size, "sha256": digest}
+
+    # evidence 直接使用结果中的哈希：即使文件随后被删除，记录也不变
+    tmp = tmp_path / "s.yaml"
+    tmp.write_bytes(src.read_bytes())
+    res2 = check_formal_file(str(tmp), write_evidence=False, use_cache=False)
+    tmp.unlink()
+    assert build_formal_record(str(tmp), res2)["input"]["sha256"] == digest
+
+
+def test_bom_json_and_mmap_paths(tmp_path, monkeypatch):
+    doc = {"strategy_id": "s", "version": "1"}
+    j = tmp_path / "a.json"
+    j.write_bytes(b"\xef\xbb\xbf" + json.dumps(doc).encode("utf-8"))
+    assert parser.load_raw(str(j)) == doc
+
+    monkeypatch.setattr(parser, "MMAP_THRESHOLD_BYTES", 1)
+    y = tmp_path / "a.yaml"
+    y.write_bytes(b"\xef\xbb\xbfstrategy_id: s\nversion: '1'\n")
+    blob = parser.read_input(str(y))
+    assert blob._mm is not None
+    assert parser.parse_blob(blob) == doc
+    blob.release()
+    assert parser.load_raw(str(j)) == doc
+
+    blank = tmp_path / "b.yaml"
+    blank.write_bytes(b"\xef\xbb\xbf  \n")
+    try:
+        parser.load_raw(str(blank))
+    except ValueError as e:
+        assert "empty_or_null_document" in str(e)
+    else:
+        raise AssertionError("blank document accepted")
@@ -0,0 +1,38 @@
+# tests/test_invariants.py
+from pathlib import Path
+
+from pudao.dsl.parser import load_strategy_ir
+from pudao.smt import invariants
+from pudao.smt.invariants import register_rule, registered_rules, run_all_invariants
+
+BASE = Path(__file__).resolve().parents[1]
+
+
+def test_fused_engine_rule_timings_and_fail_fast():
+    ir = load_strategy_ir(str(BASE / "examples" / "strategy-cd-ring-incident-rm-vms.yaml"))
+    ir.rollout.max_revert_time_s = None  # 在 I6 冲突之外再制造一条 I5 违规
+
+    timings = {}
+    errs = run_all_invariants(ir, timings=timings)
+    assert any("mutually_exclusive_actions" in e for e in errs)
+    assert any("rollback_missing_or_infinite" in e for e in errs)
+    assert {f"inv_{r}_ms" for r in registered_rules()} <= set(timings)
+
+    # fail-fast：I6 命中后不再执行 I5
+    ff = run_all_invariants(ir, fail_fast=True)
+    assert ff and all("mutually_exclusive_actions" in e for e in ff)
+
+
+def test_site_specific_rule_registration():
+    @register_rule("SITE_vms_text_len")
+    def _vms_len(ir, idx):
+        return [f"site_rule_violated: vms text too long at action {i}"
+                for i in idx.by_type.get("vms_message", []) if len(ir.actions[i].text or "") > 12]
+
+    try:
+        ir = load_strategy_ir(str(BASE / "examples" / "strategy-cd-ring-incident-rm-vms.yaml"))
+        errs = run_all_invariants(ir)
+        assert "site_rule_violated: vms text too long at action 3" in errs
+        assert registered_rules()[-1] == "SITE_vms_text_len"
+    finally:
+        invariants._RULES[:] = [r for r in invariants._RULES if r[0] != "SITE_vms_text_len"]
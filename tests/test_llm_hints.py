@@ -0,0 +1,119 @@
+# tests/test_llm_hints.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+
+import pytest
+
+from pudao.hints import llm, suggester
+from pudao.hints.llm import HintCache, LLMHinter, http_chat_client
+
+
+class _Stub(BaseHTTPRequestHandler):
+    delay_s = 0.3
+    calls = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).calls += 1
+        sleep(self.delay_s)
+        text = "润色：" + body["messages"][-1]["content"][-8:]
+        data = json.dumps({"choices": [{"message": {"content": text}}]}, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub_url():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    _Stub.calls, _Stub.delay_s = 0, 0.3
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}/v1/chat/completions"
+    srv.shutdown()
+
+
+def test_async_coalesced_and_persisted(stub_url, tmp_path):
+    hinter = LLMHinter(http_chat_client(stub_url), HintCache(str(tmp_path)), workers=2, timeout_s=5)
+    t0 = perf_counter()
+    states = [hinter.submit("k1", "同一失败") for _ in range(5)]
+    assert perf_counter() - t0 < 0.1  # 不等待远端
+    assert all(s == ("pending", None) for s in states)
+    assert hinter.status("k1", wait_s=5)["status"] == "ready"
+    assert _Stub.calls == 1 and hinter.counts["coalesced"] == 4
+    hinter.close()
+    # 新进程（新实例）直接命中持久缓存
+    again = LLMHinter(http_chat_client(stub_url), HintCache(str(tmp_path)))
+    assert again.submit("k1", "同一失败")[0] == "ready" and _Stub.calls == 1
+    again.close()
+
+
+def test_timeout_is_not_cached_and_queue_is_bounded(stub_url, tmp_path):
+    _Stub.delay_s = 1.0
+    hinter = LLMHinter(http_chat_client(stub_url), HintCache(str(tmp_path)), workers=1,
+                       max_queue=2, timeout_s=0.2)
+    assert hinter.submit("a", "x")[0] == "pending"
+    assert hinter.submit("b", "y")[0] == "pending"
+    assert hinter.submit("c", "z")[0] == "dropped"
+    assert hinter.status("a", wait_s=2)["status"] == "error"
+    assert HintCache(str(tmp_path)).get("a") is None
+    hinter.close()
+
+
+def test_hints_payload_returns_immediately(monkeypatch, tmp_path):
+    calls = []
+
+    def slow(prompt, timeout_s):
+        calls.append(prompt)
+        sleep(0.3)
+        return "润色后的提示"
+
+    monkeypatch.setattr(suggester, "HINTS_USE_LLM", True)
+    llm.set_client(slow)
+    monkeypatch.setattr(llm, "_default", LLMHinter(slow, HintCache(str(tmp_path))))
+    try:
+        result = {"status": "unsat", "reasons": ["mutually_exclusive_actions: ramp r1 metering+closure"],
+                  "details": {"I6_conflict": "fail"}}
+        t0 = perf_counter()
+        p = suggester.make_hints_payload(result)
+        assert perf_counter() - t0 < 0.1
+        assert p["deterministic"] and p["llm"] is None and p["llm_status"] == "pending"
+        assert llm.hint_status(p["llm_key"], wait_s=2)["text"] == "润色后的提示"
+        assert suggester.make_hints_payload(result)["llm"] == "润色后的提示"
+        assert len(calls) == 1
+    finally:
+        llm.set_client(None)
+
+
+def test_hint_status_validates_key_and_polls_shared_cache(monkeypatch, tmp_path):
+    with pytest.raises(ValueError, match="invalid_hint_key"):
+        llm.hint_status("../../etc/passwd")
+    monkeypatch.setattr(llm, "HINTS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(llm, "HINTS_MAX_WAIT_S", 0.2)
+    key = "0123456789abcdef"
+    t0 = perf_counter()
+    assert llm.hint_status(key, wait_s=1e9)["status"] == "unknown"
+    assert perf_counter() - t0 < 1.0  # wait_s 被截断
+    # 其它进程（这里用线程模拟）稍后写入持久缓存：轮询可见
+    threading.Timer(0.05, HintCache(str(tmp_path)).put, (key, "来自 worker")).start()
+    assert llm.hint_status(key, wait_s=1)["text"] == "来自 worker"
+
+
+def test_server_rejects_bad_hint_key_and_requires_cache(monkeypatch):
+    import asyncio
+
+    from pudao.gate.server import GateServer
+
+    srv = GateServer(workers=1, write_evidence=False)
+    status, body = asyncio.run(srv.dispatch({"op": "hint", "key": "../x"}))
+    assert status == 400 and body["error"].startswith("invalid_hint_key")
+    monkeypatch.setattr(suggester, "HINTS_USE_LLM", True)
+    monkeypatch.setattr(llm, "HINTS_CACHE_DIR", "")
+    with pytest.raises(ValueError, match="hints_cache_required"):
+        asyncio.run(srv.start())
@@ -0,0 +1,46 @@
+# tests/test_profile.py
+import tracemalloc
+from pathlib import Path
+
+from pudao.evidence import profile
+from pudao.evidence.evidence import build_formal_record
+from pudao.gate.formal_gate import check_formal_file
+from pudao.smt import budget
+from tests._helpers import sandwich_ir
+
+
+def _sandwich(tmp_path) -> Path:
+    # 与 test_unsat_core 相同的 unsat 策略（SMT_ENGINE=z3 时经 Z3 判定）
+    p = tmp_path / "sandwich.json"
+    p.write_text(sandwich_ir().json(exclude_none=True), encoding="utf-8")
+    return p
+
+
+def test_profile_artifact_has_phases_cpu_and_z3(monkeypatch, tmp_path):
+    monkeypatch.setattr(budget, "SMT_ENGINE", "z3")
+    monkeypatch.setattr(profile, "PROFILE_DIR", str(tmp_path / "profiles"))
+    src = _sandwich(tmp_path)
+    res = check_formal_file(str(src), write_evidence=False, profile=True)
+    assert res["status"] == "unsat" and "cache" not in res  # 剖析模式总是完整校验
+    assert not tracemalloc.is_tracing()
+
+    summary = res["profile"]
+    assert summary["peak_kib"] > 0 and summary["cpu_s"] > 0
+    assert summary["z3"]["core_minimize"]["conflicts"] >= 1
+    assert build_formal_record(str(src), res)["profile"]["artifact"] == summary["artifact"]
+
+    art = profile.load_profile(summary["artifact"])
+    phases = {p["name"]: p for p in art["phases"]}
+    for name in ("formal_check", "parse", "schema", "ir", "solver", "encode", "z3_check", "core_minimize"):
+        assert "peak_kib" in phases[name], name
+    assert phases["formal_check"]["peak_kib"] >= phases["parse"]["peak_kib"]
+    assert art["cpu"]["functions"] and "pudao" in art["cpu"]["by_package"]
+    assert "memory" in art["z3"]["z3_check"]
+
+    text = profile.format_profile(art, top=5, sort="cumtime")
+    assert "top 5 by cumtime:" in text and "z3 z3_check:" in text
+
+
+def test_profile_off_by_default(tmp_path):
+    res = check_formal_file(str(_sandwich(tmp_path)), write_evidence=False, use_cache=False)
+    assert "profile" not in res
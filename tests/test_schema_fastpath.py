@@ -0,0 +1,57 @@
+# tests/test_schema_fastpath.py
+import copy
+from pathlib import Path
+
+import pytest
+
+from pudao.dsl import parser
+from pudao.dsl.schema_compiler import load_compiled_validator
+
+BASE = Path(__file__).resolve().parents[1]
+EXAMPLES = sorted((BASE / "examples").glob("*.yaml"))
+
+
+def _mutations(doc):
+    """在合法文档上做各类破坏，覆盖 schema 中每种关键字。"""
+    yield doc
+    for k in ("strategy_id", "scope", "actions", "guardrails", "rollout"):
+        d = copy.deepcopy(doc); d.pop(k); yield d
+    d = copy.deepcopy(doc); d["extra"] = 1; yield d                       # additionalProperties
+    d = copy.deepcopy(doc); d["strategy_id"] = ""; yield d                # minLength
+    d = copy.deepcopy(doc); d["version"] = 1; yield d                     # type
+    d = copy.deepcopy(doc); d["actions"] = []; yield d                    # minItems
+    d = copy.deepcopy(doc); d["actions"][0]["type"] = "fly"; yield d      # enum
+    d = copy.deepcopy(doc); d["actions"][0]["ttl_s"] = -1; yield d        # minimum
+    d = copy.deepcopy(doc); d["actions"][0]["value"] = True; yield d      # bool 不是 number
+    d = copy.deepcopy(doc); d["actions"][0]["foo"] = "x"; yield d         # 允许的额外字段
+    d = copy.deepcopy(doc); d["scope"]["segments"] = [1]; yield d         # items
+    d = copy.deepcopy(doc); d["guardrails"]["max_delta"] = 1; yield d     # int 也是 number
+    d = copy.deepcopy(doc); d["rollout"]["mode"] = "slow"; yield d
+    d = copy.deepcopy(doc); d["metadata"] = []; yield d
+
+
+@pytest.mark.parametrize("src", EXAMPLES, ids=lambda p: p.name)
+def test_compiled_validator_agrees_with_jsonschema(src, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fast = load_compiled_validator(parser._load_schema())
+    assert not list(tmp_path.rglob("*.py"))  # 只在内存中编译，不落盘
+    doc = parser.load_raw(str(src))
+    for d in _mutations(doc):
+        assert fast(d) == parser.get_validator().is_valid(d)
+
+
+@pytest.mark.parametrize("src", EXAMPLES, ids=lambda p: p.name)
+def test_trusted_ir_matches_parse_obj(src):
+    raw = parser.load_raw(str(src))
+    raw["actions"][0]["note"] = "extra fields are dropped"
+    trusted, full = parser.to_ir_trusted(raw), parser.to_ir(raw)
+    assert trusted == full
+    assert trusted.json(sort_keys=True) == full.json(sort_keys=True)
+
+
+def test_trusted_ir_defers_semantic_errors_to_pydantic():
+    raw = parser.load_raw(str(EXAMPLES[0]))
+    raw["actions"] = [{"type": "vsl", "value": 60}]  # schema 合法，但缺 segment_id
+    assert parser.schema_is_valid(raw)
+    with pytest.raises(ValueError, match="vsl action requires segment_id"):
+        parser.to_ir_trusted(raw)
@@ -0,0 +1,41 @@
+# tests/test_smt_fastpath.py
+from pudao.dsl.models import StrategyIR
+from pudao.dsl.parser import load_strategy_ir
+from pudao.smt import solver
+from pudao.smt.ground import ground_status
+from tests._helpers import BASE, VSL, strategy_ir
+
+CONFLICT = BASE / "examples" / "strategy-cd-ring-incident-rm-vms.yaml"
+
+
+def _free_102() -> StrategyIR:
+    return strategy_ir(actions=[a for a in strategy_ir().dict()["actions"] if a["segment_id"] != "cd-se-102"])
+
+
+def test_ground_status_mirrors_static_encoding():
+    ir = load_strategy_ir(str(VSL))
+    assert ground_status(ir) == "sat"
+    d = ir.dict()
+    d["guardrails"]["max_delta"] = 5  # 102=80 与 103=70 相邻
+    assert ground_status(StrategyIR.parse_obj(d)) == "unsat"
+    assert ground_status(_free_102()) is None
+
+
+def test_ground_and_violations_skip_z3():
+    res = solver.check_formal_with_smt(load_strategy_ir(str(VSL)))
+    assert res["status"] == "sat" and res["solver"] == {"fast_path": "ground"}
+
+    res = solver.check_formal_with_smt(load_strategy_ir(str(CONFLICT)))
+    assert res["status"] == "unsat" and res["solver"]["fast_path"] == "violations"
+    assert "config" not in res["solver"]
+
+    res = solver.check_formal_with_smt(_free_102())
+    assert res["status"] == "sat" and "fast_path" not in res["solver"]
+
+
+def test_cross_check_runs_z3_and_records_agreement(monkeypatch):
+    monkeypatch.setattr(solver, "SMT_CROSSCHECK_RATE", 1.0)
+    res = solver.check_formal_with_smt(load_strategy_ir(str(VSL)))
+    assert res["status"] == "sat"
+    assert res["solver"]["config"] == "default"
+    assert res["solver"]["cross_check"] == {"expected": "sat", "smt": "sat", "agree": True}
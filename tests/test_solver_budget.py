@@ -0,0 +1,81 @@
+# tests/test_solver_budget.py
+from pathlib import Path
+
+import pytest
+import yaml
+
+from pudao.dsl.parser import load_strategy_ir
+from pudao.evidence.evidence import build_formal_record
+from pudao.gate.formal_gate import check_formal_file
+from pudao.smt import budget as budget_mod
+from pudao.smt.portfolio import run_portfolio
+
+BASE = Path(__file__).resolve().parents[1]
+VSL = BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"
+
+
+def test_exhausted_budget_yields_unknown_not_unsat(tmp_path, monkeypatch):
+    # 去掉 102 的 vsl：策略不再全定值，必须由 Z3 求解（静态策略默认走差分约束引擎，这里强制 Z3）
+    monkeypatch.setattr("pudao.smt.budget.SMT_ENGINE", "z3")
+    doc = yaml.safe_load(VSL.read_text(encoding="utf-8"))
+    doc["actions"] = [a for a in doc["actions"] if a["segment_id"] != "cd-se-102"]
+    path = tmp_path / "free-102.yaml"
+    path.write_text(yaml.safe_dump(doc), encoding="utf-8")
+    res = check_formal_file(str(path), write_evidence=False, use_cache=False, budget={"rlimit": 1})
+    assert res["status"] == "unknown" and res["allow"] is False
+    assert res["reasons"] and res["reasons"][0].startswith("smt_unknown:")
+    assert res["solver"]["budget"]["rlimit"] == 1
+    assert "hints" not in res
+
+
+def test_budget_rejects_unknown_fields():
+    with pytest.raises(ValueError, match="unknown budget field"):
+        budget_mod.SolverBudget.coerce({"cpu": 1})
+
+
+def test_portfolio_records_winning_config_in_evidence():
+    ir = load_strategy_ir(str(VSL))
+    out = run_portfolio(ir, ["default", "qf_lia"], {"timeout_ms": 10000}, engine="z3")
+    assert out["status"] == "sat"
+    assert out["solver"]["config"] in ("default", "qf_lia")
+    assert out["solver"]["portfolio"] == ["default", "qf_lia"]
+
+    res = {"status": "sat", "allow": True, "reasons": [], "solver": out["solver"]}
+    assert build_formal_record(str(VSL), res)["solver"]["config"] == out["solver"]["config"]
+
+
+def test_memory_cap_is_restored_after_solving(monkeypatch):
+    import z3
+    from pudao.smt.encoder import solve_detailed
+    monkeypatch.setattr("pudao.smt.budget.SMT_ENGINE", "z3")
+    before = z3.get_param("memory_max_size")
+    seen = []
+    real_check = z3.Solver.check
+
+    def check(self, *a):
+        seen.append(z3.get_param("memory_max_size"))
+        return real_check(self, *a)
+
+    monkeypatch.setattr(z3.Solver, "check", check)
+    out = solve_detailed(load_strategy_ir(str(VSL)), budget={"memory_mb": 4096})
+    assert out["status"] == "sat" and seen and set(seen) == {"4096"}
+    assert z3.get_param("memory_max_size") == before
+
+
+@pytest.mark.parametrize("field,value", [("timeout_ms", "5000"), ("timeout_ms", -1), ("rlimit", 1.5),
+                                         ("rlimit", True), ("memory_mb", -64), ("memory_mb", "64")])
+def test_request_budget_values_are_validated(field, value):
+    with pytest.raises(ValueError, match=f"invalid_budget: {field} must be a positive"):
+        budget_mod.SolverBudget.coerce({field: value})
+
+
+def test_server_rejects_bad_budget_with_400():
+    import asyncio
+
+    from pudao.gate.server import GateServer
+
+    srv = GateServer(workers=1, write_evidence=False)
+    status, body = asyncio.run(srv.dispatch({"path": "x.yaml", "budget": {"rlimit": "lots"}}))
+    assert status == 400 and body["error"].startswith("invalid_budget: rlimit")
+    b = budget_mod.SolverBudget.coerce({"timeout_ms": 250.5, "rlimit": 1000.0, "memory_mb": 0})
+    assert b.to_dict() == {"timeout_ms": 250.5, "rlimit": 1000, "memory_mb": None}
@@ -0,0 +1,33 @@
+# tests/test_startup.py
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from pudao.cli.startup import parse_importtime
+
+BASE = Path(__file__).resolve().parents[1]
+
+
+def test_schema_failure_does_not_import_z3(tmp_path):
+    bad = tmp_path / "bad.json"
+    bad.write_text('{"strategy_id": "x"}', encoding="utf-8")
+    code = (
+        "import sys, json\n"
+        "from pudao.gate.formal_gate import check_formal_file\n"
+        f"r = check_formal_file({str(bad)!r}, write_evidence=False)\n"
+        "print(json.dumps([r['status'], 'z3' in sys.modules, 'pydantic' in sys.modules]))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=str(BASE),
+                         capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == ["unsat", False, False]
+
+
+def test_parse_importtime_lines():
+    rows = parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     yaml.error\n"
+        "import time:      2000 |       2500 |   yaml\n"
+    )
+    assert rows[1] == {"module": "yaml", "self_us": 2000, "cumulative_us": 2500, "depth": 1}
+    assert rows[0]["depth"] == 2
@@ -0,0 +1,106 @@
+# tests/test_stream.py
+import json
+from pathlib import Path
+
+import pytest
+import yaml
+
+from pudao.dsl import parser, stream
+from pudao.dsl.columnar import ColumnarIR
+from pudao.gate.formal_gate import check_formal_file
+
+BASE = Path(__file__).resolve().parents[1]
+EXAMPLES = sorted((BASE / "examples").glob("*.yaml"))
+VSL = BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"
+
+
+def _write(tmp_path, doc, suffix):
+    p = tmp_path / f"s{suffix}"
+    p.write_text(json.dumps(doc, indent=1) if suffix == ".json" else yaml.safe_dump(doc), encoding="utf-8")
+    return str(p)
+
+
+def _load(path, monkeypatch, streaming):
+    monkeypatch.setattr(parser, "STREAM_MIN_BYTES", 1 if streaming else 0)
+    try:
+        return parser.ir_from_blob(parser.read_input(path))
+    except ValueError as e:
+        return str(e)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # 极小的读缓冲：每个值都会跨块
+    monkeypatch.setattr(stream, "STREAM_CHUNK_BYTES", 7)
+
+
+@pytest.mark.parametrize("suffix", [".json", ".yaml"])
+@pytest.mark.parametrize("path", EXAMPLES, ids=lambda p: p.name)
+def test_streamed_ir_matches_whole_document(tmp_path, monkeypatch, path, suffix):
+    src = _write(tmp_path, yaml.safe_load(path.read_text(encoding="utf-8")), suffix)
+    whole, streamed = _load(src, monkeypatch, False), _load(src, monkeypatch, True)
+    assert isinstance(streamed, ColumnarIR)
+    assert streamed.json() == whole.json()
+
+    res = check_formal_file(src, write_evidence=False, use_cache=False)
+    monkeypatch.setattr(parser, "STREAM_MIN_BYTES", 0)
+    assert res["status"] == check_formal_file(src, write_evidence=False, use_cache=False)["status"]
+
+
+def _extra(d):
+    d["foo"] = 1
+
+
+def _bad_type(d):
+    d["actions"][1]["type"] = "bogus"
+
+
+def _bad_ref(d):
+    d["actions"][1]["segment_id"] = "NOPE"
+
+
+def _no_rollout(d):
+    del d["rollout"]
+
+
+def _empty_actions(d):
+    d["actions"] = []
+
+
+@pytest.mark.parametrize("suffix", [".json", ".yaml"])
+@pytest.mark.parametrize("mutate", [_extra, _bad_type, _bad_ref, _no_rollout, _empty_actions])
+def test_errors_match_whole_document(tmp_path, monkeypatch, mutate, suffix):
+    doc = yaml.safe_load(VSL.read_text(encoding="utf-8"))
+    mutate(doc)
+    src = _write(tmp_path, doc, suffix)
+    err = _load(src, monkeypatch, True)
+    assert isinstance(err, str) and err == _load(src, monkeypatch, False)
+
+
+def test_missing_target_id_reports_action_path(tmp_path, monkeypatch):
+    doc = yaml.safe_load(VSL.read_text(encoding="utf-8"))
+    del doc["actions"][1]["segment_id"]
+    err = _load(_write(tmp_path, doc, ".json"), monkeypatch, True)
+    assert err == "schema_violation: actions/1/segment_id: vsl action requires segment_id"
+
+
+def test_fails_on_first_bad_action_without_reading_the_rest(tmp_path, monkeypatch):
+    doc = yaml.safe_load(VSL.read_text(encoding="utf-8"))
+    doc["actions"][0]["type"] = "bogus"
+    text = json.dumps(doc, indent=1)
+    cut = text.index('"actions"')
+    p = tmp_path / "s.json"
+    # actions 之后的内容已损坏：整体解析先报语法错误，流式解析在第一条动作处即停止
+    p.write_text(text[:text.index("}", cut) + 1] + ", {{{ not json", encoding="utf-8")
+    assert "actions/0/type" in _load(str(p), monkeypatch, True)
+    assert "actions/0/type" not in _load(str(p), monkeypatch, False)
+
+
+def test_action_ids_wait_for_scope(tmp_path, monkeypatch):
+    # actions 在 scope 之前：目标 ID 推迟到 scope 校验之后，报错顺序与整体解析一致
+    doc = yaml.safe_load(VSL.read_text(encoding="utf-8"))
+    doc["actions"][0]["segment_id"] = "NOPE_ACTION"
+    doc["scope"]["segments"].append("NOPE_SCOPE")
+    doc = {"actions": doc.pop("actions"), **doc}
+    src = _write(tmp_path, doc, ".json")
+    assert _load(src, monkeypatch, True) == _load(src, monkeypatch, False) == "invalid_reference: segment NOPE_SCOPE"
@@ -0,0 +1,44 @@
+# tests/test_temporal.py
+from pudao.smt.encoder import solve_temporal
+from pudao.smt.invariants import run_all_invariants
+from pudao.smt.solver import check_formal_with_smt
+from tests._helpers import strategy_ir
+
+
+def _vsl(seg, value, ttl=None):
+    a = {"type": "vsl", "segment_id": seg, "value": value}
+    if ttl is not None:
+        a["ttl_s"] = ttl
+    return a
+
+
+def test_sequenced_vsl_within_change_budget_is_sat():
+    # ttl 排队的多条 vsl 不再算 I3 冲突；每 10 分钟变一次，满足 max_changes_per_5min=2
+    ir = strategy_ir(actions=[_vsl("cd-se-101", v, 600) for v in (80, 90, 80)] + [_vsl("cd-se-102", 80)])
+    assert run_all_invariants(ir) == []
+    assert solve_temporal(ir) == {"status": "sat", "reasons": []}
+    assert check_formal_with_smt(ir)["status"] == "sat"
+
+
+def test_change_rate_violation_reported_with_time():
+    ir = strategy_ir(actions=[_vsl("cd-se-101", v, 60) for v in (80, 100, 80, 100, 80)])
+    res = check_formal_with_smt(ir)
+    assert res["status"] == "unsat"
+    assert res["reasons"] == [
+        "temporal_stability_violated: vsl(cd-se-101) changes more than 2 times within 5min (t=180s)"]
+    assert res["details"]["I3_temporal"] == "fail"
+
+
+def test_spatial_smoothness_checked_at_each_step():
+    # 101 在 300s 后升到 100，此时与 102=75 相差 25 > 20
+    ir = strategy_ir(actions=[_vsl("cd-se-101", 80, 300), _vsl("cd-se-101", 100), _vsl("cd-se-102", 75)])
+    out = solve_temporal(ir, horizon_s=600, step_s=30)
+    assert out["status"] == "unsat"
+    assert out["reasons"] == ["spatial_smoothness_violated: |vsl(cd-se-101)-vsl(cd-se-102)| > 20.0 at t=300s"]
+    assert any("spatial_smoothness_violated" in r for r in run_all_invariants(ir))
+
+
+def test_unbounded_vsl_followed_by_other_value_still_conflicts():
+    ir = strategy_ir(actions=[_vsl("cd-se-101", 80), _vsl("cd-se-101", 90, 60), _vsl("cd-se-101", 70)])
+    errs = run_all_invariants(ir)
+    assert errs.count("temporal_stability_violated: multiple vsl values for cd-se-101") == 2
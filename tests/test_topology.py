@@ -0,0 +1,26 @@
+# tests/test_topology.py
+import json
+
+from pudao.topology.index import TopologyIndex, load_topology_file
+
+
+def test_csr_neighbors_and_edges_among():
+    topo = TopologyIndex.from_edges([("a", "b"), ("b", "c"), ("c", "d"), ("b", "a")])
+    assert len(topo) == 4 and topo.edge_count == 3
+    assert topo.neighbors("b") == ["a", "c"]
+    assert topo.neighbors("zzz") == []
+    # 只产出给定集合内部的边，每条一次
+    assert list(topo.edges_among(["d", "c", "a"])) == [("c", "d")]
+
+
+def test_load_edge_list_and_geojson(tmp_path):
+    el = tmp_path / "net.csv"
+    el.write_text("# ring\ns1,s2\ns2,s3\n", encoding="utf-8")
+    gj = tmp_path / "net.geojson"
+    gj.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"segment_id": "s2", "neighbors": ["s1", "s3"]}},
+        {"type": "Feature", "properties": {"from": "s3", "to": "s1"}},
+    ]}), encoding="utf-8")
+    assert load_topology_file(str(el)).neighbors("s2") == ["s1", "s3"]
+    t = load_topology_file(str(gj))
+    assert t.edge_count == 3 and sorted(t.neighbors("s1")) == ["s2", "s3"]
@@ -0,0 +1,59 @@
+# tests/test_trace.py
+import json
+from pathlib import Path
+
+from pudao.evidence import trace
+from pudao.evidence.evidence import build_formal_record
+from pudao.evidence.trace import span, start_trace
+from pudao.gate.formal_gate import check_formal_file
+
+BASE = Path(__file__).resolve().parents[1]
+VSL = BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"
+RM = BASE / "examples" / "strategy-cd-ring-incident-rm-vms.yaml"
+
+
+def _names(node):
+    return [c["name"] for c in node.get("children", [])]
+
+
+def test_sampled_check_carries_nested_span_tree(monkeypatch):
+    monkeypatch.setattr(trace, "TRACE_SAMPLE", 1.0)
+    res = check_formal_file(str(RM), write_evidence=False, use_cache=False)
+    tree = res["trace"]
+    assert tree["name"] == "formal_check" and len(tree["trace_id"]) == 32
+    assert _names(tree) == ["parse", "solver", "report"]
+    parse, solver, report = tree["children"]
+    assert _names(parse) == ["read", "decode", "schema", "ir", "ids"]
+    inv = solver["children"][0]
+    assert inv["name"] == "invariants"
+    assert any(c["name"] == "invariant:I6_conflict" and c["attrs"]["violations"] == 1 for c in inv["children"])
+    assert _names(report) == ["hints"]
+    # 耗时直接来自 span
+    assert res["timings_ms"]["report_ms"] == report["dur_ms"]
+    assert res["timings_ms"]["parse_ms"] == parse["dur_ms"]
+    assert build_formal_record(str(RM), res)["trace"]["trace_id"] == tree["trace_id"]
+
+
+def test_unsampled_check_has_timings_but_no_trace(monkeypatch):
+    monkeypatch.setattr(trace, "TRACE_SAMPLE", 0.0)
+    res = check_formal_file(str(VSL), write_evidence=False, use_cache=False)
+    assert "trace" not in res
+    t = res["timings_ms"]
+    assert t["total_ms"] >= t["parse_ms"] + t["solver_ms"] + t["report_ms"]
+
+
+def test_otlp_export(monkeypatch, tmp_path):
+    out = tmp_path / "otlp.ndjson"
+    monkeypatch.setattr(trace, "TRACE_OTLP_FILE", str(out))
+    with start_trace("job", sample=1.0, batch=3) as tr:
+        with span("step", ok=True):
+            pass
+    assert span("detached").open().close().ms >= 0  # 无活动 trace 时只计时
+    req = json.loads(out.read_text(encoding="utf-8"))
+    spans = req["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["job", "step"]
+    assert {s["traceId"] for s in spans} == {tr.trace_id}
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"] and "parentSpanId" not in spans[0]
+    assert spans[0]["attributes"] == [{"key": "batch", "value": {"intValue": "3"}}]
+    assert int(spans[0]["startTimeUnixNano"]) <= int(spans[1]["startTimeUnixNano"]) \
+        <= int(spans[1]["endTimeUnixNano"]) <= int(spans[0]["endTimeUnixNano"])
@@ -0,0 +1,30 @@
+# tests/test_unsat_core.py
+from pudao.evidence.evidence import build_formal_record
+from pudao.hints.suggester import make_hints_payload
+from pudao.smt.encoder import solve_static
+from pudao.smt.solver import check_formal_with_smt
+from tests._helpers import sandwich_ir
+
+
+def test_minimized_core_names_actions_and_guardrails():
+    out = solve_static(sandwich_ir())
+    assert out["status"] == "unsat"
+    assert out["core"]["actions"] == [1, 2]
+    assert out["core"]["guardrails"] == ["max_delta"]
+    assert out["core"]["minimal"] is True
+
+
+def test_core_surfaces_in_reasons_hints_and_evidence():
+    res = check_formal_with_smt(sandwich_ir())
+    assert res["status"] == "unsat"
+    assert res["reasons"] == ["smt_unsat_core: actions [1, 2] conflict under guardrails ['max_delta']"]
+    assert "core_ms" in res["timings_ms"]
+    hints = make_hints_payload(res)["deterministic"]
+    assert any("#1、#2" in h and "max_delta" in h for h in hints)
+    assert build_formal_record("x.yaml", res)["verdict"]["unsat_core"]["actions"] == [1, 2]
+
+
+def test_zero_budget_returns_unminimized_core():
+    out = solve_static(sandwich_ir(), core_budget_ms=0)
+    assert out["core"]["minimal"] is False
+    assert {1, 2} <= set(out["core"]["actions"])
@@ -0,0 +1,70 @@
+# tests/test_verdict_cache.py
+from pathlib import Path
+
+from pudao.dsl.parser import load_strategy_ir
+from pudao.gate.cache import VerdictCache, verdict_key
+
+BASE = Path(__file__).resolve().parents[1]
+
+
+def test_cache_key_tracks_ir_content_and_tiers(tmp_path):
+    ir = load_strategy_ir(str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"))
+    key = verdict_key(ir)
+    assert verdict_key(ir.copy(deep=True)) == key
+    ir2 = ir.copy(deep=True)
+    ir2.actions[0].value = 90
+    assert verdict_key(ir2) != key
+
+    c = VerdictCache(str(tmp_path), max_bytes=1 << 20, mem_entries=1)
+    c.put(key, {"allow": True, "status": "sat", "reasons": [], "details": {}, "timings_ms": {}})
+    assert c.get(key)[1] == "mem"
+    c.put(verdict_key(ir2), {"allow": True, "status": "sat", "reasons": [], "details": {}})
+    # 内存只保留 1 条：第一条回落到磁盘
+    v, tier = c.get(key)
+    assert tier == "disk" and v["status"] == "sat" and "timings_ms" not in v
+
+
+def test_cache_disk_eviction_respects_size_bound(tmp_path):
+    c = VerdictCache(str(tmp_path), max_bytes=600, mem_entries=0)
+    for i in range(20):
+        c.put(f"{i:064x}", {"allow": False, "status": "unsat", "reasons": ["x" * 40], "details": {}})
+    total = sum(f.stat().st_size for f in tmp_path.glob("*/*.json"))
+    assert total <= 600
+    assert c.get(f"{19:064x}")[0] is not None
+
+
+def test_cache_key_tracks_temporal_unrolling(monkeypatch):
+    from pudao.smt import temporal
+    ir = load_strategy_ir(str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"))
+    key = verdict_key(ir)
+    monkeypatch.setattr(temporal, "HORIZON_S", temporal.HORIZON_S * 2)
+    assert verdict_key(ir) != key
+    monkeypatch.undo()
+    monkeypatch.setattr(temporal, "STEP_S", temporal.STEP_S / 2)
+    assert verdict_key(ir) != key
+
+
+def test_cache_key_tracks_engine_and_fast_path(monkeypatch):
+    from pudao.smt import budget, solver
+    ir = load_strategy_ir(str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"))
+    key = verdict_key(ir)
+    monkeypatch.setattr(budget, "SMT_ENGINE", "z3")
+    assert verdict_key(ir) != key
+    monkeypatch.undo()
+    monkeypatch.setattr(solver, "SMT_FASTPATH", not solver.SMT_FASTPATH)
+    assert verdict_key(ir) != key
+
+
+def test_context_is_computed_once_per_check(tmp_path, monkeypatch):
+    from pudao.gate import cache as cache_mod, formal_gate, revisions
+
+    calls = []
+    real = cache_mod.context_parts
+    monkeypatch.setattr(cache_mod, "context_parts", lambda: calls.append(1) or real())
+    monkeypatch.setattr(cache_mod, "_default", VerdictCache(str(tmp_path / "verdicts")))
+    monkeypatch.setattr(revisions, "_default", revisions.RevisionStore(str(tmp_path / "revisions")))
+    res = formal_gate.check_formal_file(str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"),
+                                        write_evidence=False)
+    assert res["cache"]["hit"] is False and len(calls) == 1
+    ir = load_strategy_ir(str(BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"))
+    assert verdict_key(ir, cache_mod.context_key()) == verdict_key(ir)
@@ -0,0 +1,46 @@
+# tests/test_violations.py
+import json
+import pickle
+from pathlib import Path
+
+from pudao.dsl.parser import load_strategy_ir
+from pudao.hints.suggester import suggest_deterministic
+from pudao.smt.invariants import run_all_invariants
+from pudao.smt.solver import check_formal_with_smt
+from pudao.smt.violations import Violation, details_for
+
+BASE = Path(__file__).resolve().parents[1]
+VSL = BASE / "examples" / "strategy-chengdu-ring-vsl.yaml"
+RM = BASE / "examples" / "strategy-cd-ring-incident-rm-vms.yaml"
+
+
+def test_invariants_emit_typed_records():
+    ir = load_strategy_ir(str(VSL))
+    ir.actions[2].value = 40
+    errs = run_all_invariants(ir)
+    v = next(e for e in errs if e.code == "spatial_smoothness_violated")
+    assert v == "spatial_smoothness_violated: |vsl(cd-se-102)-vsl(cd-se-103)|=40.0 > 20.0"
+    assert v.invariant == "I2_spatial" and v.measured == 40 and v.limit == 20
+    assert set(v.targets) == {("segment", "cd-se-102"), ("segment", "cd-se-103")}
+    # 跨进程 / 落盘后结构不丢失
+    for w in (pickle.loads(pickle.dumps(v)), Violation.from_dict(json.loads(json.dumps(v.to_dict())))):
+        assert w == v and w.targets == v.targets and w.invariant == v.invariant
+
+
+def test_details_and_hints_read_structured_fields():
+    ir = load_strategy_ir(str(RM))
+    res = check_formal_with_smt(ir)
+    assert res["details"]["I6_conflict"] == "fail" and res["details"]["I2_spatial"] == "ok"
+    assert [v["message"] for v in res["violations"]] == res["reasons"]
+    tips = suggest_deterministic(res)
+    assert any("ramp=ramp-ne-202-in" in t for t in tips)
+    # 旧格式结果（只有字符串原因）按前缀还原所属不变式（不含对象ID）
+    legacy = {"reasons": list(map(str, res["reasons"])), "details": {}}
+    assert any(t.startswith("互斥动作冲突：") for t in suggest_deterministic(legacy))
+
+
+def test_plugin_strings_keep_rule_as_invariant():
+    v = Violation.parse("site_rule_violated: vms text too long", "SITE_x")
+    assert v.code == "site_rule_violated" and v.invariant == "SITE_x"
+    assert details_for([v]) == details_for([])
+    assert Violation.parse("invalid_reference: segment x").invariant == "I1_structure"